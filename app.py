@@ -1,30 +1,25 @@
 # app.py - Servidor web principal (Flask)
-from flask import Flask, render_template, abort, request
+from flask import Flask, render_template, abort, request, Response, stream_with_context
 import asyncio
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
-from pathlib import Path
 import datetime
+import json
 import os
-import shutil
 import re
-import math
 import threading
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import time
+import bisect
 
 # ¡Importante! Importa tu nuevo módulo de scraping
 from modules.estudio_scraper import (
-    obtener_datos_completos_partido, 
     format_ah_as_decimal_string_of, 
     obtener_datos_preview_rapido, 
-    obtener_datos_preview_ligero, 
     generar_analisis_mercado_simplificado,
     check_handicap_cover,
     parse_ah_to_number_of
 )
+from modules.utils import normalize_handicap_to_half_bucket_str
 from flask import jsonify # Asegúrate de que jsonify está importado
+from modules import snapshot_partidos, cliente_http, navegador_playwright, pool_selenium, parser_listados, cola_analisis, bucle_async, precarga_previews, partidos_en_vivo, backtest_ah, limitador_peticiones
 
 app = Flask(__name__)
 
@@ -33,17 +28,9 @@ URL_NOWGOAL = "https://live20.nowgoal25.com/"
 
 REQUEST_TIMEOUT_SECONDS = 12
 _REQUEST_HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
-    "Connection": "keep-alive",
     "Referer": URL_NOWGOAL,
 }
 
-_requests_session = None
-_requests_session_lock = threading.Lock()
-_requests_fetch_lock = threading.Lock()
-
 
 def _build_nowgoal_url(path: str | None = None) -> str:
     if not path:
@@ -53,70 +40,9 @@ def _build_nowgoal_url(path: str | None = None) -> str:
     return f"{base}/{suffix}"
 
 
-def _resolve_chromium_executable() -> str | None:
-    candidates = [
-        os.environ.get("CHROME_BINARY"),
-        shutil.which("chromium"),
-        shutil.which("chromium-browser"),
-        shutil.which("google-chrome"),
-        "/usr/bin/chromium",
-        "/usr/bin/chromium-browser",
-        "/usr/bin/google-chrome",
-    ]
-    for candidate in candidates:
-        if candidate and os.path.exists(candidate):
-            return candidate
-
-    def _search_in_base(base: Path) -> str | None:
-        if not base.exists():
-            return None
-        search_targets = ("headless_shell", "chrome", "chromium", "chrome-wrapper")
-        for target in search_targets:
-            for candidate in base.rglob(target):
-                try:
-                    if candidate.is_file() and os.access(candidate, os.X_OK):
-                        return str(candidate)
-                except OSError:
-                    continue
-        return None
-
-    pw_path = os.environ.get("PLAYWRIGHT_BROWSERS_PATH")
-    if pw_path:
-        found = _search_in_base(Path(pw_path))
-        if found:
-            return found
-
-    cache_base = Path.home() / ".cache" / "ms-playwright"
-    found = _search_in_base(cache_base)
-    if found:
-        return found
-
-    return None
-
-
-
-
-def _get_shared_requests_session():
-    global _requests_session
-    with _requests_session_lock:
-        if _requests_session is None:
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=0.4, status_forcelist=[500, 502, 503, 504])
-            adapter = HTTPAdapter(max_retries=retries)
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
-            session.headers.update(_REQUEST_HEADERS)
-            _requests_session = session
-        return _requests_session
-
-
 def _fetch_nowgoal_html_sync(url: str) -> str | None:
-    session = _get_shared_requests_session()
     try:
-        with _requests_fetch_lock:
-            response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        response.raise_for_status()
-        return response.text
+        return cliente_http.obtener_html(url, timeout=REQUEST_TIMEOUT_SECONDS, headers=_REQUEST_HEADERS)
     except Exception as exc:
         print(f"Error al obtener {url} con requests: {exc}")
         return None
@@ -137,145 +63,27 @@ async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None
         return html_content
 
     try:
-        async with async_playwright() as p:
-            launch_kwargs = {
-                "headless": True,
-                "args": [
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                    "--disable-dev-shm-usage",
-                ],
-            }
-            chromium_executable = _resolve_chromium_executable()
-            if chromium_executable:
-                launch_kwargs["executable_path"] = chromium_executable
-            browser = await p.chromium.launch(**launch_kwargs)
-            page = await browser.new_page()
-            try:
-                await page.goto(target_url, wait_until="domcontentloaded", timeout=20000)
-                await page.wait_for_timeout(4000)
-                if filter_state is not None:
-                    try:
-                        await page.evaluate("(state) => { if (typeof HideByState === 'function') { HideByState(state); } }", filter_state)
-                        await page.wait_for_timeout(1500)
-                    except Exception as eval_err:
-                        print(f"Advertencia al aplicar HideByState({filter_state}) en {target_url}: {eval_err}")
-                return await page.content()
-            finally:
-                await browser.close()
+        return await navegador_playwright.obtener_html_async(target_url, filter_state)
     except Exception as browser_exc:
         print(f"Error al obtener la pagina con Playwright ({target_url}): {browser_exc}")
     return None
 
-def _parse_number_clean(s: str):
-    if s is None:
-        return None
-    txt = str(s).strip()
-    txt = txt.replace('−', '-')  # unicode minus
-    txt = txt.replace(',', '.')
-    txt = txt.replace('+', '')
-    txt = txt.replace(' ', '')
-    m = re.search(r"^[+-]?\d+(?:\.\d+)?$", txt)
-    if m:
-        try:
-            return float(m.group(0))
-        except ValueError:
-            return None
-    return None
-
-def _parse_number(s: str):
-    if s is None:
-        return None
-    # Normaliza separadores y signos
-    txt = str(s).strip()
-    txt = txt.replace('−', '-')  # minus unicode
-    txt = txt.replace(',', '.')
-    txt = txt.replace(' ', '')
-    # Coincide con un número decimal con signo
-    m = re.search(r"^[+-]?\d+(?:\.\d+)?$", txt)
-    if m:
-        try:
-            return float(m.group(0))
-        except ValueError:
-            return None
-    return None
-
-def _parse_handicap_to_float(text: str):
-    if text is None:
-        return None
-    t = str(text).strip()
-    if '/' in t:
-        parts = [p for p in re.split(r"/", t) if p]
-        nums = []
-        for p in parts:
-            v = _parse_number_clean(p)
-            if v is None:
-                return None
-            nums.append(v)
-        if not nums:
-            return None
-        return sum(nums) / len(nums)
-    # Si viene como cadena normal (ej. "+0.25" o "-0,75")
-    return _parse_number_clean(t.replace('+', ''))
-
-def _bucket_to_half(value: float) -> float:
-    if value is None:
-        return None
-    if value == 0:
-        return 0.0
-    sign = -1.0 if value < 0 else 1.0
-    av = abs(value)
-    base = math.floor(av + 1e-9)
-    frac = av - base
-    # Mapea 0.25/0.75/0.5 a .5, 0.0 queda .0
-    def close(a, b):
-        return abs(a - b) < 1e-6
-    if close(frac, 0.0):
-        bucket = float(base)
-    elif close(frac, 0.5) or close(frac, 0.25) or close(frac, 0.75):
-        bucket = base + 0.5
-    else:
-        # fallback: redondeo al múltiplo de 0.5 más cercano
-        bucket = round(av * 2) / 2.0
-        # si cae justo en entero, desplazar a .5 para respetar la preferencia de .25/.75 → .5
-        f = bucket - math.floor(bucket)
-        if close(f, 0.0) and (abs(av - (math.floor(bucket) + 0.25)) < 0.26 or abs(av - (math.floor(bucket) + 0.75)) < 0.26):
-            bucket = math.floor(bucket) + 0.5
-    return sign * bucket
-
-def normalize_handicap_to_half_bucket_str(text: str):
-    v = _parse_handicap_to_float(text)
-    if v is None:
-        return None
-    b = _bucket_to_half(v)
-    if b is None:
-        return None
-    # Formato con un decimal
-    return f"{b:.1f}"
-
-def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
+def _extract_upcoming_matches(html_content):
+    """Extrae todas las filas con fecha válida, ordenadas por hora (sin paginar ni filtrar)."""
     upcoming_matches = []
-    now_utc = datetime.datetime.utcnow()
 
-    for row in match_rows:
-        match_id = row.get('id', '').replace('tr1_', '')
+    for fila in parser_listados.extraer_filas_partidos(html_content):
+        match_id = fila.match_id
         if not match_id: continue
 
-        time_cell = row.find('td', {'name': 'timeData'})
-        if not time_cell or not time_cell.has_attr('data-t'): continue
+        if fila.data_t is None: continue
         
         try:
-            match_time = datetime.datetime.strptime(time_cell['data-t'], '%Y-%m-%d %H:%M:%S')
+            match_time = datetime.datetime.strptime(fila.data_t, '%Y-%m-%d %H:%M:%S')
         except (ValueError, IndexError):
             continue
 
-        if match_time < now_utc: continue
-
-        home_team_tag = row.find('a', {'id': f'team1_{match_id}'})
-        away_team_tag = row.find('a', {'id': f'team2_{match_id}'})
-        odds_data = row.get('odds', '').split(',')
+        odds_data = fila.odds.split(',')
         handicap = odds_data[2] if len(odds_data) > 2 else "N/A"
         goal_line = odds_data[10] if len(odds_data) > 10 else "N/A"
 
@@ -286,153 +94,183 @@ def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=No
         upcoming_matches.append({
             "id": match_id,
             "time_obj": match_time,
-            "home_team": home_team_tag.text.strip() if home_team_tag else "N/A",
-            "away_team": away_team_tag.text.strip() if away_team_tag else "N/A",
+            "home_team": fila.local if fila.local is not None else "N/A",
+            "away_team": fila.visitante if fila.visitante is not None else "N/A",
             "handicap": handicap,
             "goal_line": goal_line
         })
 
-    if handicap_filter:
-        try:
-            target = normalize_handicap_to_half_bucket_str(handicap_filter)
-            if target is not None:
-                filtered = []
-                for m in upcoming_matches:
-                    hv = normalize_handicap_to_half_bucket_str(m.get('handicap', ''))
-                    if hv == target:
-                        filtered.append(m)
-                upcoming_matches = filtered
-        except Exception:
-            pass
-
     upcoming_matches.sort(key=lambda x: x['time_obj'])
-    
-    paginated_matches = upcoming_matches[offset:offset+limit]
-
-    for match in paginated_matches:
-        match['time'] = (match['time_obj'] + datetime.timedelta(hours=2)).strftime('%H:%M')
-        del match['time_obj']
-
-    return paginated_matches
+    return upcoming_matches
 
-def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_filter=None):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    match_rows = soup.find_all('tr', id=lambda x: x and x.startswith('tr1_'))
+def _extract_finished_matches(html_content):
+    """Extrae todos los partidos finalizados, del más reciente al más antiguo (sin paginar ni filtrar)."""
     finished_matches = []
-    for row in match_rows:
-        match_id = row.get('id', '').replace('tr1_', '')
+    for fila in parser_listados.extraer_filas_partidos(html_content):
+        match_id = fila.match_id
         if not match_id: continue
 
-        state = row.get('state')
+        state = fila.state
         if state is not None and state != "-1":
             continue
 
-        cells = row.find_all('td')
-        if len(cells) < 8: continue
+        if fila.n_celdas < 8: continue
 
-        home_team_tag = row.find('a', {'id': f'team1_{match_id}'})
-        away_team_tag = row.find('a', {'id': f'team2_{match_id}'})
-        
-        score_cell = cells[6]
-        score_text = "N/A"
-        if score_cell:
-            b_tag = score_cell.find('b')
-            if b_tag:
-                score_text = b_tag.text.strip()
-            else:
-                score_text = score_cell.get_text(strip=True)
+        score_text = fila.marcador
 
         if not re.match(r'^\d+\s*-\s*\d+$', score_text):
             continue
 
-        odds_data = row.get('odds', '').split(',')
+        odds_data = fila.odds.split(',')
         handicap = odds_data[2] if len(odds_data) > 2 else "N/A"
         goal_line = odds_data[10] if len(odds_data) > 10 else "N/A"
 
         if handicap == "N/A":
             continue
 
-        time_cell = row.find('td', {'name': 'timeData'})
         match_time = datetime.datetime.now()
-        if time_cell and time_cell.has_attr('data-t'):
+        if fila.data_t is not None:
             try:
-                match_time = datetime.datetime.strptime(time_cell['data-t'], '%Y-%m-%d %H:%M:%S')
+                match_time = datetime.datetime.strptime(fila.data_t, '%Y-%m-%d %H:%M:%S')
             except (ValueError, IndexError):
                 continue
         
         finished_matches.append({
             "id": match_id,
             "time_obj": match_time,
-            "home_team": home_team_tag.text.strip() if home_team_tag else "N/A",
-            "away_team": away_team_tag.text.strip() if away_team_tag else "N/A",
+            "home_team": fila.local if fila.local is not None else "N/A",
+            "away_team": fila.visitante if fila.visitante is not None else "N/A",
             "score": score_text,
             "handicap": handicap,
             "goal_line": goal_line
         })
 
-    if handicap_filter:
-        try:
-            target = normalize_handicap_to_half_bucket_str(handicap_filter)
-            if target is not None:
-                filtered = []
-                for m in finished_matches:
-                    hv = normalize_handicap_to_half_bucket_str(m.get('handicap', ''))
-                    if hv == target:
-                        filtered.append(m)
-                finished_matches = filtered
-        except Exception:
-            pass
-
     finished_matches.sort(key=lambda x: x['time_obj'], reverse=True)
-    
-    paginated_matches = finished_matches[offset:offset+limit]
+    return finished_matches
 
-    for match in paginated_matches:
-        match['time'] = (match['time_obj'] + datetime.timedelta(hours=2)).strftime('%d/%m %H:%M')
-        del match['time_obj']
+def _filter_by_handicap(matches, handicap_filter):
+    if not handicap_filter:
+        return matches
+    try:
+        target = normalize_handicap_to_half_bucket_str(handicap_filter)
+        if target is not None:
+            return [m for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap', '')) == target]
+    except Exception:
+        pass
+    return matches
 
+def _handicap_options(matches):
+    """Buckets de hándicap distintos de los partidos servidos, ordenados por valor."""
+    buckets = {normalize_handicap_to_half_bucket_str(m.get('handicap')) for m in matches}
+    buckets.discard(None)
+    return sorted(buckets, key=float)
+
+def _paginate_matches(matches, limit, offset, time_format):
+    paginated_matches = []
+    for match in matches[offset:offset+limit]:
+        item = {k: v for k, v in match.items() if k != 'time_obj'}
+        item['time'] = (match['time_obj'] + datetime.timedelta(hours=2)).strftime(time_format)
+        paginated_matches.append(item)
     return paginated_matches
 
-async def get_main_page_matches_async(limit=20, offset=0, handicap_filter=None):
-    html_content = await _fetch_nowgoal_html(filter_state=3)
-    if not html_content:
-        html_content = await _fetch_nowgoal_html(filter_state=3, requests_first=False)
-        if not html_content:
-            return []
-    matches = parse_main_page_matches(html_content, limit, offset, handicap_filter)
-    if not matches:
-        html_content = await _fetch_nowgoal_html(filter_state=3, requests_first=False)
-        if not html_content:
-            return []
-        matches = parse_main_page_matches(html_content, limit, offset, handicap_filter)
-    return matches
+def parse_main_page_matches(html_content, limit=20, offset=0, handicap_filter=None):
+    now_utc = datetime.datetime.utcnow()
+    upcoming_matches = [m for m in _extract_upcoming_matches(html_content) if m['time_obj'] >= now_utc]
+    upcoming_matches = _filter_by_handicap(upcoming_matches, handicap_filter)
+    return _paginate_matches(upcoming_matches, limit, offset, '%H:%M')
 
-async def get_main_page_finished_matches_async(limit=20, offset=0, handicap_filter=None):
-    html_content = await _fetch_nowgoal_html(path='football/results')
+def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_filter=None):
+    finished_matches = _filter_by_handicap(_extract_finished_matches(html_content), handicap_filter)
+    return _paginate_matches(finished_matches, limit, offset, '%d/%m %H:%M')
+
+def _build_listing_index(matches):
+    """
+    Prepara un listado ya parseado para servirlo desde memoria: la lista ordenada
+    completa y la misma lista agrupada por bucket de hándicap, de forma que filtrar
+    por hándicap sea una búsqueda en un diccionario.
+    """
+    by_bucket = {}
+    for m in matches:
+        bucket = normalize_handicap_to_half_bucket_str(m.get('handicap', ''))
+        if bucket is not None:
+            by_bucket.setdefault(bucket, []).append(m)
+    return {'matches': matches, 'by_bucket': by_bucket}
+
+async def _load_listing_async(path, filter_state, extractor, needs_future_matches=False):
+    html_content = await _fetch_nowgoal_html(path=path, filter_state=filter_state)
     if not html_content:
-        html_content = await _fetch_nowgoal_html(path='football/results', requests_first=False)
+        html_content = await _fetch_nowgoal_html(path=path, filter_state=filter_state, requests_first=False)
         if not html_content:
-            return []
-    matches = parse_main_page_finished_matches(html_content, limit, offset, handicap_filter)
-    if not matches:
-        html_content = await _fetch_nowgoal_html(path='football/results', requests_first=False)
+            return None
+    # El parseo es CPU puro: fuera del loop compartido para no frenar al navegador.
+    matches = await asyncio.to_thread(extractor, html_content)
+    now_utc = datetime.datetime.utcnow()
+    has_rows = any(m['time_obj'] >= now_utc for m in matches) if needs_future_matches else bool(matches)
+    if not has_rows:
+        html_content = await _fetch_nowgoal_html(path=path, filter_state=filter_state, requests_first=False)
         if not html_content:
-            return []
-        matches = parse_main_page_finished_matches(html_content, limit, offset, handicap_filter)
-    return matches
+            return None
+        matches = await asyncio.to_thread(extractor, html_content)
+    return _build_listing_index(matches)
+
+def _load_upcoming_listing():
+    return bucle_async.ejecutar(_load_listing_async(None, 3, _extract_upcoming_matches, needs_future_matches=True))
+
+def _load_finished_listing():
+    return bucle_async.ejecutar(_load_listing_async('football/results', None, _extract_finished_matches))
+
+snapshot_partidos.registrar_listado('upcoming', _load_upcoming_listing)
+snapshot_partidos.registrar_listado('finished', _load_finished_listing)
+
+# Los navegadores son solo respaldo (el estudio va con requests, ESTUDIO_MODO) y se
+# lanzan la primera vez que hacen falta. Con estas variables a 1 se lanzan al arrancar
+# el worker, a cambio de que cada worker cargue selenium/playwright y mantenga un
+# Chrome y un Chromium aunque no los use.
+if os.environ.get("PLAYWRIGHT_WARMUP", "0") == "1":
+    navegador_playwright.precalentar()
+
+if os.environ.get("SELENIUM_WARMUP", "0") == "1":
+    pool_selenium.precalentar()
+
+def _listing_from_snapshot(name, handicap_filter, version=None):
+    snapshot = snapshot_partidos.obtener_snapshot(name, version)
+    if not snapshot:
+        return [], None
+    data = snapshot['data']
+    matches = data['matches']
+    if handicap_filter:
+        target = normalize_handicap_to_half_bucket_str(handicap_filter)
+        if target is not None:
+            matches = data['by_bucket'].get(target, [])
+    return matches, snapshot['version']
+
+def get_main_page_matches(limit=20, offset=0, handicap_filter=None, version=None):
+    matches, snapshot_version = _listing_from_snapshot('upcoming', handicap_filter, version)
+    # La lista está ordenada por hora: se descartan con bisect los que ya han empezado.
+    first_future = bisect.bisect_left(matches, datetime.datetime.utcnow(), key=lambda m: m['time_obj'])
+    return _paginate_matches(matches[first_future:], limit, offset, '%H:%M'), snapshot_version
+
+def get_main_page_finished_matches(limit=20, offset=0, handicap_filter=None, version=None):
+    matches, snapshot_version = _listing_from_snapshot('finished', handicap_filter, version)
+    return _paginate_matches(matches, limit, offset, '%d/%m %H:%M'), snapshot_version
+
+def _requested_snapshot_version():
+    try:
+        return int(request.args['version'])
+    except (KeyError, ValueError):
+        return None
 
 @app.route('/')
 def index():
     try:
         print("Recibida petición para Próximos Partidos...")
         hf = request.args.get('handicap')
-        matches = asyncio.run(get_main_page_matches_async(handicap_filter=hf))
-        print(f"Scraper finalizado. {len(matches)} partidos encontrados.")
-        opts = sorted({
-            normalize_handicap_to_half_bucket_str(m.get('handicap'))
-            for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap')) is not None
-        }, key=lambda x: float(x))
-        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='upcoming', page_title='Próximos Partidos')
+        matches, snapshot_version = get_main_page_matches(handicap_filter=hf)
+        print(f"Listado servido desde snapshot v{snapshot_version}. {len(matches)} partidos encontrados.")
+        # El siguiente paso suele ser un clic en las primeras filas: se precargan sus vistas previas.
+        precarga_previews.programar([m['id'] for m in matches])
+        opts = _handicap_options(matches)
+        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='upcoming', page_title='Próximos Partidos', snapshot_version=snapshot_version)
     except Exception as e:
         print(f"ERROR en la ruta principal: {e}")
         return render_template('index.html', matches=[], error=f"No se pudieron cargar los partidos: {e}", page_mode='upcoming', page_title='Próximos Partidos')
@@ -442,13 +280,10 @@ def resultados():
     try:
         print("Recibida petición para Partidos Finalizados...")
         hf = request.args.get('handicap')
-        matches = asyncio.run(get_main_page_finished_matches_async(handicap_filter=hf))
-        print(f"Scraper finalizado. {len(matches)} partidos encontrados.")
-        opts = sorted({
-            normalize_handicap_to_half_bucket_str(m.get('handicap'))
-            for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap')) is not None
-        }, key=lambda x: float(x))
-        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='finished', page_title='Resultados Finalizados')
+        matches, snapshot_version = get_main_page_finished_matches(handicap_filter=hf)
+        print(f"Listado servido desde snapshot v{snapshot_version}. {len(matches)} partidos encontrados.")
+        opts = _handicap_options(matches)
+        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='finished', page_title='Resultados Finalizados', snapshot_version=snapshot_version)
     except Exception as e:
         print(f"ERROR en la ruta de resultados: {e}")
         return render_template('index.html', matches=[], error=f"No se pudieron cargar los partidos: {e}", page_mode='finished', page_title='Resultados Finalizados')
@@ -459,8 +294,8 @@ def api_matches():
         offset = int(request.args.get('offset', 0))
         limit = int(request.args.get('limit', 5))
         limit = min(limit, 50)
-        matches = asyncio.run(get_main_page_matches_async(limit, offset, request.args.get('handicap')))
-        return jsonify({'matches': matches})
+        matches, snapshot_version = get_main_page_matches(limit, offset, request.args.get('handicap'), _requested_snapshot_version())
+        return jsonify({'matches': matches, 'version': snapshot_version})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -470,23 +305,21 @@ def api_finished_matches():
         offset = int(request.args.get('offset', 0))
         limit = int(request.args.get('limit', 5))
         limit = min(limit, 50)
-        matches = asyncio.run(get_main_page_finished_matches_async(limit, offset, request.args.get('handicap')))
-        return jsonify({'matches': matches})
+        matches, snapshot_version = get_main_page_finished_matches(limit, offset, request.args.get('handicap'), _requested_snapshot_version())
+        return jsonify({'matches': matches, 'version': snapshot_version})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/proximos')
 def proximos():
     try:
-        print("Recibida petición. Ejecutando scraper de partidos...")
+        print("Recibida petición. Sirviendo partidos desde el snapshot...")
         hf = request.args.get('handicap')
-        matches = asyncio.run(get_main_page_matches_async(25, 0, hf))
-        print(f"Scraper finalizado. {len(matches)} partidos encontrados.")
-        opts = sorted({
-            normalize_handicap_to_half_bucket_str(m.get('handicap'))
-            for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap')) is not None
-        }, key=lambda x: float(x))
-        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts)
+        matches, snapshot_version = get_main_page_matches(25, 0, hf)
+        print(f"Listado servido desde snapshot v{snapshot_version}. {len(matches)} partidos encontrados.")
+        precarga_previews.programar([m['id'] for m in matches])
+        opts = _handicap_options(matches)
+        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, snapshot_version=snapshot_version)
     except Exception as e:
         print(f"ERROR en la ruta principal: {e}")
         return render_template('index.html', matches=[], error=f"No se pudieron cargar los partidos: {e}")
@@ -497,10 +330,12 @@ def mostrar_estudio(match_id):
     """
     Esta ruta se activa cuando un usuario visita /estudio/ID_DEL_PARTIDO.
     """
+    if not match_id.isdigit():
+        abort(400, description="ID de partido inválido.")
     print(f"Recibida petición para el estudio del partido ID: {match_id}")
     
-    # Llama a la función principal de tu módulo de scraping
-    datos_partido = obtener_datos_completos_partido(match_id)
+    # El estudio pasa por la cola de análisis (reutiliza un preanálisis si ya está hecho)
+    datos_partido = cola_analisis.obtener_resultado(match_id)
     
     if not datos_partido or "error" in datos_partido:
         # Si hay un error, puedes mostrar una página de error
@@ -518,12 +353,12 @@ def analizar_partido():
     Ruta para analizar partidos finalizados por ID.
     """
     if request.method == 'POST':
-        match_id = request.form.get('match_id')
-        if match_id:
+        match_id = (request.form.get('match_id') or '').strip()
+        if match_id.isdigit():
             print(f"Recibida petición para analizar partido finalizado ID: {match_id}")
             
-            # Llama a la función principal de tu módulo de scraping
-            datos_partido = obtener_datos_completos_partido(match_id)
+            # El estudio pasa por la cola de análisis (reutiliza un preanálisis si ya está hecho)
+            datos_partido = cola_analisis.obtener_resultado(match_id)
             
             if not datos_partido or "error" in datos_partido:
                 # Si hay un error, mostrarlo en la página
@@ -553,7 +388,136 @@ def analizar_partido():
     # Si es GET, mostrar el formulario
     return render_template('analizar_partido.html')
 
+# Conexiones SSE de /api/live/stream: cada una ocupa un hilo del worker mientras dura,
+# así que se limitan y se cierran cada cierto tiempo (EventSource reconecta solo y,
+# con Last-Event-ID, recibe únicamente lo que cambió mientras tanto).
+LIVE_STREAM_MAX_CLIENTES = int(os.environ.get('LIVE_STREAM_MAX_CLIENTES', '2'))
+LIVE_STREAM_MAX_SECONDS = int(os.environ.get('LIVE_STREAM_MAX_SECONDS', '300'))
+LIVE_STREAM_KEEPALIVE_SECONDS = 15
+_live_streams = threading.BoundedSemaphore(LIVE_STREAM_MAX_CLIENTES)
+
+
+@app.route('/api/live')
+def api_live():
+    """Tabla actual de partidos en juego (la mantiene al día /api/live/stream mientras haya clientes)."""
+    version, partidos = partidos_en_vivo.instantanea()
+    return jsonify({'version': version, 'matches': partidos, 'status': partidos_en_vivo.estado_en_vivo()})
+
+
+@app.route('/api/upstream')
+def api_upstream():
+    """Ritmo actual del limitador por host de NowGoal (tasa, cola, contadores) y ahorro de descargas."""
+    return jsonify({'hosts': limitador_peticiones.estado_limitador(), 'downloads': cliente_http.estadisticas_descargas()})
+
+
+@app.route('/api/backtest')
+def api_backtest():
+    """
+    Backtest de handicap asiático sobre el historial local.
+    ?group=bucket,liga,favorito,linea_goles (por defecto bucket) &league=ID &from=AAAA-MM-DD &to=AAAA-MM-DD
+    """
+    agrupar_por = tuple(g.strip() for g in request.args.get('group', 'bucket').split(',') if g.strip())
+    inicio = time.perf_counter()
+    datos = backtest_ah.cargar_datos(request.args.get('league'), request.args.get('from'), request.args.get('to'))
+    carga_ms = (time.perf_counter() - inicio) * 1000
+    try:
+        grupos = backtest_ah.backtest(datos, agrupar_por)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify({
+        'group': list(agrupar_por),
+        'matches': len(datos),
+        'groups': grupos,
+        'load_ms': round(carga_ms, 2),
+        'elapsed_ms': round((time.perf_counter() - inicio) * 1000 - carga_ms, 2),
+    })
+
+
+@app.route('/api/live/stream')
+def api_live_stream():
+    """
+    Server-Sent Events con los partidos en juego: un evento "snapshot" con la tabla
+    completa al conectar y después eventos "changes" solo con las filas que cambian
+    (las que salen llevan "removed": true). El id de cada evento es la versión de la tabla.
+    """
+    cabeceras = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if request.method == 'HEAD':
+        # Sin cuerpo no hay conexión que mantener: no ocupa hueco.
+        return Response(mimetype='text/event-stream', headers=cabeceras)
+    # El hueco se libera al cerrar la respuesta (call_on_close), no al terminar el
+    # generador: si el cliente se va antes del primer evento, el cuerpo no llega a
+    # recorrerse y un finally dentro del generador no se ejecutaría nunca.
+    if not _live_streams.acquire(blocking=False):
+        return jsonify({'error': 'Demasiadas conexiones en vivo; inténtalo más tarde.'}), 503
+    ultimo_id = request.headers.get('Last-Event-ID', '')
+
+    def evento(nombre, version, cuerpo):
+        return f"id: {version}\nevent: {nombre}\ndata: {json.dumps(cuerpo, ensure_ascii=False)}\n\n"
+
+    def generar():
+        with partidos_en_vivo.suscripcion():
+            desde = partidos_en_vivo.cambios_desde(int(ultimo_id)) if ultimo_id.isdigit() else None
+            if desde is None:
+                version, partidos = partidos_en_vivo.instantanea()
+                yield evento('snapshot', version, {'version': version, 'matches': partidos})
+            else:
+                version, cambios = desde
+                if cambios:
+                    yield evento('changes', version, {'version': version, 'changes': cambios})
+            limite = time.monotonic() + LIVE_STREAM_MAX_SECONDS
+            while time.monotonic() < limite:
+                if partidos_en_vivo.esperar_version(version, LIVE_STREAM_KEEPALIVE_SECONDS) == version:
+                    yield ": keep-alive\n\n"
+                    continue
+                desde = partidos_en_vivo.cambios_desde(version)
+                if desde is None:
+                    version, partidos = partidos_en_vivo.instantanea()
+                    yield evento('snapshot', version, {'version': version, 'matches': partidos})
+                else:
+                    version, cambios = desde
+                    yield evento('changes', version, {'version': version, 'changes': cambios})
+
+    respuesta = Response(stream_with_context(generar()), mimetype='text/event-stream', headers=cabeceras)
+    respuesta.call_on_close(_live_streams.release)
+    return respuesta
+
+
 # --- NUEVA RUTA API PARA LA VISTA PREVIA RÁPIDA ---
+@app.route('/api/preview/batch')
+def api_preview_batch():
+    """
+    Vistas previas ligeras de varios partidos (?ids=1,2,3) en una sola llamada.
+    Responde NDJSON: una línea {"id", "preview"} (o {"id", "error"}) por partido en
+    cuanto está lista, y una última línea {"done": true, ...} con el resumen.
+    """
+    ids = [i for i in re.split(r'[,\s]+', request.args.get('ids', '')) if i]
+    if not ids:
+        return jsonify({'error': 'Falta el parámetro ids (IDs separados por comas).'}), 400
+
+    def generar():
+        inicio = datetime.datetime.now()
+        antes = cliente_http.estadisticas_descargas()
+        total = 0
+        for match_id, datos in precarga_previews.previews_en_lote(ids):
+            total += 1
+            if "error" in datos:
+                linea = {'id': match_id, 'error': datos['error']}
+            else:
+                linea = {'id': match_id, 'preview': datos}
+            yield json.dumps(linea, ensure_ascii=False, default=str) + "\n"
+        despues = cliente_http.estadisticas_descargas()
+        resumen = {
+            'done': True,
+            'count': total,
+            'elapsed_ms': int((datetime.datetime.now() - inicio).total_seconds() * 1000),
+            # Aproximado: otras peticiones simultáneas también suman en los contadores.
+            'upstream': {k: despues[k] - antes[k] for k in despues},
+        }
+        yield json.dumps(resumen) + "\n"
+
+    return Response(stream_with_context(generar()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/preview/<string:match_id>')
 def api_preview(match_id):
     """
@@ -566,7 +530,8 @@ def api_preview(match_id):
         if mode in ['full', 'selenium']:
             preview_data = obtener_datos_preview_rapido(match_id)
         else:
-            preview_data = obtener_datos_preview_ligero(match_id)
+            # Lo más probable es que ya esté precargada desde el listado.
+            preview_data = precarga_previews.obtener_preview(match_id)
         if "error" in preview_data:
             return jsonify(preview_data), 500
         return jsonify(preview_data)
@@ -575,261 +540,347 @@ def api_preview(match_id):
         return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
 
 
+def _payload_analisis(datos):
+    """Convierte los datos del estudio en el JSON de /api/analisis (payload complejo + HTML simplificado)."""
+    # --- Lógica para el payload complejo (la original) ---
+    def stats_to_rows(stats):
+        return stats.filas_api(vacio_si_falso=True) if stats is not None else []
+
+    payload = {
+        'home_team': datos.get('home_name', ''),
+        'away_team': datos.get('away_name', ''),
+        'final_score': datos.get('score'),
+        'match_date': datos.get('match_date'),
+        'match_time': datos.get('match_time'),
+        'match_datetime': datos.get('match_datetime'),
+        'recent_indirect_full': {
+            'last_home': None,
+            'last_away': None,
+            'h2h_col3': None
+        },
+        'comparativas_indirectas': {
+            'left': None,
+            'right': None
+        }
+    }
+    
+    # --- START COVERAGE CALCULATION ---
+    main_odds = datos.get("main_match_odds_data")
+    home_name = datos.get("home_name")
+    away_name = datos.get("away_name")
+    ah_actual_num = parse_ah_to_number_of(main_odds.get('ah_linea_raw', ''))
+    
+    favorito_actual_name = "Ninguno (línea en 0)"
+    if ah_actual_num is not None:
+        if ah_actual_num > 0: favorito_actual_name = home_name
+        elif ah_actual_num < 0: favorito_actual_name = away_name
+
+    def get_cover_status_vs_current(details):
+        if not details or ah_actual_num is None:
+            return 'NEUTRO'
+        try:
+            score_str = details.get('score', '').replace(' ', '').replace(':', '-')
+            if not score_str or '?' in score_str:
+                return 'NEUTRO'
+
+            h_home = details.get('home_team')
+            h_away = details.get('away_team')
+            
+            status, _ = check_handicap_cover(score_str, ah_actual_num, favorito_actual_name, h_home, h_away, home_name)
+            return status
+        except Exception:
+            return 'NEUTRO'
+            
+    # --- Análisis mejorado de H2H Rivales ---
+    def analyze_h2h_rivals(home_result, away_result):
+        if not home_result or not away_result:
+            return None
+            
+        try:
+            # Obtener resultados de los partidos
+            home_goals = list(map(int, home_result.get('score', '0-0').split('-')))
+            away_goals = list(map(int, away_result.get('score', '0-0').split('-')))
+            
+            # Calcular diferencia de goles
+            home_goal_diff = home_goals[0] - home_goals[1]
+            away_goal_diff = away_goals[0] - away_goals[1]
+            
+            # Comparar resultados
+            if home_goal_diff > away_goal_diff:
+                return "Contra rivales comunes, el Equipo Local ha obtenido mejores resultados"
+            elif away_goal_diff > home_goal_diff:
+                return "Contra rivales comunes, el Equipo Visitante ha obtenido mejores resultados"
+            else:
+                return "Los rivales han tenido resultados similares"
+        except Exception:
+            return None
+            
+    # --- Análisis de Comparativas Indirectas ---
+    def analyze_indirect_comparison(result, team_name):
+        if not result:
+            return None
+            
+        try:
+            # Determinar si el equipo cubrió el handicap
+            status = get_cover_status_vs_current(result)
+            
+            if status == 'CUBIERTO':
+                return f"Contra este rival, {team_name} habría cubierto el handicap"
+            elif status == 'NO CUBIERTO':
+                return f"Contra este rival, {team_name} no habría cubierto el handicap"
+            else:
+                return f"Contra este rival, el resultado para {team_name} sería indeterminado"
+        except Exception:
+            return None
+    # --- END COVERAGE CALCULATION ---
+
+    last_home = (datos.get('last_home_match') or {})
+    last_home_details = last_home.get('details') or {}
+    if last_home_details:
+        payload['recent_indirect_full']['last_home'] = {
+            'home': last_home_details.get('home_team'),
+            'away': last_home_details.get('away_team'),
+            'score': (last_home_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
+            'ou': last_home_details.get('ouLine') or '-',
+            'stats_rows': stats_to_rows(last_home.get('stats')),
+            'date': last_home_details.get('date'),
+            'cover_status': get_cover_status_vs_current(last_home_details)
+        }
+
+    last_away = (datos.get('last_away_match') or {})
+    last_away_details = last_away.get('details') or {}
+    if last_away_details:
+        payload['recent_indirect_full']['last_away'] = {
+            'home': last_away_details.get('home_team'),
+            'away': last_away_details.get('away_team'),
+            'score': (last_away_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
+            'ou': last_away_details.get('ouLine') or '-',
+            'stats_rows': stats_to_rows(last_away.get('stats')),
+            'date': last_away_details.get('date'),
+            'cover_status': get_cover_status_vs_current(last_away_details)
+        }
+
+    h2h_col3 = (datos.get('h2h_col3') or {})
+    h2h_col3_details = h2h_col3.get('details') or {}
+    if h2h_col3_details and h2h_col3_details.get('status') == 'found':
+        h2h_col3_details_adapted = {
+            'score': f"{h2h_col3_details.get('goles_home')}:{h2h_col3_details.get('goles_away')}",
+            'home_team': h2h_col3_details.get('h2h_home_team_name'),
+            'away_team': h2h_col3_details.get('h2h_away_team_name')
+        }
+        payload['recent_indirect_full']['h2h_col3'] = {
+            'home': h2h_col3_details.get('h2h_home_team_name'),
+            'away': h2h_col3_details.get('h2h_away_team_name'),
+            'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
+            'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
+            'ou': h2h_col3_details.get('ou_result') or '-',
+            'stats_rows': stats_to_rows(h2h_col3.get('stats')),
+            'date': h2h_col3_details.get('date'),
+            'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
+            'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
+        }
+
+    h2h_general = (datos.get('h2h_general') or {})
+    h2h_general_details = h2h_general.get('details') or {}
+    if h2h_general_details:
+        score_text = h2h_general_details.get('res6') or ''
+        cover_input = {
+            'score': score_text,
+            'home_team': h2h_general_details.get('h2h_gen_home'),
+            'away_team': h2h_general_details.get('h2h_gen_away')
+        }
+        payload['recent_indirect_full']['h2h_general'] = {
+            'home': h2h_general_details.get('h2h_gen_home'),
+            'away': h2h_general_details.get('h2h_gen_away'),
+            'score': score_text.replace(':', ' : '),
+            'ah': h2h_general_details.get('ah6') or '-',
+            'ou': h2h_general_details.get('ou_result6') or '-',
+            'stats_rows': stats_to_rows(h2h_general.get('stats')),
+            'date': h2h_general_details.get('date'),
+            'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
+        }
+
+    comp_left = (datos.get('comp_L_vs_UV_A') or {})
+    comp_left_details = comp_left.get('details') or {}
+    if comp_left_details:
+        payload['comparativas_indirectas']['left'] = {
+            'title_home_name': datos.get('home_name'),
+            'title_away_name': datos.get('away_name'),
+            'home_team': comp_left_details.get('home_team'),
+            'away_team': comp_left_details.get('away_team'),
+            'score': (comp_left_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
+            'ou': comp_left_details.get('ou_line') or '-',
+            'localia': comp_left_details.get('localia') or '',
+            'stats_rows': stats_to_rows(comp_left.get('stats')),
+            'cover_status': get_cover_status_vs_current(comp_left_details),
+            'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
+        }
+
+    comp_right = (datos.get('comp_V_vs_UL_H') or {})
+    comp_right_details = comp_right.get('details') or {}
+    if comp_right_details:
+        payload['comparativas_indirectas']['right'] = {
+            'title_home_name': datos.get('home_name'),
+            'title_away_name': datos.get('away_name'),
+            'home_team': comp_right_details.get('home_team'),
+            'away_team': comp_right_details.get('away_team'),
+            'score': (comp_right_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
+            'ou': comp_right_details.get('ou_line') or '-',
+            'localia': comp_right_details.get('localia') or '',
+            'stats_rows': stats_to_rows(comp_right.get('stats')),
+            'cover_status': get_cover_status_vs_current(comp_right_details),
+            'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
+        }
+
+    # --- Lógica para el HTML simplificado ---
+    h2h_data = datos.get("h2h_data")
+    simplified_html = ""
+    if all([main_odds, h2h_data, home_name, away_name]):
+        simplified_html = generar_analisis_mercado_simplificado(main_odds, h2h_data, home_name, away_name)
+    
+    payload['simplified_html'] = simplified_html
+
+    return payload
+
+
 @app.route('/api/analisis/<string:match_id>')
 def api_analisis(match_id):
     """
     Servicio de analisis profundo bajo demanda.
     Devuelve tanto el payload complejo como el HTML simplificado.
+    Si el partido ya se preanalizó en segundo plano, el resultado sale de la cola al instante.
     """
+    if not match_id.isdigit():
+        return jsonify({'error': 'ID de partido inválido.'}), 400
     try:
-        datos = obtener_datos_completos_partido(match_id)
+        datos = cola_analisis.obtener_resultado(match_id)
         if not datos or (isinstance(datos, dict) and datos.get('error')):
             return jsonify({'error': (datos or {}).get('error', 'No se pudieron obtener datos.')}), 500
+        return jsonify(_payload_analisis(datos))
 
-        # --- Lógica para el payload complejo (la original) ---
-        def df_to_rows(df):
-            rows = []
-            try:
-                if df is not None and hasattr(df, 'iterrows'):
-                    for idx, row in df.iterrows():
-                        label = str(idx)
-                        label = label.replace('Shots on Goal', 'Tiros a Puerta')                                     .replace('Shots', 'Tiros')                                     .replace('Dangerous Attacks', 'Ataques Peligrosos')                                     .replace('Attacks', 'Ataques')
-                        try:
-                            home_val = row['Casa']
-                        except Exception:
-                            home_val = ''
-                        try:
-                            away_val = row['Fuera']
-                        except Exception:
-                            away_val = ''
-                        rows.append({'label': label, 'home': home_val or '', 'away': away_val or ''})
-            except Exception:
-                pass
-            return rows
-
-        payload = {
-            'home_team': datos.get('home_name', ''),
-            'away_team': datos.get('away_name', ''),
-            'final_score': datos.get('score'),
-            'match_date': datos.get('match_date'),
-            'match_time': datos.get('match_time'),
-            'match_datetime': datos.get('match_datetime'),
-            'recent_indirect_full': {
-                'last_home': None,
-                'last_away': None,
-                'h2h_col3': None
-            },
-            'comparativas_indirectas': {
-                'left': None,
-                'right': None
-            }
-        }
-        
-        # --- START COVERAGE CALCULATION ---
-        main_odds = datos.get("main_match_odds_data")
-        home_name = datos.get("home_name")
-        away_name = datos.get("away_name")
-        ah_actual_num = parse_ah_to_number_of(main_odds.get('ah_linea_raw', ''))
-        
-        favorito_actual_name = "Ninguno (línea en 0)"
-        if ah_actual_num is not None:
-            if ah_actual_num > 0: favorito_actual_name = home_name
-            elif ah_actual_num < 0: favorito_actual_name = away_name
+    except Exception as e:
+        print(f"Error en la ruta /api/analisis/{match_id}: {e}")
+        return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
+
+
+# Partes del payload de /api/analisis que quedan completas en cada etapa del estudio
+# (ver estudio_scraper._construir_datos_estudio).
+_PARTES_POR_ETAPA = {
+    'cabecera': ('home_team', 'away_team', 'final_score', 'match_date', 'match_time', 'match_datetime'),
+    'h2h': ('recent_indirect_full.h2h_general', 'simplified_html'),
+    'ultimos': ('recent_indirect_full.last_home', 'recent_indirect_full.last_away'),
+    'comparativas': ('comparativas_indirectas.left', 'comparativas_indirectas.right'),
+    'col3': ('recent_indirect_full.h2h_col3',),
+}
 
-        def get_cover_status_vs_current(details):
-            if not details or ah_actual_num is None:
-                return 'NEUTRO'
-            try:
-                score_str = details.get('score', '').replace(' ', '').replace(':', '-')
-                if not score_str or '?' in score_str:
-                    return 'NEUTRO'
-
-                h_home = details.get('home_team')
-                h_away = details.get('away_team')
-                
-                status, _ = check_handicap_cover(score_str, ah_actual_num, favorito_actual_name, h_home, h_away, home_name)
-                return status
-            except Exception:
-                return 'NEUTRO'
-                
-        # --- Análisis mejorado de H2H Rivales ---
-        def analyze_h2h_rivals(home_result, away_result):
-            if not home_result or not away_result:
-                return None
-                
-            try:
-                # Obtener resultados de los partidos
-                home_goals = list(map(int, home_result.get('score', '0-0').split('-')))
-                away_goals = list(map(int, away_result.get('score', '0-0').split('-')))
-                
-                # Calcular diferencia de goles
-                home_goal_diff = home_goals[0] - home_goals[1]
-                away_goal_diff = away_goals[0] - away_goals[1]
-                
-                # Comparar resultados
-                if home_goal_diff > away_goal_diff:
-                    return "Contra rivales comunes, el Equipo Local ha obtenido mejores resultados"
-                elif away_goal_diff > home_goal_diff:
-                    return "Contra rivales comunes, el Equipo Visitante ha obtenido mejores resultados"
-                else:
-                    return "Los rivales han tenido resultados similares"
-            except Exception:
-                return None
-                
-        # --- Análisis de Comparativas Indirectas ---
-        def analyze_indirect_comparison(result, team_name):
-            if not result:
-                return None
-                
-            try:
-                # Determinar si el equipo cubrió el handicap
-                status = get_cover_status_vs_current(result)
-                
-                if status == 'CUBIERTO':
-                    return f"Contra este rival, {team_name} habría cubierto el handicap"
-                elif status == 'NO CUBIERTO':
-                    return f"Contra este rival, {team_name} no habría cubierto el handicap"
-                else:
-                    return f"Contra este rival, el resultado para {team_name} sería indeterminado"
-            except Exception:
-                return None
-        # --- END COVERAGE CALCULATION ---
-
-        last_home = (datos.get('last_home_match') or {})
-        last_home_details = last_home.get('details') or {}
-        if last_home_details:
-            payload['recent_indirect_full']['last_home'] = {
-                'home': last_home_details.get('home_team'),
-                'away': last_home_details.get('away_team'),
-                'score': (last_home_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
-                'ou': last_home_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_home.get('stats')),
-                'date': last_home_details.get('date'),
-                'cover_status': get_cover_status_vs_current(last_home_details)
-            }
-
-        last_away = (datos.get('last_away_match') or {})
-        last_away_details = last_away.get('details') or {}
-        if last_away_details:
-            payload['recent_indirect_full']['last_away'] = {
-                'home': last_away_details.get('home_team'),
-                'away': last_away_details.get('away_team'),
-                'score': (last_away_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
-                'ou': last_away_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_away.get('stats')),
-                'date': last_away_details.get('date'),
-                'cover_status': get_cover_status_vs_current(last_away_details)
-            }
-
-        h2h_col3 = (datos.get('h2h_col3') or {})
-        h2h_col3_details = h2h_col3.get('details') or {}
-        if h2h_col3_details and h2h_col3_details.get('status') == 'found':
-            h2h_col3_details_adapted = {
-                'score': f"{h2h_col3_details.get('goles_home')}:{h2h_col3_details.get('goles_away')}",
-                'home_team': h2h_col3_details.get('h2h_home_team_name'),
-                'away_team': h2h_col3_details.get('h2h_away_team_name')
-            }
-            payload['recent_indirect_full']['h2h_col3'] = {
-                'home': h2h_col3_details.get('h2h_home_team_name'),
-                'away': h2h_col3_details.get('h2h_away_team_name'),
-                'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
-                'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
-                'ou': h2h_col3_details.get('ou_result') or '-',
-                'stats_rows': df_to_rows(h2h_col3.get('stats')),
-                'date': h2h_col3_details.get('date'),
-                'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
-                'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
-            }
-
-        h2h_general = (datos.get('h2h_general') or {})
-        h2h_general_details = h2h_general.get('details') or {}
-        if h2h_general_details:
-            score_text = h2h_general_details.get('res6') or ''
-            cover_input = {
-                'score': score_text,
-                'home_team': h2h_general_details.get('h2h_gen_home'),
-                'away_team': h2h_general_details.get('h2h_gen_away')
-            }
-            payload['recent_indirect_full']['h2h_general'] = {
-                'home': h2h_general_details.get('h2h_gen_home'),
-                'away': h2h_general_details.get('h2h_gen_away'),
-                'score': score_text.replace(':', ' : '),
-                'ah': h2h_general_details.get('ah6') or '-',
-                'ou': h2h_general_details.get('ou_result6') or '-',
-                'stats_rows': df_to_rows(h2h_general.get('stats')),
-                'date': h2h_general_details.get('date'),
-                'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
-            }
-
-        comp_left = (datos.get('comp_L_vs_UV_A') or {})
-        comp_left_details = comp_left.get('details') or {}
-        if comp_left_details:
-            payload['comparativas_indirectas']['left'] = {
-                'title_home_name': datos.get('home_name'),
-                'title_away_name': datos.get('away_name'),
-                'home_team': comp_left_details.get('home_team'),
-                'away_team': comp_left_details.get('away_team'),
-                'score': (comp_left_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
-                'ou': comp_left_details.get('ou_line') or '-',
-                'localia': comp_left_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_left.get('stats')),
-                'cover_status': get_cover_status_vs_current(comp_left_details),
-                'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
-            }
-
-        comp_right = (datos.get('comp_V_vs_UL_H') or {})
-        comp_right_details = comp_right.get('details') or {}
-        if comp_right_details:
-            payload['comparativas_indirectas']['right'] = {
-                'title_home_name': datos.get('home_name'),
-                'title_away_name': datos.get('away_name'),
-                'home_team': comp_right_details.get('home_team'),
-                'away_team': comp_right_details.get('away_team'),
-                'score': (comp_right_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
-                'ou': comp_right_details.get('ou_line') or '-',
-                'localia': comp_right_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_right.get('stats')),
-                'cover_status': get_cover_status_vs_current(comp_right_details),
-                'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
-            }
-
-        # --- Lógica para el HTML simplificado ---
-        h2h_data = datos.get("h2h_data")
-        simplified_html = ""
-        if all([main_odds, h2h_data, home_name, away_name]):
-            simplified_html = generar_analisis_mercado_simplificado(main_odds, h2h_data, home_name, away_name)
-        
-        payload['simplified_html'] = simplified_html
 
-        return jsonify(payload)
+def _seccion_analisis(etapa, datos):
+    """Trozo del payload de /api/analisis que corresponde a `etapa` (con la misma forma anidada)."""
+    payload = _payload_analisis(datos)
+    seccion = {}
+    for parte in _PARTES_POR_ETAPA[etapa]:
+        grupo, _, clave = parte.partition('.')
+        if clave:
+            seccion.setdefault(grupo, {})[clave] = payload.get(grupo, {}).get(clave)
+        else:
+            seccion[grupo] = payload.get(grupo)
+    if etapa == 'cabecera':
+        seccion['main_match_odds'] = datos.get('main_match_odds')
+    return seccion
+
+
+@app.route('/api/analisis/<string:match_id>/stream')
+def api_analisis_stream(match_id):
+    """
+    Variante progresiva de /api/analisis: envía cada sección en cuanto el estudio la
+    tiene (cabecera con equipos y cuotas, h2h, ultimos, comparativas, col3) y al final
+    el payload completo ("complete"). NDJSON por defecto; Server-Sent Events con
+    ?format=sse o Accept: text/event-stream. Los mensajes son
+    {"section": ..., "data": {...}} o {"section": "error", "error": ...}.
+    """
+    if not match_id.isdigit():
+        return jsonify({'error': 'ID de partido inválido.'}), 400
+    sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
 
+    def mensaje(cuerpo):
+        texto = json.dumps(cuerpo, ensure_ascii=False, default=str)
+        if sse:
+            return f"event: {cuerpo['section']}\ndata: {texto}\n\n"
+        return texto + "\n"
+
+    def generar():
+        try:
+            for etapa, datos in cola_analisis.seguir_resultado(match_id):
+                if etapa == 'error' or not datos or datos.get('error'):
+                    yield mensaje({'section': 'error', 'error': (datos or {}).get('error') or 'No se pudieron obtener datos.'})
+                    return
+                if etapa == 'completo':
+                    yield mensaje({'section': 'complete', 'data': _payload_analisis(datos)})
+                    return
+                yield mensaje({'section': etapa, 'data': _seccion_analisis(etapa, datos)})
+        except Exception as e:
+            print(f"Error en la ruta /api/analisis/{match_id}/stream: {e}")
+            yield mensaje({'section': 'error', 'error': 'Ocurrió un error interno en el servidor.'})
+
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(stream_with_context(generar()), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/analisis/<string:match_id>/status')
+def api_analisis_status(match_id):
+    """Estado del trabajo de análisis del partido (en_cola, en_curso, completado o error)."""
+    if not match_id.isdigit():
+        return jsonify({'error': 'ID de partido inválido.'}), 400
+    estado = cola_analisis.estado_trabajo(match_id)
+    if estado is None:
+        return jsonify({'match_id': match_id, 'estado': 'desconocido'}), 404
+    return jsonify(estado)
+
+
+@app.route('/api/analisis/<string:match_id>/result')
+def api_analisis_result(match_id):
+    """
+    Resultado de un análisis lanzado con /start_analysis_background, sin esperar:
+    202 mientras sigue en cola o en curso, 404 si no se ha pedido.
+    """
+    if not match_id.isdigit():
+        return jsonify({'error': 'ID de partido inválido.'}), 400
+    datos = cola_analisis.resultado_si_listo(match_id)
+    if datos is None:
+        estado = cola_analisis.estado_trabajo(match_id)
+        if estado is None:
+            return jsonify({'match_id': match_id, 'estado': 'desconocido'}), 404
+        if estado['estado'] == cola_analisis.ERROR:
+            return jsonify({'error': estado['error'], **estado}), 500
+        return jsonify(estado), 202
+    try:
+        return jsonify(_payload_analisis(datos))
     except Exception as e:
-        print(f"Error en la ruta /api/analisis/{match_id}: {e}")
+        print(f"Error en la ruta /api/analisis/{match_id}/result: {e}")
         return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
 
 @app.route('/start_analysis_background', methods=['POST'])
 def start_analysis_background():
-    match_id = request.json.get('match_id')
+    match_id = str((request.get_json(silent=True) or {}).get('match_id') or '').strip()
     if not match_id:
         return jsonify({'status': 'error', 'message': 'No se proporcionó match_id'}), 400
+    if not match_id.isdigit():
+        return jsonify({'status': 'error', 'message': 'ID de partido inválido.'}), 400
 
-    def analysis_worker(app, match_id):
-        with app.app_context():
-            print(f"Iniciando análisis en segundo plano para el ID: {match_id}")
-            try:
-                obtener_datos_completos_partido(match_id)
-                print(f"Análisis en segundo plano finalizado para el ID: {match_id}")
-            except Exception as e:
-                print(f"Error en el hilo de análisis para el ID {match_id}: {e}")
-
-    thread = threading.Thread(target=analysis_worker, args=(app, match_id))
-    thread.start()
-
-    return jsonify({'status': 'success', 'message': f'Análisis iniciado para el partido {match_id}'})
+    try:
+        cola_analisis.encolar(match_id, cola_analisis.PRIORIDAD_NORMAL)
+    except cola_analisis.ColaLlenaError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+
+    return jsonify({
+        'status': 'success',
+        'message': f'Análisis iniciado para el partido {match_id}',
+        'job': cola_analisis.estado_trabajo(match_id),
+    }), 202
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) # debug=True es útil para desarrollar
@@ -0,0 +1,103 @@
+"""
+Arranque de un worker: tiempo de `import app` y RSS del proceso justo después, cada
+medición en un intérprete nuevo (sin módulos ya cargados ni .pyc en memoria).
+
+Informa también de qué dependencias pesadas quedan cargadas tras importar la app:
+pandas no debería aparecer nunca, y selenium y playwright solo cuando se usa un
+navegador (o con SELENIUM_WARMUP / PLAYWRIGHT_WARMUP activos).
+
+Se mide con el entorno de quien lo lanza, así que sin variables es la configuración
+por defecto, la desplegada (render.yaml): sin precalentar navegadores. Con
+`--precalentar` se activan los dos precalentamientos y se espera a que terminen, para
+ver lo que cuesta cada worker si se encienden.
+
+Uso: python benchmarks/bench_arranque.py [--repeticiones 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+PESADOS = ("pandas", "numpy", "selenium", "playwright")
+
+_MEDIR = f"""
+import json, sys, time
+inicio = time.perf_counter()
+import app
+ms = (time.perf_counter() - inicio) * 1000
+with open("/proc/self/status") as f:
+    rss = next((int(l.split()[1]) // 1024 for l in f if l.startswith("VmRSS:")), None)
+if {{precalentar}}:
+    # Los precalentamientos van en segundo plano: se da tiempo a que lancen los navegadores.
+    time.sleep({{espera}})
+with open("/proc/self/status") as f:
+    rss_total = next((int(l.split()[1]) // 1024 for l in f if l.startswith("VmRSS:")), None)
+print(json.dumps({{"ms": ms, "rss_mb": rss, "rss_total_mb": rss_total,
+                  "cargados": [m for m in {PESADOS!r} if m in sys.modules]}}))
+"""
+
+
+def _rss_hijos_mb(pid: int) -> int:
+    """RSS de los procesos descendientes de `pid` (los navegadores lanzados)."""
+    total = 0
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+            padre, rss_paginas = int(campos[1]), int(campos[21])
+        except (OSError, IndexError, ValueError):
+            continue
+        if padre == pid:
+            total += rss_paginas * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024) + _rss_hijos_mb(int(entrada))
+    return total
+
+
+def _medir_una_vez(precalentar: bool, espera: float) -> dict:
+    entorno = dict(os.environ, PYTHONPATH=str(RAIZ))
+    if precalentar:
+        entorno.update(PLAYWRIGHT_WARMUP="1", SELENIUM_WARMUP="1")
+    codigo = _MEDIR.replace("{precalentar}", str(precalentar)).replace("{espera}", str(espera))
+    proceso = subprocess.Popen([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    if precalentar:
+        time.sleep(espera * 0.9)
+        hijos = _rss_hijos_mb(proceso.pid)
+    salida, _ = proceso.communicate()
+    medida = json.loads(salida.strip().splitlines()[-1])
+    medida["rss_navegadores_mb"] = hijos if precalentar else 0
+    return medida
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--precalentar", action="store_true",
+                        help="activa SELENIUM_WARMUP y PLAYWRIGHT_WARMUP (por defecto, apagados)")
+    parser.add_argument("--espera", type=float, default=15.0,
+                        help="segundos que se deja a los precalentamientos antes de medir")
+    args = parser.parse_args()
+
+    modo = "con precalentamiento" if args.precalentar else "por defecto (sin precalentar navegadores)"
+    print(f"configuración: {modo}")
+    medidas = [_medir_una_vez(args.precalentar, args.espera) for _ in range(args.repeticiones)]
+    tiempos = [m["ms"] for m in medidas]
+    rss = [m["rss_mb"] for m in medidas if m["rss_mb"] is not None]
+    print(f"import app: mediana {statistics.median(tiempos):.0f} ms (mín {min(tiempos):.0f}, máx {max(tiempos):.0f})")
+    if rss:
+        print(f"RSS tras importar: {statistics.median(rss):.0f} MB")
+    if args.precalentar:
+        print(f"RSS del worker tras precalentar: {statistics.median(m['rss_total_mb'] for m in medidas):.0f} MB"
+              f" + navegadores {statistics.median(m['rss_navegadores_mb'] for m in medidas):.0f} MB")
+    print(f"dependencias pesadas cargadas: {', '.join(medidas[-1]['cargados']) or 'ninguna'}")
+
+
+if __name__ == "__main__":
+    main()
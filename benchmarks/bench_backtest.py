@@ -0,0 +1,85 @@
+"""
+Comparación de rendimiento: backtest de handicap asiático vectorizado (modules/backtest_ah)
+frente a liquidar partido a partido con check_handicap_cover.
+
+Los partidos son sintéticos (marcadores de 0 a 5 goles, líneas de -3 a 3 en cuartos) y
+se generan con semilla fija. Se miden una temporada de liga (380 partidos) y un
+historial grande; el bucle de referencia solo liquida, sin agrupar ni calcular ROI.
+Antes de medir se comprueba que las dos liquidaciones coinciden partido a partido.
+
+Uso: python benchmarks/bench_backtest.py [--partidos 100000] [--repeticiones 5]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import numpy as np  # noqa: E402
+
+from modules import backtest_ah, liquidacion  # noqa: E402
+from modules.utils import check_handicap_cover  # noqa: E402
+
+LINEAS = [x / 4 for x in range(-12, 13)]
+LEGADO = {"CUBIERTO": (liquidacion.WIN, liquidacion.HALF_WIN), "PUSH": (liquidacion.PUSH,),
+          "NO CUBIERTO": (liquidacion.LOSS, liquidacion.HALF_LOSS)}
+
+
+def _filas(n: int, semilla: int = 7):
+    azar = random.Random(semilla)
+    return [
+        (azar.randint(0, 5), azar.randint(0, 5), azar.choice(LINEAS),
+         round(azar.uniform(0.8, 1.1), 2), round(azar.uniform(0.8, 1.1), 2),
+         azar.choice([2.0, 2.25, 2.5, 2.75, 3.0]), azar.choice(["36", "31", "8", "34"]))
+        for _ in range(n)
+    ]
+
+
+def _liquidar_legado(filas):
+    resultados = []
+    for goles_local, goles_visitante, linea, *_ in filas:
+        favorito = "L" if linea > 0 else "V" if linea < 0 else ""
+        estado, _ = check_handicap_cover(f"{goles_local}-{goles_visitante}", linea, favorito, "L", "V", "L")
+        resultados.append(estado)
+    return resultados
+
+
+def _comprobar(filas, datos):
+    nuevos = liquidacion.liquidar_ah(datos.goles_local, datos.goles_visitante, np.abs(datos.linea), datos.linea >= 0)
+    for legado, nuevo in zip(_liquidar_legado(filas), nuevos):
+        if int(nuevo) not in LEGADO[legado]:
+            raise SystemExit(f"Liquidación distinta: {legado} frente a {int(nuevo)}")
+
+
+def _medir(funcion, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--partidos", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    for etiqueta, n in (("temporada", 380), ("historial", args.partidos)):
+        filas = _filas(n)
+        datos = backtest_ah.datos_desde_filas(filas)
+        _comprobar(filas, datos)
+        legado = _medir(lambda: _liquidar_legado(filas), args.repeticiones)
+        simple = _medir(lambda: backtest_ah.backtest(datos), args.repeticiones)
+        completo = _medir(lambda: backtest_ah.backtest(datos, backtest_ah.AGRUPACIONES), args.repeticiones)
+        print(f"{etiqueta:10s} {n:>7d} partidos | bucle check_handicap_cover {legado:9.2f} ms"
+              f" | vectorizado por bucket {simple:7.2f} ms | por las 4 agrupaciones {completo:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
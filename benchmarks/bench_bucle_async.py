@@ -0,0 +1,124 @@
+"""
+Comparación de rendimiento: asyncio.run por llamada frente al event loop persistente
+(modules/bucle_async) en la ruta de carga de listados de app.py.
+
+Se reproduce la configuración de producción (gunicorn --workers 1 --threads 4): un
+único proceso con 4 hilos que atienden peticiones a la vez. Cada "petición" ejecuta
+`_load_listing_async` (descarga con requests vía asyncio.to_thread + extracción), que
+es lo que antes se hacía con asyncio.run en cada ruta de listado.
+
+NowGoal se sustituye por un servidor HTTP local que sirve html_extraer/index_web.txt
+con una latencia fija (LATENCIA_MS) para simular la red. Se miden dos variantes:
+- "listado": página real de ~3 MB con la extracción completa;
+- "solo_bucle": página mínima y extractor vacío, para aislar el coste del loop.
+
+Uso: python benchmarks/bench_bucle_async.py [--peticiones 80] [--hilos 4]
+"""
+import argparse
+import asyncio
+import http.server
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault("PLAYWRIGHT_WARMUP", "0")
+os.environ.setdefault("SELENIUM_WARMUP", "0")
+# El servidor local no manda validadores, pero por si acaso: nada de caché de páginas.
+os.environ.setdefault("NOWGOAL_PAGE_CACHE", "0")
+# Se mide el loop, no el limitador de peticiones (el servidor local no frena).
+os.environ.setdefault("LIMITADOR", "0")
+
+import app  # noqa: E402
+from modules import bucle_async  # noqa: E402
+
+LATENCIA_MS = 40
+PAGINA_MINIMA = "<html><body><table><tr id='tr1_1'><td></td></tr></table></body></html>"
+
+
+class _Manejador(http.server.BaseHTTPRequestHandler):
+    paginas = {}
+
+    def do_GET(self):
+        cuerpo = self.paginas.get(self.path.split("?")[0])
+        time.sleep(LATENCIA_MS / 1000)
+        if cuerpo is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _arrancar_servidor():
+    _Manejador.paginas = {
+        "/": (RAIZ / "html_extraer" / "index_web.txt").read_bytes(),
+        "/minima": PAGINA_MINIMA.encode(),
+    }
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def _carga(variante):
+    if variante == "listado":
+        return app._load_listing_async(None, None, app._extract_finished_matches)
+    return app._load_listing_async("minima", None, lambda html: [{"handicap": ""}])
+
+
+def _medir(modo, variante, peticiones, hilos):
+    if modo == "asyncio.run":
+        ejecutar = asyncio.run
+    else:
+        ejecutar = lambda corrutina: bucle_async.ejecutar(corrutina)
+
+    def peticion(_):
+        t0 = time.perf_counter()
+        resultado = ejecutar(_carga(variante))
+        if resultado is None:
+            raise RuntimeError("la carga no devolvió datos")
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        list(pool.map(peticion, range(hilos)))  # calentamiento
+        inicio = time.perf_counter()
+        latencias = sorted(pool.map(peticion, range(peticiones)))
+        total = time.perf_counter() - inicio
+    return {
+        "peticiones_por_s": peticiones / total,
+        "p50_ms": statistics.median(latencias) * 1000,
+        "p95_ms": latencias[int(len(latencias) * 0.95) - 1] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=80)
+    parser.add_argument("--hilos", type=int, default=4, help="hilos del worker (gunicorn --threads)")
+    args = parser.parse_args(argv)
+
+    servidor = _arrancar_servidor()
+    app.URL_NOWGOAL = f"http://127.0.0.1:{servidor.server_address[1]}/"
+
+    print(f"{args.hilos} hilos, {args.peticiones} peticiones, latencia simulada {LATENCIA_MS} ms")
+    print(f"{'variante':12} {'modo':18} {'pet/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for variante, peticiones in (("solo_bucle", args.peticiones * 5), ("listado", args.peticiones)):
+        for modo in ("asyncio.run", "bucle persistente"):
+            r = _medir(modo, variante, peticiones, args.hilos)
+            print(f"{variante:12} {modo:18} {r['peticiones_por_s']:8.1f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f}")
+    servidor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
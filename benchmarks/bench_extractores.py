@@ -0,0 +1,269 @@
+"""
+Benchmarks de los extractores y análisis sobre las páginas guardadas en html_extraer/.
+
+Para cada función se mide:
+- tiempo por llamada (mediana de varias repeticiones) y páginas por segundo,
+- pico de memoria asignada durante una llamada (tracemalloc),
+- pico de RSS del proceso durante las repeticiones (VmHWM, solo Linux).
+
+Los resultados se comparan con benchmarks/baseline.json: si una función tarda más que
+la referencia por encima de la tolerancia (o asigna bastante más memoria) el script
+termina con código 1. No se hace ninguna petición de red: las páginas son los
+ficheros guardados y el estudio completo se ejecuta sin estadísticas de progresión.
+
+Uso:
+    python benchmarks/bench_extractores.py                   # medir y comparar
+    python benchmarks/bench_extractores.py --solo listado    # solo los que contienen "listado"
+    python benchmarks/bench_extractores.py --guardar-baseline
+
+Los tiempos de la referencia dependen de la máquina: tras cambiar de máquina (o tras
+una optimización que se quiera fijar) hay que regenerarla con --guardar-baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+# Importar app no debe arrancar navegadores.
+os.environ.setdefault("PLAYWRIGHT_WARMUP", "0")
+os.environ.setdefault("SELENIUM_WARMUP", "0")
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import app  # noqa: E402
+from modules import estudio_scraper  # noqa: E402
+from modules.analisis_avanzado import generar_analisis_comparativas_indirectas  # noqa: E402
+from modules.analisis_reciente import analizar_rendimiento_reciente_con_handicap, comparar_lineas_handicap_recientes  # noqa: E402
+from modules.analisis_rivales import analizar_rivales_comunes, analizar_contra_rival_del_rival  # noqa: E402
+from modules.funciones_resumen import generar_resumen_rendimiento_reciente  # noqa: E402
+from modules.pagina_h2h import construir_pagina_h2h  # noqa: E402
+
+FIXTURES = RAIZ / "html_extraer"
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+TOLERANCIA_TIEMPO = float(os.environ.get("BENCH_TOLERANCIA_TIEMPO", "0.5"))
+TOLERANCIA_MEMORIA = float(os.environ.get("BENCH_TOLERANCIA_MEMORIA", "0.25"))
+# Margen absoluto de tiempo que siempre se tolera (ruido del reloj y del planificador).
+MARGEN_TIEMPO_S = 0.0005
+REPETICIONES_MIN = 3
+TIEMPO_OBJETIVO_S = 1.0
+
+
+def _leer_fixture(nombre):
+    return (FIXTURES / nombre).read_text(encoding="utf-8")
+
+
+def _comprobar_fixture_live(html):
+    """
+    live.txt debe ser la página de estadísticas /match/live-{id} de un partido terminado
+    (no el listado de resultados en directo): si el parseo no encuentra el bloque
+    teamTechDiv_detail con estadísticas, el benchmark no mediría el camino real.
+    """
+    filas, completas = estudio_scraper._parse_progression_stats_rows(html)
+    # "Red Cards" siempre sale (cae a contar eventos); hace falta al menos otra estadística.
+    if not completas or not any(fila["Estadistica_EN"] != "Red Cards" for fila in filas):
+        raise SystemExit("html_extraer/live.txt no es una página /match/live-{id} con estadísticas de un partido terminado")
+
+
+def _construir_benchmarks():
+    """Lista de (nombre, fixture, función sin argumentos)."""
+    index_web = _leer_fixture("index_web.txt")
+    resultados = _leer_fixture("resultados.txt")
+    analisis = _leer_fixture("analisis.txt")
+    live = _leer_fixture("live.txt")
+    _comprobar_fixture_live(live)
+
+    soup = BeautifulSoup(analisis, "lxml")
+    pagina = construir_pagina_h2h(soup)
+    _, _, league_id, home, away, _ = estudio_scraper.get_team_league_info_from_script_of(pagina)
+    odds = estudio_scraper.extract_bet365_initial_odds_of(pagina)
+    h2h = estudio_scraper.extract_h2h_data_of(pagina, home, away, None)
+    ultimo_local = estudio_scraper.extract_last_match_in_league_of(pagina, "table_v1", home, league_id, True) or {}
+    ultimo_visitante = estudio_scraper.extract_last_match_in_league_of(pagina, "table_v2", away, league_id, False) or {}
+    linea_ah = estudio_scraper.parse_ah_to_number_of(odds.get("ah_linea_raw", "0"))
+    comparativas = estudio_scraper.extract_indirect_comparison_data(pagina)
+    rival_local = ultimo_visitante.get("home_team") or "N/A"
+    rival_visitante = ultimo_local.get("away_team") or "N/A"
+
+    def estudio_completo():
+        soup_estudio = BeautifulSoup(analisis, "lxml")
+        h2h_col3 = lambda key_id, a_id, b_id, a_name, b_name: estudio_scraper._buscar_h2h_col3_en_soup(soup_estudio, a_id, b_id, a_name, b_name)
+        # Las estadísticas de progresión son peticiones HTTP: fuera del benchmark.
+        descargar_stats = estudio_scraper.get_match_progression_stats_batch
+        estudio_scraper.get_match_progression_stats_batch = lambda match_ids: {}
+        try:
+            return estudio_scraper._construir_datos_estudio("1", soup_estudio, h2h_col3)
+        finally:
+            estudio_scraper.get_match_progression_stats_batch = descargar_stats
+
+    return [
+        # Listados (app.py)
+        ("listado.proximos", "index_web.txt", lambda: app._extract_upcoming_matches(index_web)),
+        ("listado.finalizados_index", "index_web.txt", lambda: app._extract_finished_matches(index_web)),
+        ("listado.finalizados", "resultados.txt", lambda: app._extract_finished_matches(resultados)),
+        ("listado.proximos_resultados", "resultados.txt", lambda: app._extract_upcoming_matches(resultados)),
+        # Página de estadísticas /match/live-{id} de un partido terminado
+        ("live.progression_stats", "live.txt", lambda: estudio_scraper._parse_progression_stats_rows(live)),
+        # Página h2h: parseo y modelo
+        ("h2h.beautifulsoup_lxml", "analisis.txt", lambda: BeautifulSoup(analisis, "lxml")),
+        ("h2h.soup_y_pagina", "analisis.txt", lambda: construir_pagina_h2h(BeautifulSoup(analisis, "lxml"))),
+        # Extractores de estudio_scraper sobre la página ya construida
+        ("extract.team_league_info", "analisis.txt", lambda: estudio_scraper.get_team_league_info_from_script_of(pagina)),
+        ("extract.match_datetime", "analisis.txt", lambda: estudio_scraper.get_match_datetime_from_script_of(pagina)),
+        ("extract.final_score", "analisis.txt", lambda: estudio_scraper.extract_final_score_of(pagina)),
+        ("extract.rival_a", "analisis.txt", lambda: estudio_scraper.get_rival_a_for_original_h2h_of(pagina, league_id)),
+        ("extract.rival_b", "analisis.txt", lambda: estudio_scraper.get_rival_b_for_original_h2h_of(pagina, league_id)),
+        ("extract.last_match_home", "analisis.txt", lambda: estudio_scraper.extract_last_match_in_league_of(pagina, "table_v1", home, league_id, True)),
+        ("extract.last_match_away", "analisis.txt", lambda: estudio_scraper.extract_last_match_in_league_of(pagina, "table_v2", away, league_id, False)),
+        ("extract.bet365_initial_odds", "analisis.txt", lambda: estudio_scraper.extract_bet365_initial_odds_of(pagina)),
+        ("extract.standings_home", "analisis.txt", lambda: estudio_scraper.extract_standings_data_from_h2h_page_of(pagina, home)),
+        ("extract.over_under_home", "analisis.txt", lambda: estudio_scraper.extract_over_under_stats_from_div_of(pagina, "home")),
+        ("extract.h2h_data", "analisis.txt", lambda: estudio_scraper.extract_h2h_data_of(pagina, home, away, None)),
+        ("extract.comparative_home", "analisis.txt", lambda: estudio_scraper.extract_comparative_match_of(pagina, "table_v1", home, rival_local, league_id, True)),
+        ("extract.indirect_comparison", "analisis.txt", lambda: estudio_scraper.extract_indirect_comparison_data(pagina)),
+        ("extract.h2h_col3", "analisis.txt", lambda: estudio_scraper._buscar_h2h_col3_en_soup(soup, "0", "0", "A", "B")),
+        # Módulos de análisis
+        ("analisis.mercado_completo", "analisis.txt", lambda: estudio_scraper.generar_analisis_completo_mercado(odds, h2h, home, away)),
+        ("analisis.mercado_simplificado", "analisis.txt", lambda: estudio_scraper.generar_analisis_mercado_simplificado(odds, h2h, home, away)),
+        ("analisis.comparativas_indirectas", "analisis.txt", lambda: generar_analisis_comparativas_indirectas(comparativas)),
+        ("analisis.rendimiento_reciente", "analisis.txt", lambda: analizar_rendimiento_reciente_con_handicap(pagina, home, True)),
+        ("analisis.comparar_lineas", "analisis.txt", lambda: comparar_lineas_handicap_recientes(pagina, home, linea_ah or 0, True)),
+        ("analisis.rivales_comunes", "analisis.txt", lambda: analizar_rivales_comunes(pagina, home, away)),
+        ("analisis.contra_rival_del_rival", "analisis.txt", lambda: analizar_contra_rival_del_rival(pagina, home, away, rival_local, rival_visitante)),
+        ("analisis.resumen_rendimiento", "analisis.txt", lambda: generar_resumen_rendimiento_reciente(pagina, home, away, linea_ah)),
+        # Extremo a extremo: HTML -> datos del estudio, sin red
+        ("estudio.completo_sin_red", "analisis.txt", estudio_completo),
+    ]
+
+
+def _leer_status_kb(campo):
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith(campo + ":"):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reiniciar_pico_rss():
+    """Reinicia VmHWM para medir el pico de esta función y no el de todo el proceso."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def medir(funcion):
+    funcion()  # calentamiento (cachés de regex, imports perezosos...)
+
+    _reiniciar_pico_rss()
+    rss_inicial_kb = _leer_status_kb("VmRSS")
+    tiempos = []
+    inicio = time.perf_counter()
+    while len(tiempos) < REPETICIONES_MIN or time.perf_counter() - inicio < TIEMPO_OBJETIVO_S:
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+        if len(tiempos) >= 1000:
+            break
+    pico_rss_kb = _leer_status_kb("VmHWM")
+
+    tracemalloc.start()
+    funcion()
+    _, pico_asignado = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mediana = statistics.median(tiempos)
+    return {
+        "mediana_s": mediana,
+        "minimo_s": min(tiempos),
+        "repeticiones": len(tiempos),
+        "paginas_por_s": 1 / mediana if mediana > 0 else None,
+        "asignado_pico_kb": round(pico_asignado / 1024, 1),
+        "rss_pico_mb": round(pico_rss_kb / 1024, 1) if pico_rss_kb else None,
+        "rss_delta_mb": round((pico_rss_kb - rss_inicial_kb) / 1024, 1) if pico_rss_kb and rss_inicial_kb else None,
+    }
+
+
+def _comparar(nombre, actual, referencia):
+    """Devuelve la lista de regresiones de `nombre` frente a la referencia."""
+    if not referencia:
+        return []
+    regresiones = []
+    # Las funciones de microsegundos fluctúan más que cualquier tolerancia relativa.
+    limite_t = max(referencia["mediana_s"] * (1 + TOLERANCIA_TIEMPO), referencia["mediana_s"] + MARGEN_TIEMPO_S)
+    if actual["mediana_s"] > limite_t:
+        regresiones.append(
+            f"{nombre}: {actual['mediana_s'] * 1000:.2f} ms > {referencia['mediana_s'] * 1000:.2f} ms (+{TOLERANCIA_TIEMPO:.0%})"
+        )
+    # Por debajo de 64 KB el pico de tracemalloc es ruido de la propia medición.
+    limite_m = max(referencia["asignado_pico_kb"] * (1 + TOLERANCIA_MEMORIA), 64)
+    if actual["asignado_pico_kb"] > limite_m:
+        regresiones.append(
+            f"{nombre}: asigna {actual['asignado_pico_kb']:.0f} KB > {referencia['asignado_pico_kb']:.0f} KB (+{TOLERANCIA_MEMORIA:.0%})"
+        )
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--solo", help="ejecutar solo los benchmarks cuyo nombre contenga este texto")
+    parser.add_argument("--guardar-baseline", action="store_true", help="guardar los resultados como nueva referencia")
+    parser.add_argument("--json", help="escribir también los resultados en este fichero")
+    args = parser.parse_args(argv)
+
+    referencia = {}
+    if BASELINE_PATH.exists():
+        referencia = json.loads(BASELINE_PATH.read_text(encoding="utf-8")).get("resultados", {})
+
+    resultados = {}
+    regresiones = []
+    print(f"{'benchmark':38} {'fixture':15} {'ms/llamada':>11} {'páginas/s':>10} {'asig. KB':>10} {'RSS MB':>8} {'ΔRSS MB':>8}")
+    for nombre, fixture, funcion in _construir_benchmarks():
+        if args.solo and args.solo not in nombre:
+            continue
+        r = medir(funcion)
+        r["fixture"] = fixture
+        resultados[nombre] = r
+        regs = _comparar(nombre, r, referencia.get(nombre))
+        regresiones.extend(regs)
+        print(
+            f"{nombre:38} {fixture:15} {r['mediana_s'] * 1000:11.2f} {r['paginas_por_s']:10.1f} "
+            f"{r['asignado_pico_kb']:10.0f} {r['rss_pico_mb'] or 0:8.1f} {r['rss_delta_mb'] or 0:8.1f}"
+            + ("  <-- REGRESIÓN" if regs else "")
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultados, indent=2), encoding="utf-8")
+
+    if args.guardar_baseline:
+        if args.solo and referencia:
+            resultados = {**referencia, **resultados}
+        BASELINE_PATH.write_text(json.dumps({
+            "python": platform.python_version(),
+            "maquina": platform.machine(),
+            "resultados": resultados,
+        }, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Referencia guardada en {BASELINE_PATH}")
+        return 0
+
+    if regresiones:
+        print(f"\n{len(regresiones)} regresiones frente a {BASELINE_PATH.name}:")
+        for r in regresiones:
+            print("  -", r)
+        return 1
+    print("\nSin regresiones." if referencia else "\nNo hay referencia: ejecuta con --guardar-baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
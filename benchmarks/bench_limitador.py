@@ -0,0 +1,125 @@
+"""
+Limitador adaptativo (modules/limitador_peticiones) frente a un servidor que frena.
+
+NowGoal se sustituye por un servidor HTTP local que admite CAPACIDAD peticiones/s
+(token bucket propio) y responde 429 a las que pasan de ahí, con latencia fija. Varios
+hilos descargan páginas distintas con cliente_http (sin caché de páginas), con y sin
+limitador, y se mide:
+- páginas servidas por segundo (lo que de verdad llega a la app);
+- 429 que ha tenido que devolver el servidor (la presión que le metemos);
+- descargas que acaban en error tras agotar los reintentos;
+- tasa final a la que ha convergido el limitador.
+
+Uso: python benchmarks/bench_limitador.py [--capacidad 15] [--hilos 8] [--segundos 10]
+"""
+import argparse
+import http.server
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault("NOWGOAL_PAGE_CACHE", "0")
+
+from modules import cliente_http, limitador_peticiones  # noqa: E402
+
+LATENCIA_MS = 30
+CUERPO = b"<html><body>ok</body></html>"
+
+
+class _Manejador(http.server.BaseHTTPRequestHandler):
+    capacidad = 15.0
+    fichas = 15.0
+    repuesto_en = time.monotonic()
+    lock = threading.Lock()
+    contadores = {"200": 0, "429": 0}
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            ahora = time.monotonic()
+            cls.fichas = min(cls.capacidad, cls.fichas + (ahora - cls.repuesto_en) * cls.capacidad)
+            cls.repuesto_en = ahora
+            admitida = cls.fichas >= 1
+            if admitida:
+                cls.fichas -= 1
+            cls.contadores["200" if admitida else "429"] += 1
+        time.sleep(LATENCIA_MS / 1000)
+        if not admitida:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(CUERPO)))
+        self.end_headers()
+        self.wfile.write(CUERPO)
+
+    def log_message(self, *args):
+        pass
+
+
+def _medir(base_url, con_limitador, hilos, segundos):
+    limitador_peticiones.LIMITADOR_ENABLED = con_limitador
+    limitador_peticiones._cubetas.clear()
+    _Manejador.contadores = {"200": 0, "429": 0}
+    _Manejador.fichas = _Manejador.capacidad
+    siguiente = iter(range(10**9))
+    fin = time.monotonic() + segundos
+    resultados = {"ok": 0, "error": 0}
+    lock = threading.Lock()
+
+    def trabajador(_):
+        while time.monotonic() < fin:
+            url = f"{base_url}p/{next(siguiente)}"
+            try:
+                cliente_http.obtener_html(url, timeout=5)
+                clave = "ok"
+            except Exception:
+                clave = "error"
+            with lock:
+                resultados[clave] += 1
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        list(pool.map(trabajador, range(hilos)))
+    total = time.monotonic() - inicio
+    estado = limitador_peticiones.estado_limitador().get("127.0.0.1", {})
+    return {
+        "paginas_por_s": resultados["ok"] / total,
+        "errores": resultados["error"],
+        "429": _Manejador.contadores["429"],
+        "tasa_final": estado.get("rate"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacidad", type=float, default=15.0, help="peticiones/s que admite el servidor")
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    _Manejador.capacidad = args.capacidad
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{servidor.server_address[1]}/"
+
+    print(f"servidor: {args.capacidad:g} pet/s, latencia {LATENCIA_MS} ms; {args.hilos} hilos durante {args.segundos:g} s")
+    print(f"{'modo':15} {'pág/s':>7} {'429':>7} {'errores':>8} {'tasa final':>11}")
+    for modo, activo in (("sin limitador", False), ("con limitador", True)):
+        r = _medir(base_url, activo, args.hilos, args.segundos)
+        tasa = "-" if not activo or r["tasa_final"] is None else f"{r['tasa_final']:.1f}"
+        print(f"{modo:15} {r['paginas_por_s']:7.1f} {r['429']:7d} {r['errores']:8d} {tasa:>11}")
+    servidor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+# modules/almacen_compartido.py
+"""
+Estado compartido entre los workers de gunicorn, en un fichero SQLite en modo WAL.
+
+Con un solo worker todo vivía en memoria; con varios, cada proceso descargaría y
+parsearía los mismos listados y calcularía los mismos estudios. Aquí hay tres piezas:
+
+- `conectar()`: abre las bases SQLite del proyecto (cachés de páginas, estudios,
+  estadísticas, historial y este almacén) en modo WAL, con synchronous=NORMAL y
+  espera ante bloqueos, para que varios procesos lean mientras uno escribe.
+- Publicaciones versionadas: `publicar()` guarda un valor (pickle + zlib) con una
+  versión creciente por espacio, en una sola transacción BEGIN IMMEDIATE: quien lee ve
+  la publicación entera o la anterior, nunca media. Se conservan las últimas N.
+- Turnos: `esperar_turno()` reparte entre procesos quién hace un trabajo caro (cargar
+  un listado, calcular un estudio). El que lo toma lo hace y publica; los demás
+  esperan a esa publicación en lugar de repetirlo. El turno caduca solo, por si el
+  worker que lo tenía muere a medias; para trabajos de duración imprevisible,
+  `mantener_turno()` lo renueva mientras duran y así la caducidad puede ser corta.
+
+Los turnos son por proceso: dentro de un worker, los hilos ya se coordinan con sus
+propios locks (snapshot_partidos, cola_analisis). Con ALMACEN_COMPARTIDO=0 no se
+publica nada y todos los turnos se conceden (comportamiento de un solo worker).
+"""
+import contextlib
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+ALMACEN_COMPARTIDO_ENABLED = os.environ.get("ALMACEN_COMPARTIDO", "1") == "1"
+ALMACEN_PATH = os.environ.get(
+    "ALMACEN_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "compartido.sqlite3"),
+)
+ALMACEN_BUSY_TIMEOUT_SECONDS = float(os.environ.get("ALMACEN_BUSY_TIMEOUT_SECONDS", "10"))
+ALMACEN_SONDEO_SECONDS = float(os.environ.get("ALMACEN_SONDEO_SECONDS", "0.25"))
+
+_ESQUEMA = (
+    "CREATE TABLE IF NOT EXISTS publicaciones ("
+    " espacio TEXT NOT NULL,"
+    " clave TEXT NOT NULL,"
+    " version INTEGER NOT NULL,"
+    " cuerpo BLOB NOT NULL,"
+    " publicado_en REAL NOT NULL,"
+    " PRIMARY KEY (espacio, clave, version))",
+    "CREATE TABLE IF NOT EXISTS contadores ("
+    " espacio TEXT PRIMARY KEY,"
+    " valor INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS turnos ("
+    " nombre TEXT PRIMARY KEY,"
+    " dueno TEXT NOT NULL,"
+    " expira_en REAL NOT NULL)",
+)
+
+_DUENO = f"{socket.gethostname()}:{os.getpid()}"
+
+_conexion = None
+_conexion_pid = None
+_lock = threading.Lock()
+
+
+def conectar(ruta: str, esquema=(), autocommit: bool = False) -> sqlite3.Connection:
+    """
+    Abre `ruta` (creando su carpeta) en modo WAL y crea `esquema` (sentencias
+    CREATE ... IF NOT EXISTS). Con `autocommit`, cada sentencia se confirma sola y las
+    transacciones se abren a mano con BEGIN.
+    """
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conexion = sqlite3.connect(ruta, timeout=ALMACEN_BUSY_TIMEOUT_SECONDS, check_same_thread=False,
+                               isolation_level=None if autocommit else "")
+    try:
+        # El modo WAL queda grabado en el fichero; basta con que un proceso lo active.
+        conexion.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError as exc:
+        print(f"No se pudo activar WAL en {ruta}: {exc}")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    for sentencia in esquema:
+        conexion.execute(sentencia)
+    if not autocommit:
+        conexion.commit()
+    return conexion
+
+
+def _obtener_conexion() -> sqlite3.Connection:
+    global _conexion, _conexion_pid, _DUENO
+    # Una conexión abierta antes de un fork (gunicorn --preload) no se puede usar en el hijo.
+    if _conexion is None or _conexion_pid != os.getpid():
+        _conexion = conectar(ALMACEN_PATH, _ESQUEMA, autocommit=True)
+        _conexion_pid = os.getpid()
+        _DUENO = f"{socket.gethostname()}:{_conexion_pid}"
+    return _conexion
+
+
+def publicar(espacio: str, clave: str, valor, conservar: int = 1) -> dict | None:
+    """
+    Publica `valor` como la nueva versión de `clave` y borra las que pasen de las
+    `conservar` más recientes. Devuelve {"version", "publicado_en"}, o None si el
+    almacén está desactivado o falla (quien publica sigue con su copia local).
+    Las versiones crecen por espacio, no por clave.
+    """
+    if not ALMACEN_COMPARTIDO_ENABLED:
+        return None
+    cuerpo = zlib.compress(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL), 6)
+    ahora = time.time()
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                version = conexion.execute(
+                    "INSERT INTO contadores (espacio, valor) VALUES (?, 1)"
+                    " ON CONFLICT(espacio) DO UPDATE SET valor = valor + 1 RETURNING valor",
+                    (espacio,),
+                ).fetchone()[0]
+                conexion.execute(
+                    "INSERT INTO publicaciones (espacio, clave, version, cuerpo, publicado_en) VALUES (?, ?, ?, ?, ?)",
+                    (espacio, clave, version, cuerpo, ahora),
+                )
+                conexion.execute(
+                    "DELETE FROM publicaciones WHERE espacio = ? AND clave = ? AND version NOT IN ("
+                    " SELECT version FROM publicaciones WHERE espacio = ? AND clave = ?"
+                    " ORDER BY version DESC LIMIT ?)",
+                    (espacio, clave, espacio, clave, max(1, conservar)),
+                )
+                conexion.execute("COMMIT")
+            except BaseException:
+                if conexion.in_transaction:
+                    conexion.execute("ROLLBACK")
+                raise
+    except sqlite3.Error as exc:
+        print(f"Almacén compartido no disponible al publicar {espacio}/{clave}: {exc}")
+        return None
+    return {"version": version, "publicado_en": ahora}
+
+
+def leer(espacio: str, clave: str, version: int | None = None, mas_nueva_que: int = 0) -> dict | None:
+    """
+    Publicación de `clave` ({"version", "publicado_en", "valor"}): la versión pedida, o
+    la más reciente si es posterior a `mas_nueva_que`. None si no hay (el valor solo se
+    descomprime cuando hay algo nuevo que devolver).
+    """
+    if not ALMACEN_COMPARTIDO_ENABLED:
+        return None
+    if version is not None:
+        consulta = ("SELECT version, publicado_en, cuerpo FROM publicaciones"
+                    " WHERE espacio = ? AND clave = ? AND version = ?", (espacio, clave, version))
+    else:
+        consulta = ("SELECT version, publicado_en, cuerpo FROM publicaciones"
+                    " WHERE espacio = ? AND clave = ? AND version > ? ORDER BY version DESC LIMIT 1",
+                    (espacio, clave, mas_nueva_que))
+    try:
+        with _lock:
+            fila = _obtener_conexion().execute(*consulta).fetchone()
+    except sqlite3.Error as exc:
+        print(f"Almacén compartido no disponible al leer {espacio}/{clave}: {exc}")
+        return None
+    if fila is None:
+        return None
+    try:
+        valor = pickle.loads(zlib.decompress(fila[2]))
+    except (pickle.UnpicklingError, zlib.error, EOFError, AttributeError, ImportError) as exc:
+        print(f"Publicación {espacio}/{clave} v{fila[0]} ilegible, se ignora: {exc}")
+        return None
+    return {"version": fila[0], "publicado_en": fila[1], "valor": valor}
+
+
+def tomar_turno(nombre: str, segundos: float) -> bool:
+    """
+    Intenta quedarse el turno `nombre` durante `segundos`. Se concede si está libre,
+    caducado o ya es de este proceso. Si el almacén falla se concede (mejor repetir un
+    trabajo que no hacerlo).
+    """
+    if not ALMACEN_COMPARTIDO_ENABLED:
+        return True
+    ahora = time.time()
+    try:
+        with _lock:
+            cursor = _obtener_conexion().execute(
+                "INSERT INTO turnos (nombre, dueno, expira_en) VALUES (?, ?, ?)"
+                " ON CONFLICT(nombre) DO UPDATE SET dueno = excluded.dueno, expira_en = excluded.expira_en"
+                " WHERE turnos.expira_en < ? OR turnos.dueno = excluded.dueno",
+                (nombre, _DUENO, ahora + segundos, ahora),
+            )
+            return cursor.rowcount > 0
+    except sqlite3.Error as exc:
+        print(f"Almacén compartido no disponible al tomar el turno {nombre}: {exc}")
+        return True
+
+
+def soltar_turno(nombre: str):
+    """Libera el turno `nombre` si es de este proceso."""
+    if not ALMACEN_COMPARTIDO_ENABLED:
+        return
+    try:
+        with _lock:
+            _obtener_conexion().execute("DELETE FROM turnos WHERE nombre = ? AND dueno = ?", (nombre, _DUENO))
+    except sqlite3.Error as exc:
+        print(f"Almacén compartido no disponible al soltar el turno {nombre}: {exc}")
+
+
+def turno_ajeno(nombre: str) -> bool:
+    """True si otro proceso tiene el turno `nombre` sin caducar (no lo toma)."""
+    if not ALMACEN_COMPARTIDO_ENABLED:
+        return False
+    try:
+        with _lock:
+            fila = _obtener_conexion().execute(
+                "SELECT 1 FROM turnos WHERE nombre = ? AND dueno != ? AND expira_en >= ?",
+                (nombre, _DUENO, time.time()),
+            ).fetchone()
+    except sqlite3.Error as exc:
+        print(f"Almacén compartido no disponible al consultar el turno {nombre}: {exc}")
+        return False
+    return fila is not None
+
+
+@contextlib.contextmanager
+def mantener_turno(nombre: str, segundos: float):
+    """
+    Para usar con el turno `nombre` ya tomado: lo renueva cada tercio de `segundos`
+    desde un hilo aparte mientras dura el bloque, y al salir lo suelta. Si el proceso
+    muere, el turno caduca a los `segundos` como mucho.
+    """
+    parar = threading.Event()
+
+    def renovar():
+        while not parar.wait(segundos / 3):
+            if not tomar_turno(nombre, segundos):
+                print(f"Turno {nombre} perdido: lo ha tomado otro worker.")
+                return
+
+    hilo = threading.Thread(target=renovar, name=f"turno-{nombre}", daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        # Sin esperar al hilo, una renovación en curso podría volver a tomarlo tras soltarlo.
+        hilo.join()
+        soltar_turno(nombre)
+
+
+def esperar_turno(nombre: str, segundos: float, comprobar):
+    """
+    Toma el turno `nombre` o, mientras lo tenga otro worker, llama a `comprobar()` cada
+    ALMACEN_SONDEO_SECONDS hasta que devuelva algo distinto de None (lo que ese worker
+    ha publicado). Devuelve (True, None) con el turno tomado (hay que soltarlo al
+    terminar) o (False, resultado). Como el turno caduca a los `segundos`, la espera
+    nunca es más larga que eso.
+    """
+    while not tomar_turno(nombre, segundos):
+        resultado = comprobar()
+        if resultado is not None:
+            return False, resultado
+        time.sleep(ALMACEN_SONDEO_SECONDS)
+    # El turno puede quedar libre justo después de que otro worker publique: se comprueba
+    # una vez más antes de repetir su trabajo.
+    resultado = comprobar()
+    if resultado is not None:
+        soltar_turno(nombre)
+        return False, resultado
+    return True, None
+
+
+def estado_almacen() -> dict:
+    """Resumen del almacén (para diagnóstico)."""
+    if not ALMACEN_COMPARTIDO_ENABLED:
+        return {"enabled": False}
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            publicaciones = conexion.execute(
+                "SELECT espacio, COUNT(*), MAX(version) FROM publicaciones GROUP BY espacio"
+            ).fetchall()
+            turnos = conexion.execute("SELECT COUNT(*) FROM turnos WHERE expira_en >= ?", (time.time(),)).fetchone()[0]
+    except sqlite3.Error as exc:
+        return {"enabled": True, "error": str(exc)}
+    return {
+        "enabled": True,
+        "owner": _DUENO,
+        "publications": {espacio: {"entries": n, "last_version": v} for espacio, n, v in publicaciones},
+        "active_turns": turnos,
+    }
@@ -1,15 +1,15 @@
 # modules/analisis_reciente.py
-import re
-import math
-from bs4 import BeautifulSoup
-from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover
+from modules.pagina_h2h import como_pagina_h2h
+import numpy as np
+from modules.liquidacion import PUSH, liquidar_ah, marcadores
+from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of
 
 def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=True):
     """
     Analiza el rendimiento reciente de un equipo con respecto al handicap.
     
     Args:
-        soup: BeautifulSoup object con el contenido de la página
+        soup: H2HPage (o BeautifulSoup) con el contenido de la página
         team_name: Nombre del equipo a analizar
         is_home_team: Booleano que indica si el equipo es local (True) o visitante (False)
     
@@ -18,55 +18,51 @@ def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=Tru
     """
     # Determinar qué tabla usar según si es equipo local o visitante
     table_id = "table_v1" if is_home_team else "table_v2"
-    table = soup.find("table", id=table_id)
+    pagina = como_pagina_h2h(soup)
+    filas = pagina.filas(table_id)
     
-    if not table:
+    if filas is None:
         return {"error": "No se encontró la tabla de partidos recientes"}
     
     # Extraer los últimos 5 partidos del equipo
     matches = []
     score_selector = 'fscore_1' if is_home_team else 'fscore_2'
     
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
+    clave = pagina.clave(team_name)
+    for fila in filas:
         if len(matches) >= 5:  # Limitar a los últimos 5 partidos
             break
             
         # Extraer información del partido
-        cells = row.find_all('td')
-        if len(cells) < 12:
+        if fila.n_celdas < 12:
             continue
             
         # Obtener nombres de equipos
-        home_team_cell = cells[2]
-        away_team_cell = cells[4]
+        home_team = fila.local_texto
+        away_team = fila.visitante_texto
         
-        home_team = home_team_cell.get_text(strip=True)
-        away_team = away_team_cell.get_text(strip=True)
-        
-        # Verificar si el equipo está en este partido
-        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
+        # Verificar si el equipo está en este partido (por id, no por nombre)
+        if not fila.es_de(clave):
             continue
             
         # Obtener resultado
-        score_cell = cells[3]
-        score_span = score_cell.find('span', class_=score_selector)
-        if not score_span:
+        score_raw = fila.marcador_span(score_selector)
+        if score_raw is None:
             continue
             
-        score_raw = score_span.get_text(strip=True)
         if '-' not in score_raw:
             continue
             
         # Obtener handicap
-        ah_cell = cells[11]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
+        ah_line_raw = fila.ah_raw
         
         matches.append({
             'home_team': home_team,
             'away_team': away_team,
             'score': score_raw,
             'ah_line_raw': ah_line_raw,
-            'ah_line_num': parse_ah_to_number_of(ah_line_raw)
+            'ah_line_num': parse_ah_to_number_of(ah_line_raw),
+            'equipo_local': fila.clave_local == clave
         })
     
     # Analizar el rendimiento
@@ -79,30 +75,20 @@ def analizar_rendimiento_reciente_con_handicap(soup, team_name, is_home_team=Tru
         'details': []
     }
     
-    for match in matches:
-        # Determinar quién era el favorito
-        favorito_name = None
-        if match['ah_line_num'] is not None:
-            if match['ah_line_num'] > 0:
-                favorito_name = match['home_team']
-            elif match['ah_line_num'] < 0:
-                favorito_name = match['away_team']
-                
-        # Verificar si el equipo cubrió el handicap
-        resultado = check_handicap_cover(
-            match['score'], 
-            match['ah_line_num'] if match['ah_line_num'] is not None else 0,
-            favorito_name or "",
-            match['home_team'],
-            match['away_team'],
-            team_name
-        )
-        
+    # Liquidación de todos los partidos en una llamada. Como en check_handicap_cover: se apuesta
+    # por el favorito de cada partido y, con línea 0 (o sin línea), por `team_name`.
+    goles_local, goles_visitante, validos = marcadores([match['score'] for match in matches])
+    lineas = np.array([0.0 if match['ah_line_num'] is None else match['ah_line_num'] for match in matches], dtype=np.float64)
+    equipo_local = np.array([match['equipo_local'] for match in matches], dtype=bool)
+    apuesta_local = np.where(lineas == 0.0, equipo_local, lineas > 0)
+    codigos = np.where(validos, liquidar_ah(goles_local, goles_visitante, np.abs(lineas), apuesta_local), PUSH)
+    
+    for match, codigo in zip(matches, codigos.tolist()):
         # Contar resultados
-        if resultado[1] is True:
+        if codigo > PUSH:
             analysis['covered'] += 1
             result_text = "CUBIERTO"
-        elif resultado[1] is False:
+        elif codigo < PUSH:
             analysis['not_covered'] += 1
             result_text = "NO CUBIERTO"
         else:
@@ -124,7 +110,7 @@ def comparar_lineas_handicap_recientes(soup, team_name, current_ah_line, is_home
     Compara las líneas de handicap recientes con la línea actual.
     
     Args:
-        soup: BeautifulSoup object con el contenido de la página
+        soup: H2HPage (o BeautifulSoup) con el contenido de la página
         team_name: Nombre del equipo a analizar
         current_ah_line: Línea de handicap actual (número)
         is_home_team: Booleano que indica si el equipo es local (True) o visitante (False)
@@ -1,14 +1,12 @@
 # modules/analisis_rivales.py
-import re
-from bs4 import BeautifulSoup
-from modules.utils import get_match_details_from_row_of
+from modules.pagina_h2h import como_pagina_h2h
 
 def analizar_rivales_comunes(soup, team_a, team_b):
     """
     Analiza los rivales comunes entre dos equipos.
     
     Args:
-        soup: BeautifulSoup object con el contenido de la página
+        soup: H2HPage (o BeautifulSoup) con el contenido de la página
         team_a: Nombre del primer equipo
         team_b: Nombre del segundo equipo
     
@@ -16,36 +14,40 @@ def analizar_rivales_comunes(soup, team_a, team_b):
         dict: Diccionario con el análisis de rivales comunes
     """
     # Buscar tablas de partidos para ambos equipos
-    table_v1 = soup.find("table", id="table_v1")  # Partidos de team_a como local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos de team_b como visitante
+    pagina = como_pagina_h2h(soup)
+    table_v1 = pagina.filas("table_v1")  # Partidos de team_a como local
+    table_v2 = pagina.filas("table_v2")  # Partidos de team_b como visitante
     
-    if not table_v1 or not table_v2:
+    if table_v1 is None or table_v2 is None:
         return {"error": "No se encontraron las tablas de partidos"}
     
-    # Extraer rivales de team_a (como local)
-    rivals_a = set()
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and team_a.lower() in details['home'].lower():
-            rivals_a.add(details['away'].lower())
+    # Los equipos se comparan por su clave (id de NowGoal), no por el nombre
+    clave_a, clave_b = pagina.clave(team_a), pagina.clave(team_b)
+    
+    # Extraer rivales de team_a (como local): clave -> nombre en minúsculas
+    rivals_a = {}
+    for fila in table_v1:
+        details = fila.detalles('fscore_1')
+        if details and fila.clave_local == clave_a:
+            rivals_a.setdefault(fila.clave_visitante, details['away'].lower())
     
     # Extraer rivales de team_b (como visitante)
     rivals_b = set()
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and team_b.lower() in details['away'].lower():
-            rivals_b.add(details['home'].lower())
+    for fila in table_v2:
+        details = fila.detalles('fscore_2')
+        if details and fila.clave_visitante == clave_b:
+            rivals_b.add(fila.clave_local)
     
-    # Encontrar rivales comunes
-    common_rivals = rivals_a.intersection(rivals_b)
+    # Encontrar rivales comunes (en el orden de la tabla de team_a)
+    common_rivals = {clave: nombre for clave, nombre in rivals_a.items() if clave in rivals_b}
     
     # Obtener detalles de partidos contra rivales comunes
     common_matches = []
     
     # Partidos de team_a contra rivales comunes
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and details['away'].lower() in common_rivals:
+    for fila in table_v1:
+        details = fila.detalles('fscore_1')
+        if details and fila.clave_visitante in common_rivals:
             common_matches.append({
                 'team': team_a,
                 'opponent': details['away'],
@@ -59,9 +61,9 @@ def analizar_rivales_comunes(soup, team_a, team_b):
             })
     
     # Partidos de team_b contra rivales comunes
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and details['home'].lower() in common_rivals:
+    for fila in table_v2:
+        details = fila.detalles('fscore_2')
+        if details and fila.clave_local in common_rivals:
             common_matches.append({
                 'team': team_b,
                 'opponent': details['home'],
@@ -80,7 +82,7 @@ def analizar_rivales_comunes(soup, team_a, team_b):
     return {
         'team_a': team_a,
         'team_b': team_b,
-        'common_rivals': list(common_rivals),
+        'common_rivals': list(common_rivals.values()),
         'common_rivals_count': len(common_rivals),
         'matches': common_matches[:10]  # Limitar a 10 partidos más recientes
     }
@@ -90,7 +92,7 @@ def analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b
     Analiza el rendimiento de cada equipo contra el rival del otro equipo.
     
     Args:
-        soup: BeautifulSoup object con el contenido de la página
+        soup: H2HPage (o BeautifulSoup) con el contenido de la página
         team_a: Nombre del primer equipo
         team_b: Nombre del segundo equipo
         rival_a_rival: Rival del equipo A
@@ -100,20 +102,23 @@ def analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b
         dict: Diccionario con el análisis contra el rival del rival
     """
     # Buscar tablas de partidos
-    table_v1 = soup.find("table", id="table_v1")  # Partidos de team_a como local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos de team_b como visitante
+    pagina = como_pagina_h2h(soup)
+    table_v1 = pagina.filas("table_v1")  # Partidos de team_a como local
+    table_v2 = pagina.filas("table_v2")  # Partidos de team_b como visitante
     
-    if not table_v1 or not table_v2:
+    if table_v1 is None or table_v2 is None:
         return {"error": "No se encontraron las tablas de partidos"}
     
+    def _enfrenta(fila, clave_equipo, clave_rival):
+        return ((fila.clave_local == clave_equipo and fila.clave_visitante == clave_rival) or
+                (fila.clave_visitante == clave_equipo and fila.clave_local == clave_rival))
+    
     # Buscar partidos de team_a contra rival_b_rival
+    clave_a, clave_rival_b = pagina.clave(team_a), pagina.clave(rival_b_rival)
     matches_a_vs_rival_b_rival = []
-    for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_1', source_table_type='hist')
-        if details and (
-            (team_a.lower() in details['home'].lower() and rival_b_rival.lower() in details['away'].lower()) or
-            (team_a.lower() in details['away'].lower() and rival_b_rival.lower() in details['home'].lower())
-        ):
+    for fila in table_v1:
+        details = fila.detalles('fscore_1')
+        if details and _enfrenta(fila, clave_a, clave_rival_b):
             matches_a_vs_rival_b_rival.append({
                 'team': team_a,
                 'home_team': details['home'],
@@ -126,13 +131,11 @@ def analizar_contra_rival_del_rival(soup, team_a, team_b, rival_a_rival, rival_b
             })
     
     # Buscar partidos de team_b contra rival_a_rival
+    clave_b, clave_rival_a = pagina.clave(team_b), pagina.clave(rival_a_rival)
     matches_b_vs_rival_a_rival = []
-    for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector='fscore_2', source_table_type='hist')
-        if details and (
-            (team_b.lower() in details['home'].lower() and rival_a_rival.lower() in details['away'].lower()) or
-            (team_b.lower() in details['away'].lower() and rival_a_rival.lower() in details['home'].lower())
-        ):
+    for fila in table_v2:
+        details = fila.detalles('fscore_2')
+        if details and _enfrenta(fila, clave_b, clave_rival_a):
             matches_b_vs_rival_a_rival.append({
                 'team': team_b,
                 'home_team': details['home'],
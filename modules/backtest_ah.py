@@ -0,0 +1,161 @@
+# modules/backtest_ah.py
+"""
+Backtesting de líneas de handicap asiático sobre los resultados guardados en el
+historial local (modules/historial_partidos).
+
+Todo se calcula con arrays de NumPy: se liquidan miles de partidos en una llamada
+(modules.liquidacion) y se agrupan con np.unique + np.bincount, sin bucles de Python
+por partido.
+
+Convención de NowGoal: una línea positiva la da el local (favorito local), una
+negativa el visitante. Cada partido se liquida desde el lado del favorito (con línea
+0, desde el local, igual que check_handicap_cover). Las líneas de cuarto (0.25,
+0.75...) se reparten en dos medias apuestas a las líneas vecinas, así que un
+partido puede salir medio ganado o medio perdido.
+
+ROI por unidad apostada con las cuotas asiáticas guardadas (formato HK: ganancia
+neta por unidad); si el partido no tiene cuotas se usa BACKTEST_CUOTA_DEFECTO.
+"""
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from modules import historial_partidos, lineas_ah
+from modules.liquidacion import WIN, HALF_WIN, PUSH, HALF_LOSS, LOSS, liquidar_ah
+
+BACKTEST_CUOTA_DEFECTO = float(os.environ.get("BACKTEST_CUOTA_DEFECTO", "0.90"))
+
+AGRUPACIONES = ("bucket", "liga", "favorito", "linea_goles")
+
+
+@dataclass(slots=True)
+class DatosBacktest:
+    """Resultados y líneas de N partidos, uno por posición en cada array."""
+    goles_local: np.ndarray       # int
+    goles_visitante: np.ndarray   # int
+    linea: np.ndarray             # float, línea AH (positiva = da el local)
+    cuota_local: np.ndarray       # float HK, NaN si no hay
+    cuota_visitante: np.ndarray   # float HK, NaN si no hay
+    linea_goles: np.ndarray       # float, NaN si no hay
+    liga: np.ndarray              # str (object)
+
+    def __len__(self):
+        return len(self.linea)
+
+
+def cargar_datos(liga: str | None = None, desde: str | None = None, hasta: str | None = None) -> DatosBacktest:
+    """Partidos terminados con línea AH del historial local, ya en arrays."""
+    filas = historial_partidos.resultados_para_backtest(liga, desde, hasta)
+    return datos_desde_filas([(f[3], f[4], f[5], f[6], f[7], f[8], f[1]) for f in filas])
+
+
+def datos_desde_filas(filas) -> DatosBacktest:
+    """Filas (goles_local, goles_visitante, linea, cuota_local, cuota_visitante, linea_goles, liga) -> arrays."""
+    if not filas:
+        vacio = np.empty(0)
+        return DatosBacktest(vacio.astype(np.int64), vacio.astype(np.int64), vacio, vacio, vacio, vacio,
+                             np.empty(0, dtype=object))
+    columnas = list(zip(*filas))
+
+    def flotantes(valores):
+        return np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+
+    return DatosBacktest(
+        goles_local=np.asarray(columnas[0], dtype=np.int64),
+        goles_visitante=np.asarray(columnas[1], dtype=np.int64),
+        linea=flotantes(columnas[2]),
+        cuota_local=flotantes(columnas[3]),
+        cuota_visitante=flotantes(columnas[4]),
+        linea_goles=flotantes(columnas[5]),
+        liga=np.array(["" if v is None else str(v) for v in columnas[6]], dtype=object),
+    )
+
+
+def _codificar(datos: DatosBacktest, agrupacion: str) -> tuple[list[str], np.ndarray]:
+    """(etiquetas distintas, código de cada partido) para una agrupación."""
+    if agrupacion == "bucket":
+        # El bucket se calcula con lineas_ah solo para cada línea distinta; varias líneas
+        # comparten bucket (0.25, 0.5 y 0.75), así que se vuelve a agrupar por etiqueta.
+        lineas, codigo = np.unique(datos.linea, return_inverse=True)
+        etiquetas, por_linea = np.unique(["" if np.isnan(v) else lineas_ah.bucket_de_valor(float(v)) for v in lineas],
+                                         return_inverse=True)
+        return [str(e) for e in etiquetas], por_linea[codigo]
+    if agrupacion == "liga":
+        unicos, codigo = np.unique(datos.liga, return_inverse=True)
+        return [str(v) for v in unicos], codigo
+    if agrupacion == "favorito":
+        unicos, codigo = np.unique(np.sign(datos.linea), return_inverse=True)
+        nombres = {-1.0: "visitante", 0.0: "ninguno", 1.0: "local"}
+        return [nombres[float(v)] for v in unicos], codigo
+    if agrupacion == "linea_goles":
+        # np.unique deja los NaN al final (partidos sin línea de goles).
+        unicos, codigo = np.unique(datos.linea_goles, return_inverse=True)
+        return ["" if np.isnan(v) else f"{v:g}" for v in unicos], codigo
+    raise ValueError(f"Agrupación desconocida: {agrupacion} (válidas: {', '.join(AGRUPACIONES)})")
+
+
+def backtest(datos: DatosBacktest | None = None, agrupar_por=("bucket",), **filtros) -> list[dict]:
+    """
+    Tasa de cubierto / push / perdido y ROI por grupo. `agrupar_por` es una tupla con
+    cualquier combinación de AGRUPACIONES (vacía = un único grupo con todo). Sin `datos`,
+    se cargan del historial con `filtros` (liga, desde, hasta). Grupos de más a menos partidos.
+    """
+    if datos is None:
+        datos = cargar_datos(**filtros)
+    agrupar_por = tuple(agrupar_por)
+    for agrupacion in agrupar_por:
+        if agrupacion not in AGRUPACIONES:
+            raise ValueError(f"Agrupación desconocida: {agrupacion} (válidas: {', '.join(AGRUPACIONES)})")
+    if len(datos) == 0:
+        return []
+
+    apuesta_local = datos.linea >= 0
+    resultado = liquidar_ah(datos.goles_local, datos.goles_visitante, np.abs(datos.linea), apuesta_local)
+    cuota = np.where(apuesta_local, datos.cuota_local, datos.cuota_visitante)
+    cuota = np.where(np.isnan(cuota), BACKTEST_CUOTA_DEFECTO, cuota)
+    # Cada media apuesta: +cuota/2 si gana, -1/2 si pierde.
+    ganadas = np.where(resultado == WIN, 2, np.where(resultado == HALF_WIN, 1, 0))
+    perdidas = np.where(resultado == LOSS, 2, np.where(resultado == HALF_LOSS, 1, 0))
+    beneficio = 0.5 * (ganadas * cuota - perdidas)
+
+    # Cada columna de agrupación se codifica como enteros (sobre los valores numéricos,
+    # el texto solo se genera para los distintos) y la combinación se indexa con
+    # ravel_multi_index: np.unique trabaja sobre enteros, no sobre tuplas de cadenas.
+    valores, codigos = [], []
+    for agrupacion in agrupar_por:
+        etiquetas_columna, codigo = _codificar(datos, agrupacion)
+        valores.append(etiquetas_columna)
+        codigos.append(codigo)
+    if codigos:
+        combinada = np.ravel_multi_index(codigos, [len(v) for v in valores])
+        grupos, indice = np.unique(combinada, return_inverse=True)
+        etiquetas = np.unravel_index(grupos, [len(v) for v in valores])
+    else:
+        grupos, indice, etiquetas = np.zeros(1, dtype=np.int64), np.zeros(len(datos), dtype=np.int64), ()
+
+    n_grupos = len(grupos)
+    total = np.bincount(indice, minlength=n_grupos)
+    conteos = {codigo: np.bincount(indice, weights=(resultado == codigo), minlength=n_grupos)
+               for codigo in (WIN, HALF_WIN, PUSH, HALF_LOSS, LOSS)}
+    beneficio_grupo = np.bincount(indice, weights=beneficio, minlength=n_grupos)
+
+    informe = []
+    for i in np.argsort(-total, kind="stable"):
+        n = int(total[i])
+        fila = {agrupacion: valores[j][etiquetas[j][i]] for j, agrupacion in enumerate(agrupar_por)}
+        fila.update({
+            "partidos": n,
+            "cubierto": int(conteos[WIN][i]),
+            "medio_cubierto": int(conteos[HALF_WIN][i]),
+            "push": int(conteos[PUSH][i]),
+            "medio_perdido": int(conteos[HALF_LOSS][i]),
+            "perdido": int(conteos[LOSS][i]),
+            "tasa_cubierto": round(float(conteos[WIN][i] + conteos[HALF_WIN][i]) / n, 4),
+            "tasa_push": round(float(conteos[PUSH][i]) / n, 4),
+            "tasa_perdido": round(float(conteos[LOSS][i] + conteos[HALF_LOSS][i]) / n, 4),
+            "beneficio": round(float(beneficio_grupo[i]), 4),
+            "roi": round(float(beneficio_grupo[i]) / n, 4),
+        })
+        informe.append(fila)
+    return informe
@@ -0,0 +1,53 @@
+# modules/bucle_async.py
+"""
+Event loop de larga duración, uno por proceso (worker de gunicorn), en un hilo propio.
+
+El código síncrono (rutas de Flask, hilo de refresco de snapshots) ejecuta aquí sus
+corrutinas con `ejecutar()` en lugar de `asyncio.run()`, que crea y destruye un loop
+en cada llamada. Así todo lo que vive en el loop se comparte entre peticiones: el
+navegador Playwright y sus contextos, las tareas en curso y el executor por defecto
+de `asyncio.to_thread` (que a su vez usa la sesión HTTP compartida de cliente_http).
+
+Con NOWGOAL_BUCLE_PERSISTENTE=0 `ejecutar()` vuelve a usar asyncio.run (para comparar;
+ver benchmarks/bench_bucle_async.py).
+"""
+import asyncio
+import os
+import threading
+
+BUCLE_PERSISTENTE = os.environ.get("NOWGOAL_BUCLE_PERSISTENTE", "1") == "1"
+
+_loop = None
+_hilo = None
+_lock = threading.Lock()
+
+
+def obtener_loop() -> asyncio.AbstractEventLoop:
+    """Arranca (una vez) el hilo con el event loop compartido y lo devuelve."""
+    global _loop, _hilo
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            hilo = threading.Thread(target=loop.run_forever, name="bucle-async", daemon=True)
+            hilo.start()
+            _loop, _hilo = loop, hilo
+        return _loop
+
+
+def en_el_bucle() -> bool:
+    """True si el código se está ejecutando dentro del loop compartido."""
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def ejecutar(corrutina, timeout: float | None = None):
+    """Ejecuta `corrutina` en el loop compartido y espera su resultado (desde código síncrono)."""
+    if not BUCLE_PERSISTENTE:
+        return asyncio.run(corrutina)
+    loop = obtener_loop()
+    if threading.current_thread() is _hilo:
+        corrutina.close()
+        raise RuntimeError("ejecutar() bloquearía el propio bucle: desde una corrutina hay que usar await.")
+    return asyncio.run_coroutine_threadsafe(corrutina, loop).result(timeout)
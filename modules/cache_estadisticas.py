@@ -0,0 +1,72 @@
+# modules/cache_estadisticas.py
+"""
+Caché permanente (SQLite) de las estadísticas de progresión de partidos terminados.
+
+Las estadísticas de /match/live-{id} de un partido que ya ha terminado no cambian,
+así que se guardan una vez por match_id y no se vuelven a descargar. Se almacenan
+las filas ya parseadas (lista de dicts) serializadas en JSON.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from modules import almacen_compartido
+
+STATS_CACHE_PATH = os.environ.get(
+    "NOWGOAL_STATS_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "estadisticas_partidos.sqlite3"),
+)
+
+_conexion = None
+_lock = threading.Lock()
+
+
+def _obtener_conexion() -> sqlite3.Connection:
+    global _conexion
+    if _conexion is None:
+        conexion = almacen_compartido.conectar(STATS_CACHE_PATH)
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS estadisticas_partido ("
+            " match_id TEXT PRIMARY KEY,"
+            " filas TEXT NOT NULL,"
+            " guardado_en REAL NOT NULL)"
+        )
+        conexion.commit()
+        _conexion = conexion
+    return _conexion
+
+
+def leer_estadisticas(match_ids) -> dict:
+    """Devuelve {match_id: filas} para los IDs que ya están en la caché."""
+    ids = [str(m) for m in match_ids]
+    if not ids:
+        return {}
+    try:
+        with _lock:
+            cursor = _obtener_conexion().execute(
+                f"SELECT match_id, filas FROM estadisticas_partido WHERE match_id IN ({','.join('?' * len(ids))})",
+                ids,
+            )
+            return {match_id: json.loads(filas) for match_id, filas in cursor.fetchall()}
+    except sqlite3.Error as exc:
+        print(f"Caché de estadísticas no disponible: {exc}")
+        return {}
+
+
+def guardar_estadisticas(estadisticas: dict):
+    """Guarda {match_id: filas} de partidos terminados (sobrescribe si ya existía)."""
+    if not estadisticas:
+        return
+    ahora = time.time()
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            conexion.executemany(
+                "INSERT OR REPLACE INTO estadisticas_partido (match_id, filas, guardado_en) VALUES (?, ?, ?)",
+                [(str(match_id), json.dumps(filas, ensure_ascii=False), ahora) for match_id, filas in estadisticas.items()],
+            )
+            conexion.commit()
+    except sqlite3.Error as exc:
+        print(f"No se pudieron guardar estadísticas en caché: {exc}")
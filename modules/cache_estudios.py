@@ -0,0 +1,199 @@
+# modules/cache_estudios.py
+"""
+Caché (SQLite) de estudios completos ya calculados, por match_id.
+
+La vigencia depende del estado del partido:
+- terminado (la cabecera de la página lo marca así, `match_finished`): el estudio ya
+  no cambia y se guarda para siempre;
+- en juego (hay marcador pero no está terminado): ESTUDIO_CACHE_TTL_CERCANO;
+- por jugar: ESTUDIO_CACHE_TTL_PROXIMO, y ESTUDIO_CACHE_TTL_CERCANO cuando falta
+  menos de ESTUDIO_CACHE_VENTANA_CERCANO para el inicio (o ya ha empezado), porque
+  las cuotas se mueven más.
+
+Una entrada caducada no se borra: quien la lee la recibe marcada como no fresca, la
+sirve y lanza el recálculo en segundo plano (stale-while-revalidate). El recálculo
+revalida la página h2h con el servidor (cola_analisis.encolar(..., revalidar=True)):
+si usara la copia de la caché de páginas repetiría el mismo estudio y no vería que el
+partido ha terminado.
+
+`datos` lleva estadísticas de progresión (EstadisticasPartido) y las funciones
+auxiliares de la plantilla; para guardarlo, las estadísticas se convierten en listas de
+registros y las funciones se quitan (al leer se vuelven a añadir con
+estudio_scraper.adjuntar_funciones_auxiliares). Los registros se guardan con la misma
+forma que cuando eran DataFrames de pandas, así que las entradas antiguas se siguen leyendo.
+"""
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from modules import almacen_compartido
+from modules.estadisticas_partido import COLUMNA_ESTADISTICA, EstadisticasPartido
+from modules.estudio_scraper import adjuntar_funciones_auxiliares
+
+ESTUDIO_CACHE_ENABLED = os.environ.get("ESTUDIO_CACHE", "1") == "1"
+ESTUDIO_CACHE_PATH = os.environ.get(
+    "ESTUDIO_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "estudios.sqlite3"),
+)
+ESTUDIO_CACHE_TTL_PROXIMO = int(os.environ.get("ESTUDIO_CACHE_TTL_PROXIMO", "600"))
+ESTUDIO_CACHE_TTL_CERCANO = int(os.environ.get("ESTUDIO_CACHE_TTL_CERCANO", "120"))
+ESTUDIO_CACHE_VENTANA_CERCANO = int(os.environ.get("ESTUDIO_CACHE_VENTANA_CERCANO", "3600"))
+ESTUDIO_CACHE_MAX_ENTRADAS = int(os.environ.get("ESTUDIO_CACHE_MAX_ENTRADAS", "5000"))
+
+_RE_MARCADOR_FINAL = re.compile(r"^\d+\s*-\s*\d+$")
+_CLAVE_DATAFRAME = "__dataframe__"
+
+_conexion = None
+_lock = threading.Lock()
+
+
+def ttl_estudio(datos: dict) -> float | None:
+    """Segundos de vigencia del estudio según el estado del partido (None = permanente)."""
+    if datos.get("match_finished"):
+        return None
+    if _RE_MARCADOR_FINAL.match(str(datos.get("final_score") or "").strip()):
+        # Marcador sin partido terminado: está en juego, el marcador y las cuotas cambian.
+        return ESTUDIO_CACHE_TTL_CERCANO
+    try:
+        # Misma convención que los listados: la hora de NowGoal se compara en UTC.
+        inicio = datetime.datetime.strptime(datos.get("match_datetime") or "", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return ESTUDIO_CACHE_TTL_PROXIMO
+    if (inicio - datetime.datetime.utcnow()).total_seconds() < ESTUDIO_CACHE_VENTANA_CERCANO:
+        return ESTUDIO_CACHE_TTL_CERCANO
+    return ESTUDIO_CACHE_TTL_PROXIMO
+
+
+def _a_json(valor):
+    if isinstance(valor, EstadisticasPartido):
+        return {_CLAVE_DATAFRAME: valor.registros(), "indice": COLUMNA_ESTADISTICA if valor else None}
+    if isinstance(valor, dict):
+        return {k: _a_json(v) for k, v in valor.items() if not callable(v)}
+    if isinstance(valor, (list, tuple)):
+        return [_a_json(v) for v in valor]
+    return valor
+
+
+def _desde_json(valor):
+    if isinstance(valor, dict):
+        if _CLAVE_DATAFRAME in valor:
+            return EstadisticasPartido.desde_registros(valor[_CLAVE_DATAFRAME])
+        return {k: _desde_json(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_desde_json(v) for v in valor]
+    return valor
+
+
+def serializar_estudio(datos: dict) -> bytes:
+    """`datos` en JSON comprimido, sin las funciones auxiliares."""
+    return zlib.compress(json.dumps(_a_json(datos), ensure_ascii=False).encode("utf-8"), 6)
+
+
+def deserializar_estudio(cuerpo: bytes) -> dict:
+    """Inverso de serializar_estudio: estadísticas reconstruidas y funciones auxiliares añadidas."""
+    return adjuntar_funciones_auxiliares(_desde_json(json.loads(zlib.decompress(cuerpo).decode("utf-8"))))
+
+
+def _obtener_conexion() -> sqlite3.Connection:
+    global _conexion
+    if _conexion is None:
+        conexion = almacen_compartido.conectar(ESTUDIO_CACHE_PATH)
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS estudios ("
+            " match_id TEXT PRIMARY KEY,"
+            " cuerpo BLOB NOT NULL,"
+            " guardado_en REAL NOT NULL,"
+            " expira_en REAL)"
+        )
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_estudios_guardado ON estudios (guardado_en)")
+        conexion.commit()
+        _conexion = conexion
+    return _conexion
+
+
+def leer(match_id: str) -> dict | None:
+    """
+    Devuelve {"datos", "fresca", "guardado_en"} o None si el estudio no está guardado.
+    Las entradas caducadas se devuelven con fresca=False.
+    """
+    if not ESTUDIO_CACHE_ENABLED:
+        return None
+    try:
+        with _lock:
+            fila = _obtener_conexion().execute(
+                "SELECT cuerpo, guardado_en, expira_en FROM estudios WHERE match_id = ?", (str(match_id),)
+            ).fetchone()
+    except sqlite3.Error as exc:
+        print(f"Caché de estudios no disponible: {exc}")
+        return None
+    if fila is None:
+        return None
+    cuerpo, guardado_en, expira_en = fila
+    try:
+        datos = deserializar_estudio(cuerpo)
+    except (ValueError, zlib.error) as exc:
+        print(f"Estudio {match_id} en caché ilegible, se descarta: {exc}")
+        return None
+    return {"datos": datos, "fresca": expira_en is None or time.time() < expira_en, "guardado_en": guardado_en}
+
+
+def vigencia(match_id: str) -> dict | None:
+    """Solo las fechas de la entrada ({"guardado_en", "expira_en", "fresca"}), sin leer el estudio."""
+    if not ESTUDIO_CACHE_ENABLED:
+        return None
+    try:
+        with _lock:
+            fila = _obtener_conexion().execute(
+                "SELECT guardado_en, expira_en FROM estudios WHERE match_id = ?", (str(match_id),)
+            ).fetchone()
+    except sqlite3.Error as exc:
+        print(f"Caché de estudios no disponible: {exc}")
+        return None
+    if fila is None:
+        return None
+    guardado_en, expira_en = fila
+    return {"guardado_en": guardado_en, "expira_en": expira_en, "fresca": expira_en is None or time.time() < expira_en}
+
+
+def guardar(match_id: str, datos: dict):
+    """Guarda el estudio con la vigencia que corresponde al estado del partido."""
+    if not ESTUDIO_CACHE_ENABLED or not datos or datos.get("error"):
+        return
+    ahora = time.time()
+    ttl = ttl_estudio(datos)
+    try:
+        cuerpo = serializar_estudio(datos)
+    except (TypeError, ValueError) as exc:
+        print(f"Estudio {match_id} no serializable, no se guarda en caché: {exc}")
+        return
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            conexion.execute(
+                "INSERT OR REPLACE INTO estudios (match_id, cuerpo, guardado_en, expira_en) VALUES (?, ?, ?, ?)",
+                (str(match_id), cuerpo, ahora, None if ttl is None else ahora + ttl),
+            )
+            conexion.execute(
+                "DELETE FROM estudios WHERE match_id IN ("
+                " SELECT match_id FROM estudios ORDER BY guardado_en DESC LIMIT -1 OFFSET ?)",
+                (ESTUDIO_CACHE_MAX_ENTRADAS,),
+            )
+            conexion.commit()
+    except sqlite3.Error as exc:
+        print(f"No se pudo guardar el estudio {match_id} en caché: {exc}")
+
+
+def estado_cache() -> dict:
+    """Resumen de la caché (para diagnóstico)."""
+    if not ESTUDIO_CACHE_ENABLED:
+        return {"enabled": False}
+    with _lock:
+        total, permanentes = _obtener_conexion().execute(
+            "SELECT COUNT(*), COALESCE(SUM(expira_en IS NULL), 0) FROM estudios"
+        ).fetchone()
+    return {"enabled": True, "entries": total, "permanent": permanentes}
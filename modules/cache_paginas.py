@@ -0,0 +1,182 @@
+# modules/cache_paginas.py
+"""
+Caché persistente en disco (SQLite) de páginas HTML descargadas de NowGoal.
+
+- El HTML se guarda comprimido con zlib junto a su ETag / Last-Modified.
+- El TTL depende del tipo de página y del estado del partido: las páginas de un
+  partido (h2h-{id}, live-{id}) solo tienen TTL largo si ya lo marcan como terminado;
+  las de uno por jugar o en juego (cuotas, marcador, minuto) y las demás tienen TTL 0.
+  Mientras la entrada está fresca se sirve sin tocar la red; si no, cliente_http la
+  revalida con una petición condicional (If-None-Match / If-Modified-Since) y un 304
+  solo renueva la fecha.
+- El tamaño total está acotado (NOWGOAL_PAGE_CACHE_MAX_MB): al pasarse se borran
+  las entradas usadas hace más tiempo (LRU).
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from modules import almacen_compartido
+
+PAGE_CACHE_ENABLED = os.environ.get("NOWGOAL_PAGE_CACHE", "1") == "1"
+PAGE_CACHE_PATH = os.environ.get(
+    "NOWGOAL_PAGE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "paginas.sqlite3"),
+)
+PAGE_CACHE_MAX_BYTES = int(float(os.environ.get("NOWGOAL_PAGE_CACHE_MAX_MB", "200")) * 1024 * 1024)
+# Al desalojar se baja hasta este porcentaje del máximo para no desalojar en cada escritura.
+EVICTION_TARGET_RATIO = 0.9
+
+# TTL (segundos) por tipo de página de un partido terminado. Con TTL 0 la página se
+# revalida siempre, y solo se guarda si el servidor envía ETag o Last-Modified.
+TTL_POR_TIPO = {
+    "h2h": int(os.environ.get("NOWGOAL_PAGE_CACHE_TTL_H2H", str(6 * 3600))),
+    "live": int(os.environ.get("NOWGOAL_PAGE_CACHE_TTL_LIVE", str(30 * 60))),
+    "otra": 0,
+}
+# TTL de las páginas de un partido por jugar o en juego.
+TTL_PARTIDO_ABIERTO = int(os.environ.get("NOWGOAL_PAGE_CACHE_TTL_ABIERTO", "0"))
+_PATRONES_TIPO = (
+    ("h2h", re.compile(r"/match/h2h-\d+")),
+    ("live", re.compile(r"/match/live-\d+")),
+)
+# Las mismas señales que utils.is_match_finished_of, sobre el HTML sin parsear: la
+# cabecera #mScore con el bloque "end" o con el estado "Finished".
+_RE_CABECERA_TERMINADO = re.compile(
+    r'id="mScore"[^>]*>\s*<div class="end"|class="row state[^"]*">\s*Finished\s*<'
+)
+
+_conexion = None
+_lock = threading.Lock()
+
+
+def tipo_de_pagina(url: str) -> str:
+    for tipo, patron in _PATRONES_TIPO:
+        if patron.search(url):
+            return tipo
+    return "otra"
+
+
+def ttl_de_pagina(tipo: str, html: str) -> int:
+    """Segundos que `html` se puede servir sin revalidar."""
+    if tipo == "otra":
+        return TTL_POR_TIPO["otra"]
+    if _RE_CABECERA_TERMINADO.search(html):
+        return TTL_POR_TIPO[tipo]
+    return TTL_PARTIDO_ABIERTO
+
+
+def _obtener_conexion() -> sqlite3.Connection:
+    global _conexion
+    if _conexion is None:
+        conexion = almacen_compartido.conectar(PAGE_CACHE_PATH)
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS paginas ("
+            " url TEXT PRIMARY KEY,"
+            " tipo TEXT NOT NULL,"
+            " cuerpo BLOB NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " guardado_en REAL NOT NULL,"
+            " ultimo_acceso REAL NOT NULL,"
+            " bytes INTEGER NOT NULL)"
+        )
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_paginas_acceso ON paginas (ultimo_acceso)")
+        conexion.commit()
+        _conexion = conexion
+    return _conexion
+
+
+def leer(url: str) -> dict | None:
+    """
+    Devuelve la entrada de `url` o None: {"html", "etag", "last_modified", "fresca"}.
+    `fresca` indica que sigue dentro de su TTL (ttl_de_pagina) y se puede servir sin revalidar.
+    """
+    if not PAGE_CACHE_ENABLED:
+        return None
+    ahora = time.time()
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            fila = conexion.execute(
+                "SELECT tipo, cuerpo, etag, last_modified, guardado_en FROM paginas WHERE url = ?", (url,)
+            ).fetchone()
+            if fila is None:
+                return None
+            conexion.execute("UPDATE paginas SET ultimo_acceso = ? WHERE url = ?", (ahora, url))
+            conexion.commit()
+    except sqlite3.Error as exc:
+        print(f"Caché de páginas no disponible: {exc}")
+        return None
+    tipo, cuerpo, etag, last_modified, guardado_en = fila
+    html = zlib.decompress(cuerpo).decode("utf-8")
+    return {
+        "html": html,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fresca": ahora - guardado_en < ttl_de_pagina(tipo, html),
+    }
+
+
+def guardar(url: str, html: str, etag: str | None = None, last_modified: str | None = None):
+    """Guarda (o reemplaza) la página y desaloja las menos usadas si se supera el tamaño máximo."""
+    if not PAGE_CACHE_ENABLED:
+        return
+    tipo = tipo_de_pagina(url)
+    if ttl_de_pagina(tipo, html) <= 0 and not (etag or last_modified):
+        # Sin TTL ni validadores la entrada nunca podría reutilizarse.
+        return
+    cuerpo = zlib.compress(html.encode("utf-8"), 6)
+    ahora = time.time()
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            conexion.execute(
+                "INSERT OR REPLACE INTO paginas (url, tipo, cuerpo, etag, last_modified, guardado_en, ultimo_acceso, bytes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, tipo, cuerpo, etag, last_modified, ahora, ahora, len(cuerpo)),
+            )
+            _desalojar(conexion)
+            conexion.commit()
+    except sqlite3.Error as exc:
+        print(f"No se pudo guardar la página en caché: {exc}")
+
+
+def renovar(url: str):
+    """Tras un 304 la copia guardada vuelve a estar fresca."""
+    if not PAGE_CACHE_ENABLED:
+        return
+    ahora = time.time()
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            conexion.execute("UPDATE paginas SET guardado_en = ?, ultimo_acceso = ? WHERE url = ?", (ahora, ahora, url))
+            conexion.commit()
+    except sqlite3.Error as exc:
+        print(f"No se pudo renovar la página en caché: {exc}")
+
+
+def _desalojar(conexion: sqlite3.Connection):
+    total = conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM paginas").fetchone()[0]
+    if total <= PAGE_CACHE_MAX_BYTES:
+        return
+    objetivo = PAGE_CACHE_MAX_BYTES * EVICTION_TARGET_RATIO
+    a_borrar = []
+    for url, tamano in conexion.execute("SELECT url, bytes FROM paginas ORDER BY ultimo_acceso ASC"):
+        if total <= objetivo:
+            break
+        a_borrar.append((url,))
+        total -= tamano
+    conexion.executemany("DELETE FROM paginas WHERE url = ?", a_borrar)
+
+
+def estado_cache() -> dict:
+    """Resumen de la caché (para diagnóstico)."""
+    if not PAGE_CACHE_ENABLED:
+        return {"enabled": False}
+    with _lock:
+        entradas, total = _obtener_conexion().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM paginas").fetchone()
+    return {"enabled": True, "entries": entradas, "bytes": total, "max_bytes": PAGE_CACHE_MAX_BYTES}
@@ -0,0 +1,209 @@
+# modules/cliente_http.py
+"""
+Capa de descarga compartida por app.py y modules/estudio_scraper.py.
+
+- Una única sesión `requests` por proceso con un pool de conexiones acotado por
+  host, de modo que las descargas de distintos hilos van en paralelo y reutilizan
+  las conexiones keep-alive.
+- Coalescencia de peticiones en vuelo ("singleflight"): si varios hilos piden la
+  misma URL a la vez, solo uno hace la llamada al servidor y el resto recibe el
+  mismo resultado (o la misma excepción).
+- Caché en disco (modules/cache_paginas): las páginas frescas se sirven sin red y
+  las caducadas se revalidan con ETag / Last-Modified. Con `revalidar=True` se
+  revalida siempre, aunque la copia siga fresca.
+- Lotes (`lote_compartido()`): el código que corre dentro de un lote (`lote.ejecutar`)
+  recuerda en memoria cada URL que descarga y no la vuelve a pedir aunque la caché de
+  disco esté apagada o no guarde ese tipo de página (p. ej. las vistas previas en lote
+  de varios partidos). Lo que se recuerda es solo de ese lote: el resto de descargas
+  del proceso (en vivo, listados, estudios) no lo ven, y se tira al cerrar el lote.
+- Cada petición que sí sale a la red espera su turno en modules/limitador_peticiones.
+  Los reintentos (errores de conexión, 429 y 5xx) se hacen aquí, no en el adaptador de
+  urllib3, para que también pasen por el limitador en lugar de sumarse a la racha.
+"""
+import contextlib
+import contextvars
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from modules import cache_paginas, limitador_peticiones
+
+DEFAULT_TIMEOUT_SECONDS = 12
+# Conexiones simultáneas por host. Con pool_block=True, si se agotan, los hilos
+# esperan a que se libere una en lugar de abrir conexiones sin límite.
+POOL_MAXSIZE_PER_HOST = int(os.environ.get("NOWGOAL_HTTP_POOL_SIZE", "8"))
+# Número de hosts distintos cuyos pools se mantienen abiertos (live18, live20...).
+POOL_HOSTS = 4
+# Reintentos de una descarga tras un error de conexión, un 429 o un 5xx.
+DESCARGA_REINTENTOS = int(os.environ.get("NOWGOAL_HTTP_REINTENTOS", "3"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
+    "Connection": "keep-alive",
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+_en_vuelo = {}
+_en_vuelo_lock = threading.Lock()
+
+_lote_actual = contextvars.ContextVar("cliente_http_lote", default=None)
+_contadores = {"red": 0, "cache": 0, "coalescidas": 0, "lote": 0}
+
+
+class _LlamadaEnVuelo:
+    """Resultado compartido de una descarga que varios hilos están esperando."""
+
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class Lote:
+    """
+    Páginas descargadas dentro de un lote. Solo las ve el código lanzado con
+    `ejecutar()`; al cerrarse el lote se tiran y deja de recordar nada.
+    """
+
+    def __init__(self):
+        self.paginas = {}
+        self.abierto = True
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        """Llama a `funcion` dentro del lote (pensado para las tareas de un ThreadPoolExecutor)."""
+        token = _lote_actual.set(self)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            _lote_actual.reset(token)
+
+
+def obtener_sesion() -> requests.Session:
+    """Devuelve la sesión compartida del proceso (se crea en la primera llamada)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=POOL_HOSTS,
+                pool_maxsize=POOL_MAXSIZE_PER_HOST,
+                pool_block=True,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def _descargar(url: str, timeout: float, headers: dict | None, guardada: dict | None) -> str:
+    headers = dict(headers or {})
+    if guardada:
+        if guardada["etag"]:
+            headers["If-None-Match"] = guardada["etag"]
+        if guardada["last_modified"]:
+            headers["If-Modified-Since"] = guardada["last_modified"]
+    for intento in range(DESCARGA_REINTENTOS + 1):
+        ultimo = intento == DESCARGA_REINTENTOS
+        try:
+            with limitador_peticiones.peticion(url) as turno:
+                response = obtener_sesion().get(url, timeout=timeout, headers=headers)
+                turno.estado = response.status_code
+                turno.retry_after = response.headers.get("Retry-After")
+        except (requests.ConnectionError, requests.Timeout):
+            if ultimo:
+                raise
+            continue
+        if ultimo or response.status_code not in limitador_peticiones.ESTADOS_FRENO:
+            break
+    if response.status_code == 304 and guardada:
+        cache_paginas.renovar(url)
+        return guardada["html"]
+    response.raise_for_status()
+    cache_paginas.guardar(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return response.text
+
+
+def obtener_html(url: str, timeout: float = DEFAULT_TIMEOUT_SECONDS, headers: dict | None = None,
+                 revalidar: bool = False) -> str:
+    """
+    Descarga `url` y devuelve el texto de la respuesta. Lanza las excepciones de
+    `requests` (Timeout, HTTPError...) igual que `session.get` + `raise_for_status`.
+    Las llamadas concurrentes a la misma URL comparten una única petición, y las
+    páginas que siguen frescas en la caché de disco no llegan a pedirse, salvo con
+    `revalidar=True` (quien necesita el estado actual del partido): entonces siempre
+    sale una petición, condicional si hay copia guardada. Lo recordado en el lote
+    actual sí se reutiliza (es de ese mismo lote).
+    """
+    lote = _lote_actual.get()
+    if lote is not None:
+        with _en_vuelo_lock:
+            html = lote.paginas.get(url)
+            if html is not None:
+                _contadores["lote"] += 1
+                return html
+
+    guardada = cache_paginas.leer(url)
+    if guardada and guardada["fresca"] and not revalidar:
+        with _en_vuelo_lock:
+            _contadores["cache"] += 1
+        return _recordar_en_lote(lote, url, guardada["html"])
+
+    with _en_vuelo_lock:
+        llamada = _en_vuelo.get(url)
+        es_lider = llamada is None
+        if es_lider:
+            llamada = _LlamadaEnVuelo()
+            _en_vuelo[url] = llamada
+        _contadores["red" if es_lider else "coalescidas"] += 1
+
+    if not es_lider:
+        llamada.terminada.wait()
+        if llamada.error is not None:
+            raise llamada.error
+        return _recordar_en_lote(lote, url, llamada.resultado)
+
+    try:
+        llamada.resultado = _recordar_en_lote(lote, url, _descargar(url, timeout, headers, guardada))
+        return llamada.resultado
+    except Exception as exc:
+        llamada.error = exc
+        raise
+    finally:
+        with _en_vuelo_lock:
+            _en_vuelo.pop(url, None)
+        llamada.terminada.set()
+
+
+def _recordar_en_lote(lote: Lote | None, url: str, html: str) -> str:
+    if lote is not None:
+        with _en_vuelo_lock:
+            if lote.abierto:
+                lote.paginas[url] = html
+    return html
+
+
+@contextlib.contextmanager
+def lote_compartido():
+    """
+    Abre un lote y lo entrega; dentro de `lote.ejecutar(...)` ninguna URL se descarga
+    dos veces. Al salir se cierra: lo recordado se tira aunque alguna tarea siga en
+    marcha (esas terminan descargando con normalidad).
+    """
+    lote = Lote()
+    try:
+        yield lote
+    finally:
+        with _en_vuelo_lock:
+            lote.abierto = False
+            lote.paginas.clear()
+
+
+def estadisticas_descargas() -> dict:
+    """Cuántas páginas se han pedido al servidor y cuántas se han ahorrado (para diagnóstico)."""
+    with _en_vuelo_lock:
+        return dict(_contadores)
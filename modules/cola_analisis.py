@@ -0,0 +1,398 @@
+# modules/cola_analisis.py
+"""
+Cola de trabajos para los análisis completos (obtener_datos_completos_partido).
+
+- Un número fijo de hilos trabajadores (ANALISIS_WORKERS) atiende la cola, así que
+  nunca hay más estudios en marcha que navegadores en el pool.
+- Los trabajos se identifican por match_id: volver a pedir un partido que ya está en
+  cola o en curso se engancha al mismo trabajo en lugar de lanzar otro.
+- Prioridades: lo que un usuario está esperando (ALTA) pasa por delante de los
+  preanálisis en segundo plano (NORMAL) y de la precarga (BAJA). Si un trabajo ya
+  encolado se vuelve a pedir con más prioridad, sube en la cola.
+- El resultado se guarda en cache_estudios (con la vigencia que toca según el estado
+  del partido) y, como mucho ANALISIS_RESULTADO_TTL, también en memoria, para que la
+  petición que llegue después del preanálisis lo reciba al instante.
+- Un estudio caducado en la caché se sirve tal cual y se recalcula en segundo plano
+  con prioridad BAJA, revalidando la página h2h (si no, se recalcularía sobre la misma
+  copia de la caché de páginas); como los trabajos se deduplican, muchas peticiones a
+  la vez del mismo partido provocan un único cálculo.
+- Avances: cada trabajo guarda las etapas del estudio que ya están completas
+  (`al_avanzar` de obtener_datos_completos_partido), y `seguir_resultado()` las
+  entrega según llegan para poder enviar el análisis por partes.
+- Con varios workers de gunicorn, cada partido se calcula en un solo proceso: el
+  trabajador toma el turno del estudio en el almacén compartido y lo renueva mientras
+  calcula. Si lo tiene otro worker, el trabajo no ocupa al trabajador: pasa al hilo de
+  sondeo, que adopta el estudio en cuanto ese worker lo guarda en cache_estudios, o lo
+  vuelve a encolar si el turno queda libre sin estudio (error o worker caído).
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from modules import almacen_compartido, estudio_scraper, cache_estudios
+
+ANALISIS_WORKERS = int(os.environ.get("ANALISIS_WORKERS", "2"))
+ANALISIS_COLA_MAX = int(os.environ.get("ANALISIS_COLA_MAX", "50"))
+ANALISIS_RESULTADO_TTL = int(os.environ.get("ANALISIS_RESULTADO_TTL", "1800"))
+ANALISIS_RESULTADOS_MAX = int(os.environ.get("ANALISIS_RESULTADOS_MAX", "100"))
+ANALISIS_ESPERA_MAX_SECONDS = int(os.environ.get("ANALISIS_ESPERA_MAX_SECONDS", "180"))
+# Caducidad del turno de un estudio; se renueva mientras se calcula.
+ANALISIS_TURNO_SECONDS = int(os.environ.get("ANALISIS_TURNO_SECONDS", "30"))
+
+PRIORIDAD_ALTA = 0
+PRIORIDAD_NORMAL = 1
+PRIORIDAD_BAJA = 2
+
+EN_COLA = "en_cola"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+_trabajos = {}
+_heap = []
+_secuencia = itertools.count()
+_cond = threading.Condition()
+_hilos = []
+
+
+class ColaLlenaError(Exception):
+    """La cola ya tiene ANALISIS_COLA_MAX trabajos pendientes."""
+
+
+def _pendientes() -> int:
+    return sum(1 for t in _trabajos.values() if t["estado"] == EN_COLA)
+
+
+def _vigente(trabajo: dict) -> bool:
+    """Trabajo completado cuyo resultado en memoria todavía se puede servir."""
+    return trabajo["estado"] == COMPLETADO and time.time() - trabajo["terminado_en"] < trabajo["vigencia"]
+
+
+def _purgar_terminados():
+    """Quita resultados caducados y, si sobran, los terminados más antiguos."""
+    ahora = time.time()
+    terminados = sorted(
+        (t for t in _trabajos.values() if t["estado"] in (COMPLETADO, ERROR)),
+        key=lambda t: t["terminado_en"],
+    )
+    sobran = len(terminados) - ANALISIS_RESULTADOS_MAX
+    for i, trabajo in enumerate(terminados):
+        caducado = not _vigente(trabajo) if trabajo["estado"] == COMPLETADO else ahora - trabajo["terminado_en"] > ANALISIS_RESULTADO_TTL
+        if i < sobran or caducado:
+            del _trabajos[trabajo["match_id"]]
+
+
+def _iniciar_trabajadores():
+    if _hilos:
+        return
+    for i in range(ANALISIS_WORKERS):
+        hilo = threading.Thread(target=_bucle_trabajador, name=f"analisis-{i}", daemon=True)
+        hilo.start()
+        _hilos.append(hilo)
+    hilo = threading.Thread(target=_bucle_sondeo, name="analisis-sondeo", daemon=True)
+    hilo.start()
+    _hilos.append(hilo)
+
+
+def encolar(match_id: str, prioridad: int = PRIORIDAD_NORMAL, revalidar: bool = False) -> dict:
+    """
+    Pide el análisis de `match_id` y devuelve su trabajo. Si ya hay uno en cola, en
+    curso o con resultado vigente, se reutiliza (un error o un resultado caducado
+    sí se recalculan). Con `revalidar`, el estudio se calcula sobre la página h2h
+    revalidada con el servidor, no sobre la copia de la caché de páginas.
+    Lanza ColaLlenaError si hay que encolar uno nuevo y la cola está llena.
+    """
+    match_id = str(match_id)
+    with _cond:
+        _iniciar_trabajadores()
+        _purgar_terminados()
+        trabajo = _trabajos.get(match_id)
+        if trabajo is not None and (trabajo["estado"] in (EN_COLA, EN_CURSO) or _vigente(trabajo)):
+            if trabajo["estado"] == EN_COLA:
+                trabajo["revalidar"] = trabajo["revalidar"] or revalidar
+            if trabajo["estado"] == EN_COLA and prioridad < trabajo["prioridad"]:
+                # La entrada antigua del heap queda obsoleta y se salta al sacarla.
+                trabajo["prioridad"] = prioridad
+                heapq.heappush(_heap, (prioridad, next(_secuencia), match_id))
+                _cond.notify()
+            elif trabajo["en_otro_worker"] and prioridad < trabajo["prioridad"]:
+                # Si vuelve a la cola (el otro worker falla), entra con la prioridad nueva.
+                trabajo["prioridad"] = prioridad
+            return trabajo
+        if _pendientes() >= ANALISIS_COLA_MAX:
+            raise ColaLlenaError(f"Hay {ANALISIS_COLA_MAX} análisis en cola; inténtalo más tarde.")
+        trabajo = {
+            "match_id": match_id,
+            "estado": EN_COLA,
+            "prioridad": prioridad,
+            "creado_en": time.time(),
+            "iniciado_en": None,
+            "terminado_en": None,
+            "resultado": None,
+            "error": None,
+            "vigencia": 0,
+            "etapas": [],
+            "parcial": None,
+            "en_otro_worker": False,
+            "revalidar": revalidar,
+            "hecho": threading.Event(),
+        }
+        _trabajos[match_id] = trabajo
+        heapq.heappush(_heap, (prioridad, next(_secuencia), match_id))
+        _cond.notify()
+        return trabajo
+
+
+def cancelar(match_id: str, prioridad_minima: int = PRIORIDAD_BAJA) -> bool:
+    """
+    Quita de la cola el trabajo de `match_id` si aún no ha empezado y su prioridad es
+    `prioridad_minima` o menor (por defecto solo la precarga). Nadie lo está esperando:
+    quien espera un resultado lo pide con prioridad ALTA y el trabajo deja de ser BAJA.
+    """
+    with _cond:
+        trabajo = _trabajos.get(str(match_id))
+        if trabajo is None or trabajo["estado"] != EN_COLA or trabajo["prioridad"] < prioridad_minima:
+            return False
+        # Su entrada del heap queda huérfana y se salta al sacarla.
+        del _trabajos[str(match_id)]
+        return True
+
+
+def _siguiente_trabajo() -> dict:
+    with _cond:
+        while True:
+            while _heap:
+                prioridad, _, match_id = heapq.heappop(_heap)
+                trabajo = _trabajos.get(match_id)
+                if trabajo is None or trabajo["estado"] != EN_COLA or trabajo["prioridad"] != prioridad:
+                    continue
+                trabajo["estado"] = EN_CURSO
+                trabajo["iniciado_en"] = time.time()
+                return trabajo
+            _cond.wait()
+
+
+def _estudio_de_otro_worker(match_id: str):
+    """Estudio vigente en cache_estudios (lo guarda el worker que tiene el turno), o None."""
+    guardado = cache_estudios.vigencia(match_id)
+    if guardado is None or not guardado["fresca"]:
+        return None
+    guardado = cache_estudios.leer(match_id)
+    return guardado["datos"] if guardado is not None and guardado["fresca"] else None
+
+
+def _terminar(trabajo: dict, datos, error):
+    if not error:
+        ttl = cache_estudios.ttl_estudio(datos)
+    with _cond:
+        trabajo["terminado_en"] = time.time()
+        if error:
+            trabajo["estado"], trabajo["error"] = ERROR, error
+        else:
+            trabajo["estado"], trabajo["resultado"] = COMPLETADO, datos
+            trabajo["vigencia"] = ANALISIS_RESULTADO_TTL if ttl is None else min(ttl, ANALISIS_RESULTADO_TTL)
+        trabajo["parcial"] = None
+        trabajo["en_otro_worker"] = False
+        _cond.notify_all()
+    trabajo["hecho"].set()
+    duracion = trabajo["terminado_en"] - trabajo["iniciado_en"]
+    print(f"Análisis {trabajo['match_id']}: {trabajo['estado']} en {duracion:.1f}s." + (f" {error}" if error else ""))
+
+
+def _bucle_trabajador():
+    while True:
+        trabajo = _siguiente_trabajo()
+        match_id = trabajo["match_id"]
+        turno = f"estudio:{match_id}"
+        # Sin caché de estudios no hay dónde recoger el de otro worker: se calcula aquí.
+        if cache_estudios.ESTUDIO_CACHE_ENABLED:
+            if not almacen_compartido.tomar_turno(turno, ANALISIS_TURNO_SECONDS):
+                print(f"Análisis {match_id}: lo está calculando otro worker, se espera su resultado.")
+                with _cond:
+                    trabajo["en_otro_worker"] = True
+                continue
+            # El turno puede quedar libre justo después de que otro worker guarde el estudio.
+            if (datos := _estudio_de_otro_worker(match_id)) is not None:
+                almacen_compartido.soltar_turno(turno)
+                print(f"Análisis {match_id}: lo ha calculado otro worker.")
+                _terminar(trabajo, datos, None)
+                continue
+        print(f"Análisis {match_id}: iniciado (prioridad {trabajo['prioridad']}).")
+
+        def al_avanzar(etapa, parcial, trabajo=trabajo):
+            with _cond:
+                trabajo["parcial"] = parcial
+                trabajo["etapas"].append(etapa)
+                _cond.notify_all()
+
+        with almacen_compartido.mantener_turno(turno, ANALISIS_TURNO_SECONDS):
+            try:
+                datos = estudio_scraper.obtener_datos_completos_partido(match_id, al_avanzar=al_avanzar,
+                                                                        revalidar=trabajo["revalidar"])
+                if not datos:
+                    error = "No se pudieron obtener datos."
+                else:
+                    error = datos.get("error")
+            except Exception as exc:
+                datos, error = None, f"{type(exc).__name__}: {exc}"
+            if not error:
+                cache_estudios.guardar(match_id, datos)
+        _terminar(trabajo, datos, error)
+
+
+def _bucle_sondeo():
+    """
+    Atiende los trabajos cuyo estudio calcula otro worker, fuera de los trabajadores
+    (que siguen con el resto de la cola): adopta el estudio en cuanto está en caché o,
+    si el turno queda libre sin él, devuelve el trabajo a la cola con su prioridad.
+    """
+    while True:
+        time.sleep(almacen_compartido.ALMACEN_SONDEO_SECONDS)
+        with _cond:
+            ajenos = [t for t in _trabajos.values() if t["estado"] == EN_CURSO and t["en_otro_worker"]]
+        for trabajo in ajenos:
+            match_id = trabajo["match_id"]
+            datos = _estudio_de_otro_worker(match_id)
+            if datos is not None:
+                print(f"Análisis {match_id}: lo ha calculado otro worker.")
+                _terminar(trabajo, datos, None)
+            elif not almacen_compartido.turno_ajeno(f"estudio:{match_id}"):
+                with _cond:
+                    trabajo["estado"], trabajo["en_otro_worker"] = EN_COLA, False
+                    heapq.heappush(_heap, (trabajo["prioridad"], next(_secuencia), match_id))
+                    _cond.notify()
+
+
+def obtener_resultado(match_id: str, prioridad: int = PRIORIDAD_ALTA, timeout: float | None = None) -> dict:
+    """
+    Devuelve los datos del análisis, o un dict {"error": ...} como
+    obtener_datos_completos_partido. Orden: resultado vigente en memoria, estudio en
+    caché (si está caducado se sirve igual y se recalcula en segundo plano) y, si no
+    hay nada, se encola y se espera a que termine.
+    """
+    with _cond:
+        trabajo = _trabajos.get(str(match_id))
+        if trabajo is not None and _vigente(trabajo):
+            return trabajo["resultado"]
+    guardado = cache_estudios.leer(match_id)
+    if guardado is not None:
+        if not guardado["fresca"]:
+            try:
+                encolar(match_id, PRIORIDAD_BAJA, revalidar=True)
+            except ColaLlenaError:
+                pass
+        return guardado["datos"]
+    try:
+        trabajo = encolar(match_id, prioridad)
+    except ColaLlenaError as exc:
+        return {"error": str(exc)}
+    if not trabajo["hecho"].wait(ANALISIS_ESPERA_MAX_SECONDS if timeout is None else timeout):
+        return {"error": f"El análisis del partido {match_id} sigue en marcha; inténtalo en unos segundos."}
+    if trabajo["estado"] == ERROR:
+        return {"error": trabajo["error"]}
+    return trabajo["resultado"]
+
+
+def seguir_resultado(match_id: str, prioridad: int = PRIORIDAD_ALTA, timeout: float | None = None):
+    """
+    Como obtener_resultado, pero generador: va entregando (etapa, datos) según avanza el
+    estudio, con `datos` el estudio parcial. Termina con ("completo", datos) o con
+    ("error", {"error": ...}). Si el resultado ya está en memoria o en caché, se entrega
+    directamente como "completo". Quien se engancha a un trabajo en curso recibe primero
+    las etapas que ya se habían completado.
+    """
+    with _cond:
+        trabajo = _trabajos.get(str(match_id))
+        datos = trabajo["resultado"] if trabajo is not None and _vigente(trabajo) else None
+    if datos is None and (guardado := cache_estudios.leer(match_id)) is not None:
+        if not guardado["fresca"]:
+            try:
+                encolar(match_id, PRIORIDAD_BAJA, revalidar=True)
+            except ColaLlenaError:
+                pass
+        datos = guardado["datos"]
+    if datos is not None:
+        yield "completo", datos
+        return
+    try:
+        trabajo = encolar(match_id, prioridad)
+    except ColaLlenaError as exc:
+        yield "error", {"error": str(exc)}
+        return
+    limite = time.monotonic() + (ANALISIS_ESPERA_MAX_SECONDS if timeout is None else timeout)
+    vistas = 0
+    while True:
+        with _cond:
+            while len(trabajo["etapas"]) == vistas and trabajo["estado"] in (EN_COLA, EN_CURSO):
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                _cond.wait(restante)
+            nuevas = trabajo["etapas"][vistas:]
+            vistas += len(nuevas)
+            parcial, estado = trabajo["parcial"], trabajo["estado"]
+        for etapa in nuevas:
+            if parcial is not None:
+                yield etapa, parcial
+        if estado == COMPLETADO:
+            yield "completo", trabajo["resultado"]
+            return
+        if estado == ERROR:
+            yield "error", {"error": trabajo["error"]}
+            return
+        if not nuevas and time.monotonic() >= limite:
+            yield "error", {"error": f"El análisis del partido {match_id} sigue en marcha; inténtalo en unos segundos."}
+            return
+
+
+def resultado_si_listo(match_id: str):
+    """Datos del análisis ya completado (en memoria o en caché), o None si no hay."""
+    with _cond:
+        trabajo = _trabajos.get(str(match_id))
+        if trabajo is not None and _vigente(trabajo):
+            return trabajo["resultado"]
+    guardado = cache_estudios.leer(match_id)
+    return guardado["datos"] if guardado is not None else None
+
+
+def _vista(trabajo: dict) -> dict:
+    vista = {k: trabajo[k] for k in ("match_id", "estado", "prioridad", "creado_en", "iniciado_en", "terminado_en", "error")}
+    if trabajo["estado"] == EN_COLA:
+        por_delante = sorted(
+            (t["prioridad"], t["creado_en"]) for t in _trabajos.values() if t["estado"] == EN_COLA
+        )
+        vista["posicion"] = por_delante.index((trabajo["prioridad"], trabajo["creado_en"])) + 1
+    return vista
+
+
+def estado_trabajo(match_id: str) -> dict | None:
+    """
+    Estado del trabajo de `match_id` (sin el resultado). Si no hay trabajo pero el
+    estudio está en caché se informa como completado; None si no se conoce.
+    """
+    with _cond:
+        _purgar_terminados()
+        trabajo = _trabajos.get(str(match_id))
+        if trabajo is not None:
+            return _vista(trabajo)
+    guardado = cache_estudios.vigencia(match_id)
+    if guardado is None:
+        return None
+    return {"match_id": str(match_id), "estado": COMPLETADO, "terminado_en": guardado["guardado_en"],
+            "en_cache": True, "fresca": guardado["fresca"]}
+
+
+def estado_cola() -> dict:
+    """Resumen de la cola (para diagnóstico)."""
+    with _cond:
+        estados = [t["estado"] for t in _trabajos.values()]
+        return {
+            "workers": ANALISIS_WORKERS,
+            "max_queue": ANALISIS_COLA_MAX,
+            "queued": estados.count(EN_COLA),
+            "running": estados.count(EN_CURSO),
+            "completed": estados.count(COMPLETADO),
+            "failed": estados.count(ERROR),
+        }
@@ -0,0 +1,64 @@
+# modules/estadisticas_partido.py
+"""
+Estadísticas de progresión de un partido (página /match/live-{id}): córners, tiros,
+tiros a puerta, ataques, ataques peligrosos y rojas, local y visitante.
+
+Antes se guardaban en un DataFrame de pandas de seis filas que solo se recorría con
+iterrows; importar pandas costaba más que todo lo demás del worker. Ahora son filas
+tipadas e inmutables que las plantillas y la API recorren directamente.
+"""
+from dataclasses import dataclass
+
+COLUMNAS = ("Casa", "Fuera")
+COLUMNA_ESTADISTICA = "Estadistica_EN"
+
+# Se aplican en orden (como los .replace encadenados de las plantillas).
+_TRADUCCIONES = (("Shots on Goal", "Tiros a Puerta"), ("Shots", "Tiros"),
+                 ("Dangerous Attacks", "Ataques Peligrosos"), ("Attacks", "Ataques"))
+
+
+@dataclass(frozen=True, slots=True)
+class FilaEstadistica:
+    estadistica: str    # nombre de NowGoal en inglés: "Shots on Goal", "Red Cards"...
+    casa: object        # texto (con el <span> de color de _colorear_stats) o número
+    fuera: object
+
+    @property
+    def etiqueta(self) -> str:
+        """Nombre en español para mostrar."""
+        etiqueta = self.estadistica
+        for ingles, espanol in _TRADUCCIONES:
+            etiqueta = etiqueta.replace(ingles, espanol)
+        return etiqueta
+
+
+@dataclass(frozen=True, slots=True)
+class EstadisticasPartido:
+    filas: tuple = ()
+
+    columnas = COLUMNAS
+
+    def __iter__(self):
+        return iter(self.filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+    @classmethod
+    def desde_registros(cls, registros) -> "EstadisticasPartido":
+        """Desde registros {"Estadistica_EN", "Casa", "Fuera"} (caché de estadísticas y de estudios)."""
+        return cls(tuple(FilaEstadistica(r.get(COLUMNA_ESTADISTICA, ""), r.get("Casa", "-"), r.get("Fuera", "-"))
+                         for r in registros))
+
+    def registros(self) -> list[dict]:
+        """Inverso de desde_registros."""
+        return [{COLUMNA_ESTADISTICA: f.estadistica, "Casa": f.casa, "Fuera": f.fuera} for f in self.filas]
+
+    def filas_api(self, vacio_si_falso: bool = False) -> list[dict]:
+        """
+        Filas {"label", "home", "away"} de las respuestas JSON. Con `vacio_si_falso`
+        los valores vacíos o 0 salen como "" (formato de /api/analisis).
+        """
+        if vacio_si_falso:
+            return [{"label": f.etiqueta, "home": f.casa or "", "away": f.fuera or ""} for f in self.filas]
+        return [{"label": f.etiqueta, "home": f.casa, "away": f.fuera} for f in self.filas]
@@ -6,174 +6,29 @@ from modules.funciones_resumen import generar_resumen_rendimiento_reciente
 from modules.funciones_auxiliares import _calcular_estadisticas_contra_rival, _analizar_over_under, _analizar_ah_cubierto, _analizar_desempeno_casa_fuera
 import time
 import re
-import math
 import os
-import shutil
 from bs4 import BeautifulSoup
-import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover, check_goal_line_cover, get_match_details_from_row_of, extract_final_score_of
+from modules.cliente_http import obtener_html
+from modules import pool_selenium, cache_estadisticas, historial_partidos, limitador_peticiones
+from modules.pagina_h2h import como_pagina_h2h, construir_pagina_h2h
+from modules.estadisticas_partido import EstadisticasPartido
+from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover, extract_final_score_of, is_match_finished_of
+from modules.utils import check_goal_line_cover as _check_goal_line_cover
 
 BASE_URL_OF = "https://live18.nowgoal25.com"
 SELENIUM_TIMEOUT_SECONDS_OF = 10
+STATS_FETCH_WORKERS = 8
 PLACEHOLDER_NODATA = "*(No disponible)*"
+# "requests": estudio completo con el HTML estático (Selenium solo de respaldo); "selenium": siempre navegador.
+ESTUDIO_MODO = os.environ.get("ESTUDIO_MODO", "requests")
 
-
-
-def _resolve_chromium_binary():
-    candidates = [
-        os.environ.get("CHROME_BINARY"),
-        shutil.which("chromium"),
-        shutil.which("chromium-browser"),
-        shutil.which("google-chrome"),
-        "/usr/bin/chromium",
-        "/usr/bin/chromium-browser",
-        "/usr/bin/google-chrome",
-    ]
-    for candidate in candidates:
-        if candidate and os.path.exists(candidate):
-            return candidate
-    return None
-
-
-def _resolve_chromedriver_path():
-    candidates = [
-        os.environ.get("CHROMEDRIVER_PATH"),
-        shutil.which("chromedriver"),
-        "/usr/bin/chromedriver",
-        "/usr/local/bin/chromedriver",
-    ]
-    for candidate in candidates:
-        if candidate and os.path.exists(candidate):
-            return candidate
-    return None
-
-
-def _create_chrome_driver(options):
-    binary_location = _resolve_chromium_binary()
-    if binary_location:
-        options.binary_location = binary_location
-
-    driver_path = _resolve_chromedriver_path()
-    if driver_path:
-        service = Service(driver_path)
-        return webdriver.Chrome(service=service, options=options)
-
-    return webdriver.Chrome(options=options)
-
-def parse_ah_to_number_of(ah_line_str: str):
-    if not isinstance(ah_line_str, str): return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: return None
-    original_starts_with_minus = ah_line_str.strip().startswith('-')
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: return None
-            p1_str, p2_str = parts[0], parts[1]
-            val1 = float(p1_str)
-            val2 = float(p2_str)
-            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
-                 val2 = -abs(val2)
-            elif original_starts_with_minus and val1 == 0.0 and \
-                 (p1_str == "0" or p1_str == "-0") and \
-                 not p2_str.startswith('-') and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except (ValueError, IndexError):
-        return None
-
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-    if numeric_value == 0.0: return "0"
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    mod_val = abs_num % 1
-    if mod_val == 0.0: abs_rounded = abs_num
-    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
-    elif mod_val == 0.5: abs_rounded = abs_num
-    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
-    else:
-        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
-        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
-        else: abs_rounded = math.ceil(abs_num)
-    final_value_signed = sign * abs_rounded
-    if final_value_signed == 0.0: output_str = "0"
-    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9 : output_str = str(int(round(final_value_signed, 0)))
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.25)) < 1e-9 or \
-         abs(final_value_signed - (math.floor(final_value_signed) + 0.75)) < 1e-9: output_str = f"{final_value_signed:.2f}".replace(".25", ".25").replace(".75", ".75")
-    else: output_str = f"{final_value_signed:.2f}"
-    if for_sheets:
-        return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
-    return output_str
-
-def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
-    """
-    Simula si un resultado histórico habría cubierto la línea de hándicap actual.
-    Maneja correctamente el Hándicap Asiático 0.
-    """
-    try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-
-        # --- LÓGICA ESPECIAL PARA HÁNDICAP 0 (DRAW NO BET) ---
-        if ah_line_num == 0.0:
-            # Simulamos la apuesta sobre el equipo local del partido principal
-            if main_home_team_name.lower() == home_team_in_h2h.lower(): # Si nuestro local jugaba de local
-                if goles_h > goles_a: return ("CUBIERTO", True)
-                elif goles_a > goles_h: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-            else: # Si nuestro local jugaba de visitante
-                if goles_a > goles_h: return ("CUBIERTO", True)
-                elif goles_h > goles_a: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-        
-        # --- LÓGICA ANTERIOR PARA HÁNDICAPS CON FAVORITO ---
-        if favorite_team_name.lower() == home_team_in_h2h.lower():
-            favorite_margin = goles_h - goles_a
-        elif favorite_team_name.lower() == away_team_in_h2h.lower():
-            favorite_margin = goles_a - goles_h
-        else:
-            return ("indeterminado", None)
-        
-        if favorite_margin - abs(ah_line_num) > 0.05:
-            return ("CUBIERTO", True)
-        elif favorite_margin - abs(ah_line_num) < -0.05:
-            return ("NO CUBIERTO", False)
-        else:
-            return ("PUSH", None)
-
-    except (ValueError, TypeError, AttributeError):
-        return ("indeterminado", None)
-
+# parse_ah_to_number_of, format_ah_as_decimal_string_of y check_handicap_cover son los de
+# modules.utils; aquí solo cambian los textos de la línea de goles.
 def check_goal_line_cover(resultado_raw: str, goal_line_num: float):
-    try:
-        goles_h, goles_a = map(int, resultado_raw.split('-'))
-        total_goles = goles_h + goles_a
-        if total_goles > goal_line_num:
-            return ("SUPERADA (Over)", True)
-        elif total_goles < goal_line_num:
-            return (f"<span style='color: red; font-weight: bold;'>NO SUPERADA (UNDER) </span>", False)
-        else:
-            return ("PUSH (Igual)", None)
-    except (ValueError, TypeError):
-        return ("indeterminado", None)
+    return _check_goal_line_cover(resultado_raw, goal_line_num, etiquetas=(
+        "SUPERADA (Over)", "<span style='color: red; font-weight: bold;'>NO SUPERADA (UNDER) </span>", "PUSH (Igual)"))
 
 def _analizar_precedente_handicap(precedente_data, ah_actual_num, favorito_actual_name, main_home_team_name):
     """
@@ -474,99 +329,126 @@ def _colorear_stats(val1_str, val2_str):
         # Si no se pueden convertir a números (ej. texto), devolver los originales
         return val1_str, val2_str
 
-def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
-    if not match_id or not match_id.isdigit(): return None
-    url = f"{BASE_URL_OF}/match/live-{match_id}"
-    try:
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
-        session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        # Definir el orden específico de las estadísticas (sin Yellow Cards)
-        stat_order = ["Corners", "Shots", "Shots on Goal", "Attacks", "Dangerous Attacks", "Red Cards"]
-        stat_titles = {stat: "-" for stat in stat_order}
-        
-        team_tech_div = soup.find('div', id='teamTechDiv_detail')
-        if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
-            for li in stat_list.find_all('li'):
-                if (title_span := li.find('span', class_='stat-title')) and (stat_title := title_span.get_text(strip=True)) in stat_titles:
-                    values = [v.get_text(strip=True) for v in li.find_all('span', class_='stat-c')]
-                    if len(values) == 2:
-                        home_val, away_val = _colorear_stats(values[0], values[1])
-                        stat_titles[stat_title] = {"Home": home_val, "Away": away_val}
+def _parse_progression_stats_rows(html: str):
+    """
+    Parsea la página /match/live-{id}. Devuelve (filas, completas): `completas` indica
+    que la página traía el bloque de estadísticas (teamTechDiv_detail) y que marca el
+    partido como terminado, es decir, que sus estadísticas ya no cambian y se pueden
+    guardar en la caché permanente. Un partido en juego también trae el bloque.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+
+    # Definir el orden específico de las estadísticas (sin Yellow Cards)
+    stat_order = ["Corners", "Shots", "Shots on Goal", "Attacks", "Dangerous Attacks", "Red Cards"]
+    stat_titles = {stat: "-" for stat in stat_order}
+    
+    team_tech_div = soup.find('div', id='teamTechDiv_detail')
+    if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
+        for li in stat_list.find_all('li'):
+            if (title_span := li.find('span', class_='stat-title')) and (stat_title := title_span.get_text(strip=True)) in stat_titles:
+                values = [v.get_text(strip=True) for v in li.find_all('span', class_='stat-c')]
+                if len(values) == 2:
+                    home_val, away_val = _colorear_stats(values[0], values[1])
+                    stat_titles[stat_title] = {"Home": home_val, "Away": away_val}
+    
+    # Si no encontramos las tarjetas rojas en la sección principal, las buscamos en la sección de eventos
+    if stat_titles["Red Cards"] == "-":
+        red_cards = {"Home": 0, "Away": 0}
+        events_table = soup.find('table', id='eventsTable')
+        if events_table:
+            # Buscar imágenes de tarjetas rojas
+            red_card_images = events_table.find_all('img', alt='Red Card')
+            for img in red_card_images:
+                # Determinar si es para el equipo local o visitante basado en la estructura de la tabla
+                parent_td = img.find_parent('td')
+                if parent_td:
+                    # Si el td tiene style="text-align: right;", es para el equipo local
+                    if "text-align: right;" in parent_td.get('style', ''):
+                        red_cards["Home"] += 1
+                    # Si el td tiene style="text-align: left;", es para el equipo visitante
+                    elif "text-align: left;" in parent_td.get('style', ''):
+                        red_cards["Away"] += 1
+        stat_titles["Red Cards"] = red_cards
         
-        # Si no encontramos las tarjetas rojas en la sección principal, las buscamos en la sección de eventos
-        if stat_titles["Red Cards"] == "-":
-            red_cards = {"Home": 0, "Away": 0}
-            events_table = soup.find('table', id='eventsTable')
-            if events_table:
-                # Buscar imágenes de tarjetas rojas
-                red_card_images = events_table.find_all('img', alt='Red Card')
-                for img in red_card_images:
-                    # Determinar si es para el equipo local o visitante basado en la estructura de la tabla
-                    parent_td = img.find_parent('td')
-                    if parent_td:
-                        # Si el td tiene style="text-align: right;", es para el equipo local
-                        if "text-align: right;" in parent_td.get('style', ''):
-                            red_cards["Home"] += 1
-                        # Si el td tiene style="text-align: left;", es para el equipo visitante
-                        elif "text-align: left;" in parent_td.get('style', ''):
-                            red_cards["Away"] += 1
-            stat_titles["Red Cards"] = red_cards
-            
-        # Eliminamos la extracción de tarjetas amarillas según solicitud
-        # Pasamos directamente a procesar Red Cards
-            
-        # Crear las filas respetando el orden definido
-        table_rows = []
-        for stat_name in stat_order:
-            vals = stat_titles[stat_name]
-            if isinstance(vals, dict):
-                table_rows.append({
-                    "Estadistica_EN": stat_name,
-                    "Casa": vals.get('Home', '-'),
-                    "Fuera": vals.get('Away', '-')
-                })
+    # Eliminamos la extracción de tarjetas amarillas según solicitud
+    # Pasamos directamente a procesar Red Cards
         
-        df = pd.DataFrame(table_rows)
-        return df.set_index("Estadistica_EN") if not df.empty else df
+    # Crear las filas respetando el orden definido
+    table_rows = []
+    for stat_name in stat_order:
+        vals = stat_titles[stat_name]
+        if isinstance(vals, dict):
+            table_rows.append({
+                "Estadistica_EN": stat_name,
+                "Casa": vals.get('Home', '-'),
+                "Fuera": vals.get('Away', '-')
+            })
+    return table_rows, team_tech_div is not None and is_match_finished_of(soup)
+
+def _descargar_progression_stats_rows(match_id: str):
+    try:
+        return _parse_progression_stats_rows(obtener_html(f"{BASE_URL_OF}/match/live-{match_id}", timeout=10))
     except requests.RequestException:
-        return None
+        return None, False
+
+def get_match_progression_stats_batch(match_ids) -> dict:
+    """
+    Estadísticas de progresión de varios partidos de una vez: {match_id: EstadisticasPartido o None}.
+    Los IDs repetidos se piden una sola vez, los que ya están en la caché permanente no se
+    descargan y el resto se descarga en paralelo. Pensado para partidos ya terminados
+    (los del historial), cuyas estadísticas no cambian; las de uno en juego se devuelven
+    pero no se guardan.
+    """
+    ids = list(dict.fromkeys(str(m) for m in match_ids if m and str(m).isdigit()))
+    if not ids:
+        return {}
+    filas_por_id = cache_estadisticas.leer_estadisticas(ids)
+    pendientes = [m for m in ids if m not in filas_por_id]
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=min(STATS_FETCH_WORKERS, len(pendientes))) as executor:
+            descargas = dict(zip(pendientes, executor.map(_descargar_progression_stats_rows, pendientes)))
+        cache_estadisticas.guardar_estadisticas({m: filas for m, (filas, completas) in descargas.items() if completas})
+        filas_por_id.update({m: filas for m, (filas, _) in descargas.items() if filas is not None})
+    return {m: (EstadisticasPartido.desde_registros(filas_por_id[m]) if m in filas_por_id else None) for m in ids}
+
+def get_match_progression_stats_data(match_id: str) -> EstadisticasPartido | None:
+    if not match_id or not match_id.isdigit(): return None
+    return get_match_progression_stats_batch([match_id]).get(match_id)
 
 def get_rival_a_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v1")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr1_\d+")):
-        if league_id and row.get("name") != str(league_id):
+    pagina = como_pagina_h2h(soup)
+    if not pagina or (filas := pagina.filas("table_v1")) is None: return None, None, None
+    for fila in filas:
+        if league_id and fila.league_id != str(league_id):
             continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 1 and (rival_tag := onclicks[1]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
+        if fila.vs == "1" and (key_id := fila.match_id):
+            if len(fila.enlaces) > 1 and (rival_id := fila.team_id(1)):
+                return key_id, rival_id, fila.enlaces[1][1]
     return None, None, None
 
 def get_rival_b_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v2")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        if league_id and row.get("name") != str(league_id):
+    pagina = como_pagina_h2h(soup)
+    if not pagina or (filas := pagina.filas("table_v2")) is None: return None, None, None
+    for fila in filas:
+        if league_id and fila.league_id != str(league_id):
             continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 0 and (rival_tag := onclicks[0]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
+        if fila.vs == "1" and (key_id := fila.match_id):
+            if len(fila.enlaces) > 0 and (rival_id := fila.team_id(0)):
+                return key_id, rival_id, fila.enlaces[0][1]
     return None, None, None
 
 def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
     if not all([driver, key_match_id, rival_a_id, rival_b_id]):
         return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
+    # Selenium solo se importa si se llega a usar el navegador.
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
     url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
     try:
-        driver.get(url)
+        with limitador_peticiones.peticion(url, medir_latencia=False):
+            driver.get(url)
         WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
         try:
             select = Select(WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "hSelect_2"))))
@@ -576,6 +458,26 @@ def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, riva
         soup = BeautifulSoup(driver.page_source, "lxml")
     except Exception as e:
         return {"status": "error", "resultado": f"N/A (Error Selenium en H2H Col3: {type(e).__name__})"}
+    return _buscar_h2h_col3_en_soup(soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+
+def get_h2h_details_for_original_logic_requests_of(key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
+    """
+    Igual que get_h2h_details_for_original_logic_of pero con la página estática (sin navegador).
+    Si la página no trae Bet365 como casa por defecto se delega en un driver del pool.
+    """
+    if not all([key_match_id, rival_a_id, rival_b_id]):
+        return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
+    url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
+    try:
+        soup = BeautifulSoup(obtener_html(url, timeout=6), "lxml")
+    except Exception as e:
+        return {"status": "error", "resultado": f"N/A (Error de descarga en H2H Col3: {type(e).__name__})"}
+    if not _selects_por_defecto_en_bet365(soup, ["hSelect_2"]):
+        with pool_selenium.driver_del_pool() as driver:
+            return get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+    return _buscar_h2h_col3_en_soup(soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+
+def _buscar_h2h_col3_en_soup(soup, rival_a_id, rival_b_id, rival_a_name, rival_b_name):
     if not (table := soup.find("table", id="table_v2")):
         return {"status": "error", "resultado": "N/A (Tabla H2H Col3 no encontrada)"}
     for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
@@ -610,19 +512,10 @@ def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, riva
     return {"status": "not_found", "resultado": f"H2H directo no encontrado para {rival_a_name} vs {rival_b_name}."}
 
 def get_team_league_info_from_script_of(soup):
-    script_tag = soup.find("script", string=re.compile(r"var _matchInfo = "))
-    if not (script_tag and script_tag.string): return (None,) * 3 + ("N/A",) * 3
-    content = script_tag.string
-    def find_val(pattern):
-        match = re.search(pattern, content)
-        return match.group(1).replace("'", "") if match else None
-    home_id = find_val(r"hId:\s*parseInt\('(\d+)'\)")
-    away_id = find_val(r"gId:\s*parseInt\('(\d+)'\)")
-    league_id = find_val(r"sclassId:\s*parseInt\('(\d+)'\)")
-    home_name = find_val(r"hName:\s*'([^']*)'") or "N/A"
-    away_name = find_val(r"gName:\s*'([^']*)'") or "N/A"
-    league_name = find_val(r"lName:\s*'([^']*)'") or "N/A"
-    return home_id, away_id, league_id, home_name, away_name, league_name
+    pagina = como_pagina_h2h(soup)
+    if not (pagina and pagina.script_match_info): return (None,) * 3 + ("N/A",) * 3
+    info = pagina.match_info
+    return info["home_id"], info["away_id"], info["league_id"], info["home_name"], info["away_name"], info["league_name"]
 
 def get_match_datetime_from_script_of(soup):
     """
@@ -631,10 +524,9 @@ def get_match_datetime_from_script_of(soup):
     """
     result = {"match_date": None, "match_time": None, "match_datetime": None}
     try:
-        script_tag = soup.find("script", string=re.compile(r"var _matchInfo = "))
-        if not (script_tag and script_tag.string):
+        content = como_pagina_h2h(soup).script_match_info
+        if not content:
             return result
-        content = script_tag.string
 
         def find_val(pattern):
             m = re.search(pattern, content)
@@ -687,19 +579,20 @@ def _parse_date_ddmmyyyy(d: str) -> tuple:
     m = re.search(r'(\d{2})-(\d{2})-(\d{4})', d or '')
     return (int(m.group(3)), int(m.group(2)), int(m.group(1))) if m else (1900, 1, 1)
 
-def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game):
-    if not soup or not (table := soup.find("table", id=table_id)): return None
+def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game, team_id=None):
+    pagina = como_pagina_h2h(soup)
+    if not pagina or (filas := pagina.filas(table_id)) is None: return None
     candidate_matches = []
     score_selector = 'fscore_1' if is_home_game else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')):
+    clave = pagina.clave(team_name, team_id)
+    for fila in filas:
+        if (fila.clave_local if is_home_game else fila.clave_visitante) != clave:
+            continue
+        if not (details := fila.detalles(score_selector)):
             continue
         if league_id and details.get("league_id_hist") != str(league_id):
             continue
-        is_team_home = team_name.lower() in details.get('home', '').lower()
-        is_team_away = team_name.lower() in details.get('away', '').lower()
-        if (is_home_game and is_team_home) or (not is_home_game and is_team_away):
-            candidate_matches.append(details)
+        candidate_matches.append(details)
     if not candidate_matches: return None
     candidate_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
     last_match = candidate_matches[0]
@@ -710,22 +603,13 @@ def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_hom
     }
 
 def extract_bet365_initial_odds_of(soup):
-    odds_info = {
-        "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
-        "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"
-    }
-    if not soup: return odds_info
-    bet365_row = soup.select_one("tr#tr_o_1_8[name='earlyOdds'], tr#tr_o_1_31[name='earlyOdds']")
-    if not bet365_row: return odds_info
-    tds = bet365_row.find_all("td")
-    if len(tds) >= 11:
-        odds_info["ah_home_cuota"] = tds[2].get("data-o", tds[2].text).strip()
-        odds_info["ah_linea_raw"] = tds[3].get("data-o", tds[3].text).strip()
-        odds_info["ah_away_cuota"] = tds[4].get("data-o", tds[4].text).strip()
-        odds_info["goals_over_cuota"] = tds[8].get("data-o", tds[8].text).strip()
-        odds_info["goals_linea_raw"] = tds[9].get("data-o", tds[9].text).strip()
-        odds_info["goals_under_cuota"] = tds[10].get("data-o", tds[10].text).strip()
-    return odds_info
+    pagina = como_pagina_h2h(soup)
+    if not pagina:
+        return {
+            "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
+            "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"
+        }
+    return dict(pagina.cuotas_iniciales)
 
 def extract_standings_data_from_h2h_page_of(soup, team_name):
     data = {"name": team_name, "ranking": "N/A", "total_pj": "N/A", "total_v": "N/A",
@@ -735,115 +619,57 @@ def extract_standings_data_from_h2h_page_of(soup, team_name):
             "specific_type": "N/A"}
     if not soup or not team_name:
         return data
-    standings_section = soup.find("div", id="porletP4")
-    if not standings_section:
-        return data
-    team_table_soup = None
-    is_home_table = False
-    home_div = standings_section.find("div", class_="home-div")
-    if home_div and team_name.lower() in home_div.get_text(strip=True).lower():
-        team_table_soup = home_div.find("table", class_="team-table-home")
-        is_home_table = True
+    clasificacion = como_pagina_h2h(soup).clasificacion
+    bloque = None
+    if (home := clasificacion["home"]) and team_name.lower() in home["texto"]:
+        bloque = home
         data["specific_type"] = "Est. como Local (en Liga)"
-    else:
-        guest_div = standings_section.find("div", class_="guest-div")
-        if guest_div and team_name.lower() in guest_div.get_text(strip=True).lower():
-            team_table_soup = guest_div.find("table", class_="team-table-guest")
-            is_home_table = False
-            data["specific_type"] = "Est. como Visitante (en Liga)"
-    if not team_table_soup:
+    elif (guest := clasificacion["guest"]) and team_name.lower() in guest["texto"]:
+        bloque = guest
+        data["specific_type"] = "Est. como Visitante (en Liga)"
+    if not bloque or bloque["datos"] is None:
         return data
-    header_link = team_table_soup.find("a")
-    if header_link:
-        full_text = header_link.get_text(separator=" ", strip=True)
-        rank_match = re.search(r'\[.*?-(\d+)\]', full_text)
-        if rank_match:
-            data["ranking"] = rank_match.group(1)
-    all_rows = team_table_soup.find_all("tr", align="center")
-    is_ft_section = False
-    for row in all_rows:
-        header_cell = row.find("th")
-        if header_cell:
-            header_text = header_cell.get_text(strip=True)
-            if "FT" in header_text:
-                is_ft_section = True
-            elif "HT" in header_text:
-                is_ft_section = False
-            continue
-        if is_ft_section and len(cells := row.find_all("td")) >= 7:
-            row_type_element = cells[0].find("span") or cells[0]
-            row_type = row_type_element.get_text(strip=True)
-            stats = [cell.get_text(strip=True) for cell in cells[1:7]]
-            pj, v, e, d, gf, gc = stats
-            if row_type == "Total":
-                data.update({"total_pj": pj, "total_v": v, "total_e": e,
-                            "total_d": d, "total_gf": gf, "total_gc": gc})
-            specific_row_needed = "Home" if is_home_table else "Away"
-            if row_type == specific_row_needed:
-                data.update({"specific_pj": pj, "specific_v": v, "specific_e": e,
-                            "specific_d": d, "specific_gf": gf, "specific_gc": gc})
+    data.update(bloque["datos"])
     return data
 
 def extract_over_under_stats_from_div_of(soup, team_type: str):
-    default_stats = {"over_pct": 0, "under_pct": 0, "push_pct": 0, "total": 0}
     if not soup:
-        return default_stats
-    table_id = "table_v1" if team_type == 'home' else "table_v2"
-    table = soup.find("table", id=table_id)
-    if not table:
-        return default_stats
-    y_bar = table.find("ul", class_="y-bar")
-    if not y_bar:
-        return default_stats
-    ou_group = None
-    for group in y_bar.find_all("li", class_="group"):
-        if "Over/Under Odds" in group.get_text():
-            ou_group = group
-            break
-    if not ou_group:
-        return default_stats
-    try:
-        total_text = ou_group.find("div", class_="tit").find("span").get_text(strip=True)
-        total_match = re.search(r'\((\d+)\s*games\)', total_text)
-        total = int(total_match.group(1)) if total_match else 0
-        values = ou_group.find_all("span", class_="value")
-        if len(values) == 3:
-            over_pct_text = values[0].get_text(strip=True).replace('%', '')
-            push_pct_text = values[1].get_text(strip=True).replace('%', '')
-            under_pct_text = values[2].get_text(strip=True).replace('%', '')
-            return {"over_pct": float(over_pct_text), "under_pct": float(under_pct_text), "push_pct": float(push_pct_text), "total": total}
-    except (ValueError, TypeError, AttributeError):
-        return default_stats
-    return default_stats
-
-def extract_h2h_data_of(soup, home_name, away_name, league_id=None):
+        return {"over_pct": 0, "under_pct": 0, "push_pct": 0, "total": 0}
+    return dict(como_pagina_h2h(soup).over_under['home' if team_type == 'home' else 'away'])
+
+def extract_h2h_data_of(soup, home_name, away_name, league_id=None, home_id=None, away_id=None):
     results = {'ah1': '-', 'res1': '?:?', 'res1_raw': '?-?', 'match1_id': None, 'ah6': '-', 'res6': '?:?', 'res6_raw': '?-?', 'match6_id': None, 'h2h_gen_home': "Local (H2H Gen)", 'h2h_gen_away': "Visitante (H2H Gen)"}
-    if not soup or not home_name or not away_name or not (h2h_table := soup.find("table", id="table_v3")): return results
+    if not soup or not home_name or not away_name: return results
+    pagina = como_pagina_h2h(soup)
+    if (filas := pagina.filas("table_v3")) is None: return results
     all_matches = []
-    for r in h2h_table.find_all("tr", id=re.compile(r"tr3_\d+")):
-        if (d := get_match_details_from_row_of(r, score_class_selector='fscore_3', source_table_type='h2h')):
+    for fila in filas:
+        if (d := fila.detalles('fscore_3')):
             if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id)):
-                all_matches.append(d)
+                all_matches.append((fila, d))
     if not all_matches: return results
-    all_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    most_recent = all_matches[0]
+    all_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x[1].get('date', '')), reverse=True)
+    most_recent = all_matches[0][1]
     results.update({'ah6': most_recent.get('ahLine', '-'), 'res6': most_recent.get('score', '?:?'), 'res6_raw': most_recent.get('score_raw', '?-?'), 'match6_id': most_recent.get('matchIndex'), 'h2h_gen_home': most_recent.get('home'), 'h2h_gen_away': most_recent.get('away')})
-    for d in all_matches:
-        if d['home'].lower() == home_name.lower() and d['away'].lower() == away_name.lower():
+    clave_local, clave_visitante = pagina.clave(home_name, home_id), pagina.clave(away_name, away_id)
+    for fila, d in all_matches:
+        if fila.clave_local == clave_local and fila.clave_visitante == clave_visitante:
             results.update({'ah1': d.get('ahLine', '-'), 'res1': d.get('score', '?:?'), 'res1_raw': d.get('score_raw', '?-?'), 'match1_id': d.get('matchIndex')})
             break
     return results
 
-def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id, is_home_table):
-    if not opponent or opponent == "N/A" or not main_team or not (table := soup.find("table", id=table_id)): return None
+def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id, is_home_table, main_id=None, opponent_id=None):
+    if not opponent or opponent == "N/A" or not main_team: return None
+    pagina = como_pagina_h2h(soup)
+    if (filas := pagina.filas(table_id)) is None: return None
     score_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')): continue
+    main, opp = pagina.clave(main_team, main_id), pagina.clave(opponent, opponent_id)
+    for fila in filas:
+        h, a = fila.clave_local, fila.clave_visitante
+        if not ((main == h and opp == a) or (main == a and opp == h)): continue
+        if not (details := fila.detalles(score_selector)): continue
         if league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(league_id): continue
-        h, a = details.get('home','').lower(), details.get('away','').lower()
-        main, opp = main_team.lower(), opponent.lower()
-        if (main == h and opp == a) or (main == a and opp == h):
-            return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main == h else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
+        return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main == h else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
     return None
 
 def extract_indirect_comparison_data(soup):
@@ -851,6 +677,7 @@ def extract_indirect_comparison_data(soup):
     Extrae los datos de los dos paneles de Comparativas Indirectas.
     """
     data = {"comp1": None, "comp2": None}
+    soup = como_pagina_h2h(soup).soup
     comparativas_divs = soup.select("div.football-history-list > div.content") # Asumiendo una estructura de selectores; ajustar si es necesario.
 
     if len(comparativas_divs) < 2:
@@ -906,32 +733,254 @@ def extract_indirect_comparison_data(soup):
 
     return data
 
+def _selects_por_defecto_en_bet365(soup, select_ids):
+    """
+    En el navegador se fuerza hSelect_N = "8" (Bet365) antes de leer el HTML. Si la
+    página estática ya trae Bet365 como opción seleccionada (o primera), ese paso no
+    cambia nada y el HTML estático es equivalente al de Selenium.
+    Los selects que no existen en la página se ignoran, igual que en Selenium.
+    """
+    for select_id in select_ids:
+        select = soup.find("select", id=select_id)
+        if select is None:
+            continue
+        opcion = select.find("option", selected=True) or select.find("option")
+        if opcion is None or opcion.get("value") != "8":
+            return False
+    return True
+
+def adjuntar_funciones_auxiliares(datos: dict) -> dict:
+    """
+    Añade a `datos` las funciones auxiliares que usa la plantilla del estudio para el
+    análisis gráfico. No forman parte de los datos: la caché de estudios las quita al
+    serializar y las vuelve a añadir al leer.
+    """
+    from modules.funciones_auxiliares import (
+        _calcular_estadisticas_contra_rival, 
+        _analizar_over_under, 
+        _analizar_ah_cubierto, 
+        _analizar_desempeno_casa_fuera,
+        _contar_victorias_h2h,
+        _analizar_over_under_h2h,
+        _contar_over_h2h,
+        _contar_victorias_h2h_general
+    )
+    
+    datos["_calcular_estadisticas_contra_rival"] = _calcular_estadisticas_contra_rival
+    datos["_analizar_over_under"] = _analizar_over_under
+    datos["_analizar_ah_cubierto"] = _analizar_ah_cubierto
+    datos["_analizar_desempeno_casa_fuera"] = _analizar_desempeno_casa_fuera
+    datos["_contar_victorias_h2h"] = _contar_victorias_h2h
+    datos["_analizar_over_under_h2h"] = _analizar_over_under_h2h
+    datos["_contar_over_h2h"] = _contar_over_h2h
+    datos["_contar_victorias_h2h_general"] = _contar_victorias_h2h_general
+    return datos
+
 # --- FUNCIÓN PRINCIPAL DE EXTRACCIÓN ---
 
-def obtener_datos_completos_partido(match_id: str):
+def _avisar(al_avanzar, etapa: str, datos: dict):
+    if al_avanzar is None:
+        return
+    try:
+        al_avanzar(etapa, datos)
+    except Exception as e:
+        print(f"Aviso de la etapa '{etapa}' fallido: {e}")
+
+def _construir_datos_estudio(match_id: str, soup_completo, obtener_h2h_col3, al_avanzar=None):
     """
-    Función principal que orquesta todo el scraping y análisis para un ID de partido.
-    Devuelve un diccionario con todos los datos necesarios para la plantilla HTML.
+    Extrae y analiza todo el estudio a partir del HTML de /match/h2h-{id} ya parseado.
+    `obtener_h2h_col3(key_id, rival_a_id, rival_b_id, rival_a_name, rival_b_name)` resuelve
+    el H2H de la columna 3, que necesita cargar otra página (con Selenium o con requests).
+
+    Si se pasa `al_avanzar(etapa, datos)`, se llama en cuanto cada parte del estudio está
+    completa en `datos` (en este orden): "cabecera" (equipos, fecha, cuotas), "h2h",
+    "ultimos", "comparativas" y "col3". El resto del análisis llega con el resultado final.
     """
-    if not match_id or not match_id.isdigit():
-        return {"error": "ID de partido inválido."}
+    datos = {"match_id": match_id}
+    # Una sola pasada por la página: todos los extractores trabajan sobre este modelo
+    pagina = construir_pagina_h2h(soup_completo)
+    datos['final_score'] = extract_final_score_of(pagina)
+    # En juego también hay marcador: la vigencia en caché depende de esto, no de él.
+    datos['match_finished'] = pagina.terminado
+
+    # --- Extracción de Datos Primarios ---
+    home_id, away_id, league_id, home_name, away_name, league_name = get_team_league_info_from_script_of(pagina)
+    # Fecha/hora del partido (si está en el script)
+    dt_info = get_match_datetime_from_script_of(pagina)
+    historial_partidos.registrar_pagina(match_id, pagina, dt_info.get("match_datetime"))
+    datos.update({
+        "home_name": home_name,
+        "away_name": away_name,
+        "league_name": league_name,
+        "match_date": dt_info.get("match_date"),
+        "match_time": dt_info.get("match_time"),
+        "match_datetime": dt_info.get("match_datetime"),
+    })
+
+    # --- Recopilación de todos los datos en paralelo (donde sea posible) ---
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Tareas síncronas (dependen de la página ya parseada)
+        future_home_standings = executor.submit(extract_standings_data_from_h2h_page_of, pagina, home_name)
+        future_away_standings = executor.submit(extract_standings_data_from_h2h_page_of, pagina, away_name)
+        future_home_ou = executor.submit(extract_over_under_stats_from_div_of, pagina, 'home')
+        future_away_ou = executor.submit(extract_over_under_stats_from_div_of, pagina, 'away')
+        future_main_odds = executor.submit(extract_bet365_initial_odds_of, pagina)
+        future_h2h_data = executor.submit(extract_h2h_data_of, pagina, home_name, away_name, None, home_id, away_id)
+        future_last_home = executor.submit(extract_last_match_in_league_of, pagina, "table_v1", home_name, league_id, True, home_id)
+        future_last_away = executor.submit(extract_last_match_in_league_of, pagina, "table_v2", away_name, league_id, False, away_id)
+        
+        # Tarea H2H Col3 (requiere cargar la página del partido clave)
+        key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(pagina, league_id)
+        _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(pagina, league_id)
+        future_h2h_col3 = executor.submit(obtener_h2h_col3, key_id_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+        
+        # Obtener resultados
+        datos["home_standings"] = future_home_standings.result()
+        datos["away_standings"] = future_away_standings.result()
+        datos["home_ou_stats"] = future_home_ou.result()
+        datos["away_ou_stats"] = future_away_ou.result()
+        main_match_odds_data = future_main_odds.result()
+        datos["main_match_odds_data"] = main_match_odds_data
+        # --- Estructurar datos para la plantilla ---
+        datos["main_match_odds"] = {
+            "ah_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')),
+            "goals_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?'))
+        }
+        _avisar(al_avanzar, "cabecera", datos)
+        h2h_data = future_h2h_data.result()
+        datos["h2h_data"] = h2h_data
+        last_home_match = future_last_home.result()
+        last_away_match = future_last_away.result()
+
+        # --- Comparativas (dependen de los resultados anteriores) ---
+        comp_L_vs_UV_A = extract_comparative_match_of(pagina, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True, home_id)
+        comp_V_vs_UL_H = extract_comparative_match_of(pagina, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False, away_id)
+
+        # --- Generar Análisis de Mercado ---
+        datos["market_analysis_html"] = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name)
+
+        # Recopilar los IDs de partidos históricos para obtener sus estadísticas de progresión.
+        # El del H2H Col3 depende de otra página y se pide aparte, para no retrasar al resto.
+        match_ids_to_fetch_stats = {
+            'last_home': (last_home_match or {}).get('match_id'),
+            'last_away': (last_away_match or {}).get('match_id'),
+            'comp_L_vs_UV_A': (comp_L_vs_UV_A or {}).get('match_id'),
+            'comp_V_vs_UL_H': (comp_V_vs_UL_H or {}).get('match_id'),
+            'h2h_stadium': h2h_data.get('match1_id'),
+            'h2h_general': h2h_data.get('match6_id')
+        }
+        
+        # Obtener estadísticas de progresión en un solo lote (IDs repetidos y cacheados no se descargan)
+        stats_by_id = get_match_progression_stats_batch(match_ids_to_fetch_stats.values())
+        stats_results = {key: stats_by_id.get(str(match_id)) for key, match_id in match_ids_to_fetch_stats.items() if match_id}
+
+        # Empaquetar todo en el diccionario de datos final
+        datos['h2h_stadium'] = {'details': h2h_data, 'stats': stats_results.get('h2h_stadium')}
+        datos['h2h_general'] = {'details': h2h_data, 'stats': stats_results.get('h2h_general')}
+        _avisar(al_avanzar, "h2h", datos)
+        datos['last_home_match'] = {'details': last_home_match, 'stats': stats_results.get('last_home')}
+        datos['last_away_match'] = {'details': last_away_match, 'stats': stats_results.get('last_away')}
+        _avisar(al_avanzar, "ultimos", datos)
+        datos['comp_L_vs_UV_A'] = {'details': comp_L_vs_UV_A, 'stats': stats_results.get('comp_L_vs_UV_A')}
+        datos['comp_V_vs_UL_H'] = {'details': comp_V_vs_UL_H, 'stats': stats_results.get('comp_V_vs_UL_H')}
+        _avisar(al_avanzar, "comparativas", datos)
+
+        details_h2h_col3 = future_h2h_col3.result()
+        col3_id = (details_h2h_col3 or {}).get('match_id')
+        if col3_id and str(col3_id) in stats_by_id:
+            col3_stats = stats_by_id[str(col3_id)]
+        else:
+            col3_stats = get_match_progression_stats_batch([col3_id]).get(str(col3_id)) if col3_id else None
+        datos['h2h_col3'] = {'details': details_h2h_col3, 'stats': col3_stats}
+        _avisar(al_avanzar, "col3", datos)
 
-    # --- Inicialización de Selenium ---
-    options = ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
-    options.add_argument('--blink-settings=imagesEnabled=false')
-    driver = _create_chrome_driver(options)
+        # --- ANÁLISIS AVANZADO DE COMPARATIVAS INDIRECTAS ---
+        # Extraer los datos de las comparativas indirectas
+        indirect_comparison_data = extract_indirect_comparison_data(pagina)
+        
+        # Generar la nota de análisis
+        datos["advanced_analysis_html"] = generar_analisis_comparativas_indirectas(indirect_comparison_data)
+        
+        # --- ANÁLISIS RECIENTE CON HANDICAP ---
+        # Obtener la línea de handicap actual
+        current_ah_line = parse_ah_to_number_of(main_match_odds_data.get('ah_linea_raw', '0'))
+        
+        # Analizar rendimiento reciente con handicap para equipo local
+        rendimiento_local = analizar_rendimiento_reciente_con_handicap(pagina, home_name, True)
+        datos["rendimiento_local_handicap"] = rendimiento_local
+        
+        # Analizar rendimiento reciente con handicap para equipo visitante
+        rendimiento_visitante = analizar_rendimiento_reciente_con_handicap(pagina, away_name, False)
+        datos["rendimiento_visitante_handicap"] = rendimiento_visitante
+        
+        # Comparar líneas de handicap recientes con la línea actual
+        if current_ah_line is not None:
+            comparacion_local = comparar_lineas_handicap_recientes(pagina, home_name, current_ah_line, True)
+            datos["comparacion_lineas_local"] = comparacion_local
+            
+            comparacion_visitante = comparar_lineas_handicap_recientes(pagina, away_name, current_ah_line, False)
+            datos["comparacion_lineas_visitante"] = comparacion_visitante
+        
+        # --- ANÁLISIS DE RIVALES COMUNES ---
+        rivales_comunes = analizar_rivales_comunes(pagina, home_name, away_name)
+        datos["rivales_comunes"] = rivales_comunes
+        
+        # --- ANÁLISIS CONTRA RIVAL DEL RIVAL ---
+        # Obtener información de los rivales de los rivales
+        rival_local_rival = (last_away_match or {}).get('home_team', 'N/A')
+        rival_visitante_rival = (last_home_match or {}).get('away_team', 'N/A')
+        
+        if rival_local_rival != 'N/A' and rival_visitante_rival != 'N/A':
+            analisis_contra_rival = analizar_contra_rival_del_rival(
+                pagina, home_name, away_name, rival_local_rival, rival_visitante_rival
+            )
+            datos["analisis_contra_rival_del_rival"] = analisis_contra_rival
+        
+        # --- ANÁLISIS DE RENDIMIENTO RECIENTE Y COMPARATIVAS INDIRECTAS ---
+        # Generar resumen gráfico de rendimiento reciente y comparativas indirectas
+        resumen_rendimiento = generar_resumen_rendimiento_reciente(pagina, home_name, away_name, current_ah_line)
+        datos["resumen_rendimiento_reciente"] = resumen_rendimiento
+        
+        # --- FUNCIONES AUXILIARES PARA LA PLANTILLA ---
+        adjuntar_funciones_auxiliares(datos)
     
+    return datos
+
+
+def _obtener_datos_completos_sin_navegador(match_id: str, al_avanzar=None, revalidar=False):
+    """
+    Estudio completo solo con requests. Devuelve None si la página estática no sirve
+    (no se pudo descargar, no tiene las tablas o la casa por defecto no es Bet365) para
+    que se use Selenium. Con `revalidar`, la página no se sirve de la caché sin preguntar.
+    """
+    try:
+        soup_completo = BeautifulSoup(obtener_html(f"{BASE_URL_OF}/match/h2h-{match_id}", timeout=10,
+                                                   revalidar=revalidar), "lxml")
+    except requests.RequestException as e:
+        print(f"Estudio {match_id}: no se pudo descargar la página estática ({type(e).__name__}), se usa Selenium.")
+        return None
+    if soup_completo.find("table", id="table_v1") is None or not _selects_por_defecto_en_bet365(soup_completo, ["hSelect_1", "hSelect_2", "hSelect_3"]):
+        print(f"Estudio {match_id}: la página estática no equivale a la de Selenium, se usa Selenium.")
+        return None
+    return _construir_datos_estudio(match_id, soup_completo, get_h2h_details_for_original_logic_requests_of, al_avanzar)
+
+def _obtener_datos_completos_con_selenium(match_id: str, al_avanzar=None):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+
     main_page_url = f"{BASE_URL_OF}/match/h2h-{match_id}"
-    datos = {"match_id": match_id}
+    driver = None
+    driver_roto = False
 
     try:
+        # --- Driver de Selenium ya arrancado, tomado del pool ---
+        driver = pool_selenium.adquirir_driver()
+
         # --- Carga y Parseo de la Página Principal ---
-        driver.get(main_page_url)
+        with limitador_peticiones.peticion(main_page_url, medir_latencia=False):
+            driver.get(main_page_url)
         WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "table_v1")))
         for select_id in ["hSelect_1", "hSelect_2", "hSelect_3"]:
             try:
@@ -941,178 +990,128 @@ def obtener_datos_completos_partido(match_id: str):
             except TimeoutException:
                 continue
         soup_completo = BeautifulSoup(driver.page_source, "lxml")
-        datos['final_score'] = extract_final_score_of(soup_completo)
-
-        # --- Extracción de Datos Primarios ---
-        home_id, away_id, league_id, home_name, away_name, league_name = get_team_league_info_from_script_of(soup_completo)
-        # Fecha/hora del partido (si está en el script)
-        dt_info = get_match_datetime_from_script_of(soup_completo)
-        datos.update({
-            "home_name": home_name,
-            "away_name": away_name,
-            "league_name": league_name,
-            "match_date": dt_info.get("match_date"),
-            "match_time": dt_info.get("match_time"),
-            "match_datetime": dt_info.get("match_datetime"),
-        })
 
-        # --- Recopilación de todos los datos en paralelo (donde sea posible) ---
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            # Tareas síncronas (dependen del soup_completo)
-            future_home_standings = executor.submit(extract_standings_data_from_h2h_page_of, soup_completo, home_name)
-            future_away_standings = executor.submit(extract_standings_data_from_h2h_page_of, soup_completo, away_name)
-            future_home_ou = executor.submit(extract_over_under_stats_from_div_of, soup_completo, 'home')
-            future_away_ou = executor.submit(extract_over_under_stats_from_div_of, soup_completo, 'away')
-            future_main_odds = executor.submit(extract_bet365_initial_odds_of, soup_completo)
-            future_h2h_data = executor.submit(extract_h2h_data_of, soup_completo, home_name, away_name, None)
-            future_last_home = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v1", home_name, league_id, True)
-            future_last_away = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v2", away_name, league_id, False)
-            
-            # Tarea H2H Col3 (requiere una nueva llamada de Selenium)
-            key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
-            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
-            # Usar el driver principal ya creado en lugar de crear uno nuevo
-            future_h2h_col3 = executor.submit(get_h2h_details_for_original_logic_of, driver, key_id_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
-            
-            # Obtener resultados
-            datos["home_standings"] = future_home_standings.result()
-            datos["away_standings"] = future_away_standings.result()
-            datos["home_ou_stats"] = future_home_ou.result()
-            datos["away_ou_stats"] = future_away_ou.result()
-            main_match_odds_data = future_main_odds.result()
-            h2h_data = future_h2h_data.result()
-            datos["main_match_odds_data"] = main_match_odds_data
-            datos["h2h_data"] = h2h_data
-            last_home_match = future_last_home.result()
-            last_away_match = future_last_away.result()
-            details_h2h_col3 = future_h2h_col3.result()
-
-            # --- Comparativas (dependen de los resultados anteriores) ---
-            comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True)
-            comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False)
-
-            # --- Generar Análisis de Mercado ---
-            datos["market_analysis_html"] = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name)
-
-            # --- Estructurar datos para la plantilla ---
-            datos["main_match_odds"] = {
-                "ah_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')),
-                "goals_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?'))
-            }
-            
-            # Recopilar todos los IDs de partidos históricos para obtener sus estadísticas de progresión
-            match_ids_to_fetch_stats = {
-                'last_home': (last_home_match or {}).get('match_id'),
-                'last_away': (last_away_match or {}).get('match_id'),
-                'h2h_col3': (details_h2h_col3 or {}).get('match_id'),
-                'comp_L_vs_UV_A': (comp_L_vs_UV_A or {}).get('match_id'),
-                'comp_V_vs_UL_H': (comp_V_vs_UL_H or {}).get('match_id'),
-                'h2h_stadium': h2h_data.get('match1_id'),
-                'h2h_general': h2h_data.get('match6_id')
-            }
-            
-            # Obtener estadísticas de progresión en paralelo
-            stats_futures = {key: executor.submit(get_match_progression_stats_data, match_id)
-                             for key, match_id in match_ids_to_fetch_stats.items() if match_id}
-                             
-            stats_results = {key: future.result() for key, future in stats_futures.items()}
-
-            # Empaquetar todo en el diccionario de datos final
-            datos['last_home_match'] = {'details': last_home_match, 'stats': stats_results.get('last_home')}
-            datos['last_away_match'] = {'details': last_away_match, 'stats': stats_results.get('last_away')}
-            datos['h2h_col3'] = {'details': details_h2h_col3, 'stats': stats_results.get('h2h_col3')}
-            datos['comp_L_vs_UV_A'] = {'details': comp_L_vs_UV_A, 'stats': stats_results.get('comp_L_vs_UV_A')}
-            datos['comp_V_vs_UL_H'] = {'details': comp_V_vs_UL_H, 'stats': stats_results.get('comp_V_vs_UL_H')}
-            datos['h2h_stadium'] = {'details': h2h_data, 'stats': stats_results.get('h2h_stadium')}
-            datos['h2h_general'] = {'details': h2h_data, 'stats': stats_results.get('h2h_general')}
-
-            # --- ANÁLISIS AVANZADO DE COMPARATIVAS INDIRECTAS ---
-            # Extraer los datos de las comparativas indirectas
-            indirect_comparison_data = extract_indirect_comparison_data(soup_completo)
-            
-            # Generar la nota de análisis
-            datos["advanced_analysis_html"] = generar_analisis_comparativas_indirectas(indirect_comparison_data)
-            
-            # --- ANÁLISIS RECIENTE CON HANDICAP ---
-            # Obtener la línea de handicap actual
-            current_ah_line = parse_ah_to_number_of(main_match_odds_data.get('ah_linea_raw', '0'))
-            
-            # Analizar rendimiento reciente con handicap para equipo local
-            rendimiento_local = analizar_rendimiento_reciente_con_handicap(soup_completo, home_name, True)
-            datos["rendimiento_local_handicap"] = rendimiento_local
-            
-            # Analizar rendimiento reciente con handicap para equipo visitante
-            rendimiento_visitante = analizar_rendimiento_reciente_con_handicap(soup_completo, away_name, False)
-            datos["rendimiento_visitante_handicap"] = rendimiento_visitante
-            
-            # Comparar líneas de handicap recientes con la línea actual
-            if current_ah_line is not None:
-                comparacion_local = comparar_lineas_handicap_recientes(soup_completo, home_name, current_ah_line, True)
-                datos["comparacion_lineas_local"] = comparacion_local
-                
-                comparacion_visitante = comparar_lineas_handicap_recientes(soup_completo, away_name, current_ah_line, False)
-                datos["comparacion_lineas_visitante"] = comparacion_visitante
-            
-            # --- ANÁLISIS DE RIVALES COMUNES ---
-            rivales_comunes = analizar_rivales_comunes(soup_completo, home_name, away_name)
-            datos["rivales_comunes"] = rivales_comunes
-            
-            # --- ANÁLISIS CONTRA RIVAL DEL RIVAL ---
-            # Obtener información de los rivales de los rivales
-            rival_local_rival = (last_away_match or {}).get('home_team', 'N/A')
-            rival_visitante_rival = (last_home_match or {}).get('away_team', 'N/A')
-            
-            if rival_local_rival != 'N/A' and rival_visitante_rival != 'N/A':
-                analisis_contra_rival = analizar_contra_rival_del_rival(
-                    soup_completo, home_name, away_name, rival_local_rival, rival_visitante_rival
-                )
-                datos["analisis_contra_rival_del_rival"] = analisis_contra_rival
-            
-            # --- ANÁLISIS DE RENDIMIENTO RECIENTE Y COMPARATIVAS INDIRECTAS ---
-            # Generar resumen gráfico de rendimiento reciente y comparativas indirectas
-            resumen_rendimiento = generar_resumen_rendimiento_reciente(soup_completo, home_name, away_name, current_ah_line)
-            datos["resumen_rendimiento_reciente"] = resumen_rendimiento
-            
-            # --- FUNCIONES AUXILIARES PARA LA PLANTILLA ---
-            # Añadir funciones auxiliares para el análisis gráfico
-            from modules.funciones_auxiliares import (
-                _calcular_estadisticas_contra_rival, 
-                _analizar_over_under, 
-                _analizar_ah_cubierto, 
-                _analizar_desempeno_casa_fuera,
-                _contar_victorias_h2h,
-                _analizar_over_under_h2h,
-                _contar_over_h2h,
-                _contar_victorias_h2h_general
-            )
-            
-            datos["_calcular_estadisticas_contra_rival"] = _calcular_estadisticas_contra_rival
-            datos["_analizar_over_under"] = _analizar_over_under
-            datos["_analizar_ah_cubierto"] = _analizar_ah_cubierto
-            datos["_analizar_desempeno_casa_fuera"] = _analizar_desempeno_casa_fuera
-            datos["_contar_victorias_h2h"] = _contar_victorias_h2h
-            datos["_analizar_over_under_h2h"] = _analizar_over_under_h2h
-            datos["_contar_over_h2h"] = _contar_over_h2h
-            datos["_contar_victorias_h2h_general"] = _contar_victorias_h2h_general
-        
-        return datos
+        # El H2H Col3 reutiliza el mismo driver en lugar de pedir otro al pool
+        def obtener_h2h_col3(*args):
+            return get_h2h_details_for_original_logic_of(driver, *args)
+
+        return _construir_datos_estudio(match_id, soup_completo, obtener_h2h_col3, al_avanzar)
 
     except Exception as e:
         print(f"ERROR CRÍTICO en el scraper: {e}")
+        driver_roto = isinstance(e, WebDriverException)
         return {"error": f"Error durante el scraping: {e}"}
     finally:
-        # Asegurar que el driver se cierra correctamente incluso si ocurre un error
-        if 'driver' in locals():
-            try:
-                driver.quit()
-            except:
-                pass
+        # El driver vuelve al pool (o se recicla si ha fallado) incluso si ocurre un error
+        if driver is not None:
+            pool_selenium.liberar_driver(driver, descartar=driver_roto)
+
+def obtener_datos_completos_partido(match_id: str, modo: str | None = None, al_avanzar=None, revalidar=False):
+    """
+    Función principal que orquesta todo el scraping y análisis para un ID de partido.
+    Devuelve un diccionario con todos los datos necesarios para la plantilla HTML.
+
+    `modo` ("requests" o "selenium", por defecto ESTUDIO_MODO) elige cómo se carga la
+    página. En modo "requests" se usa el HTML estático y Selenium solo como respaldo.
+    `al_avanzar(etapa, datos)` recibe los avances parciales (ver _construir_datos_estudio);
+    si se pasa a Selenium tras un fallo, las etapas pueden repetirse.
+    `revalidar=True` (al recalcular un estudio caducado) obliga a revalidar la página
+    h2h aunque siga fresca en la caché de páginas; Selenium siempre la carga de nuevo.
+    """
+    if not match_id or not match_id.isdigit():
+        return {"error": "ID de partido inválido."}
+
+    modo = modo or ESTUDIO_MODO
+    if modo == "requests":
+        try:
+            datos = _obtener_datos_completos_sin_navegador(match_id, al_avanzar, revalidar)
+        except Exception as e:
+            print(f"Estudio {match_id}: error en modo sin navegador ({e}), se usa Selenium.")
+            datos = None
+        if datos is not None:
+            return datos
+    return _obtener_datos_completos_con_selenium(match_id, al_avanzar)
 
 
 # EN modules/estudio_scraper.py
 
 # ... (al final del archivo, después de obtener_datos_completos_partido)
 
+def _filas_stats(stats) -> list:
+    """Filas {"label", "home", "away"} de las estadísticas de progresión (vacía si no hay)."""
+    return stats.filas_api() if stats is not None else []
+
+def _marcador_fila(fila) -> tuple | None:
+    # La celda trae el descanso detrás: "2-1(1-0)".
+    m = re.match(r'\s*(\d+)\s*-\s*(\d+)', fila.marcador_texto)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+def _h2h_directo_ligero(pagina, home_name, home_id=None, limite=8):
+    """Victorias y empates de los últimos `limite` H2H directos (el local se reconoce por su id)."""
+    h2h_stats = {"home_wins": 0, "away_wins": 0, "draws": 0}
+    clave_local = pagina.clave(home_name, home_id)
+    for fila in (pagina.filas("table_v3") or [])[:limite]:
+        if fila.n_celdas < 5 or not (marcador := _marcador_fila(fila)):
+            continue
+        goles_h, goles_a = marcador
+        es_local_en_h2h = fila.clave_local == clave_local
+        if goles_h == goles_a:
+            h2h_stats["draws"] += 1
+        elif (es_local_en_h2h and goles_h > goles_a) or (not es_local_en_h2h and goles_a > goles_h):
+            h2h_stats["home_wins"] += 1
+        else:
+            h2h_stats["away_wins"] += 1
+    return h2h_stats
+
+def _h2h_indirecto_ligero(pagina, home_name, away_name, home_id=None, away_id=None, max_rivales=3):
+    """
+    H2H indirecto de las vistas previas: margen de cada equipo contra hasta `max_rivales`
+    rivales comunes (rivales del local en table_v1 y del visitante en table_v2, por id).
+    """
+    indirect = {"home_better": 0, "away_better": 0, "draws": 0, "samples": []}
+    filas_local, filas_visitante = pagina.filas("table_v1"), pagina.filas("table_v2")
+    if filas_local is None or filas_visitante is None:
+        return indirect
+    clave_local, clave_visitante = pagina.clave(home_name, home_id), pagina.clave(away_name, away_id)
+
+    def _rivales(filas, rival_en_casa):
+        rivales = {}
+        for fila in filas:
+            if fila.n_celdas < 5:
+                continue
+            nombre = fila.local_texto if rival_en_casa else fila.visitante_texto
+            clave = fila.clave_local if rival_en_casa else fila.clave_visitante
+            if nombre and nombre != '?' and clave not in (clave_local, clave_visitante):
+                rivales.setdefault(clave, nombre.lower())
+        return rivales
+
+    def _margen(filas, clave_rival, clave_equipo):
+        for fila in filas:
+            if fila.n_celdas < 5 or not fila.es_de(clave_rival) or not (marcador := _marcador_fila(fila)):
+                continue
+            gh, ga = marcador
+            return ga - gh if fila.clave_visitante == clave_equipo else gh - ga
+        return None
+
+    rivales_visitante = _rivales(filas_visitante, True)
+    comunes = [(clave, nombre) for clave, nombre in _rivales(filas_local, False).items() if clave in rivales_visitante]
+    for clave_rival, rival in comunes[:max_rivales]:
+        home_margin = _margen(filas_local, clave_rival, clave_local)
+        away_margin = _margen(filas_visitante, clave_rival, clave_visitante)
+        if home_margin is None or away_margin is None:
+            continue
+        if home_margin > away_margin:
+            indirect["home_better"] += 1
+            verdict = "home"
+        elif home_margin < away_margin:
+            indirect["away_better"] += 1
+            verdict = "away"
+        else:
+            indirect["draws"] += 1
+            verdict = "draw"
+        indirect["samples"].append({"rival": rival, "home_margin": home_margin, "away_margin": away_margin, "verdict": verdict})
+    return indirect
+
 def obtener_datos_preview_rapido(match_id: str):
     """
     Scraper ultraligero y optimizado para obtener solo los datos de la vista previa.
@@ -1120,19 +1119,19 @@ def obtener_datos_preview_rapido(match_id: str):
     """
     if not match_id or not match_id.isdigit():
         return {"error": "ID de partido inválido."}
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, WebDriverException
 
     url = f"{BASE_URL_OF}/match/h2h-{match_id}"
+    driver = None
+    driver_roto = False
     try:
-        # 1. Cargar con Selenium para replicar el método de extracción principal
-        options = ChromeOptions()
-        options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-gpu")
-        options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
-        options.add_argument('--blink-settings=imagesEnabled=false')
-        driver = _create_chrome_driver(options)
-        driver.get(url)
+        # 1. Cargar con Selenium (driver del pool) para replicar el método de extracción principal
+        driver = pool_selenium.adquirir_driver()
+        with limitador_peticiones.peticion(url, medir_latencia=False):
+            driver.get(url)
         WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "table_v1")))
         # Ajustar selects a 8, igual que en el flujo completo
         for select_id in ["hSelect_1", "hSelect_2", "hSelect_3"]:
@@ -1142,13 +1141,15 @@ def obtener_datos_preview_rapido(match_id: str):
             except TimeoutException:
                 continue
         soup = BeautifulSoup(driver.page_source, 'lxml')
+        pagina = construir_pagina_h2h(soup)
 
         # 2. Extraer identificadores y nombres (igual que en el scraper completo)
-        _, _, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
-        dt_info = get_match_datetime_from_script_of(soup)
+        home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(pagina)
+        dt_info = get_match_datetime_from_script_of(pagina)
+        historial_partidos.registrar_pagina(match_id, pagina, dt_info.get("match_datetime"))
 
         # 2b. Extraer línea AH actual (Bet365 inicial)
-        main_odds = extract_bet365_initial_odds_of(soup)
+        main_odds = extract_bet365_initial_odds_of(pagina)
         ah_line_raw = main_odds.get('ah_linea_raw', '-')
         ah_line_num = parse_ah_to_number_of(ah_line_raw)
         favorito_actual = None
@@ -1180,28 +1181,8 @@ def obtener_datos_preview_rapido(match_id: str):
         h2h_stats = {"home_wins": 0, "away_wins": 0, "draws": 0}
         last_h2h_cover = "DESCONOCIDO"
         try:
-            h2h_data = extract_h2h_data_of(soup, home_name, away_name, None)
-            # Contar wins/draws a partir de tabla (como antes)
-            h2h_table = soup.find("table", id="table_v3")
-            if h2h_table:
-                partidos_h2h = h2h_table.find_all("tr", id=re.compile(r"tr3_\d+"), limit=8)
-                for r in partidos_h2h:
-                    tds = r.find_all("td")
-                    if len(tds) < 5:
-                        continue
-                    home_h2h = tds[2].get_text(strip=True)
-                    resultado_raw = tds[3].get_text(strip=True)
-                    try:
-                        goles_h, goles_a = map(int, resultado_raw.split("-"))
-                        es_local_en_h2h = home_name.lower() in home_h2h.lower()
-                        if goles_h == goles_a:
-                            h2h_stats["draws"] += 1
-                        elif (es_local_en_h2h and goles_h > goles_a) or (not es_local_en_h2h and goles_a > goles_h):
-                            h2h_stats["home_wins"] += 1
-                        else:
-                            h2h_stats["away_wins"] += 1
-                    except (ValueError, IndexError):
-                        continue
+            h2h_data = extract_h2h_data_of(pagina, home_name, away_name, None, home_id, away_id)
+            h2h_stats = _h2h_directo_ligero(pagina, home_name, home_id)
             # Evaluar cobertura del favorito con el último H2H disponible
             res_raw = None
             h_home = None
@@ -1224,18 +1205,10 @@ def obtener_datos_preview_rapido(match_id: str):
         recent_indirect = {"last_home": None, "last_away": None, "h2h_col3": None}
         try:
             # Último del local en liga
-            last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True)
-            last_home_stats = get_match_progression_stats_data(str(last_home.get('match_id'))) if last_home and last_home.get('match_id') else None
-            def _df_to_rows(df):
-                rows = []
-                try:
-                    if df is not None and not df.empty:
-                        for idx, row in df.iterrows():
-                            label = idx.replace('Shots on Goal', 'Tiros a Puerta').replace('Shots', 'Tiros').replace('Dangerous Attacks', 'Ataques Peligrosos').replace('Attacks', 'Ataques')
-                            rows.append({"label": label, "home": row.get('Casa', ''), "away": row.get('Fuera', '')})
-                except Exception:
-                    pass
-                return rows
+            last_home = extract_last_match_in_league_of(pagina, "table_v1", home_name, league_id, True, home_id)
+            last_away = extract_last_match_in_league_of(pagina, "table_v2", away_name, league_id, False, away_id)
+            recent_stats = get_match_progression_stats_batch([(m or {}).get('match_id') for m in (last_home, last_away)])
+            last_home_stats = recent_stats.get(str(last_home.get('match_id'))) if last_home and last_home.get('match_id') else None
             if last_home:
                 recent_indirect["last_home"] = {
                     "home": last_home.get('home_team'),
@@ -1243,12 +1216,11 @@ def obtener_datos_preview_rapido(match_id: str):
                     "score": last_home.get('score'),
                     "ah": format_ah_as_decimal_string_of(last_home.get('handicap_line_raw', '-') or '-'),
                     "ou": "-",
-                    "stats_rows": _df_to_rows(last_home_stats),
+                    "stats_rows": _filas_stats(last_home_stats),
                     "date": last_home.get('date')
                 }
             # Último del visitante en liga
-            last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False)
-            last_away_stats = get_match_progression_stats_data(str(last_away.get('match_id'))) if last_away and last_away.get('match_id') else None
+            last_away_stats = recent_stats.get(str(last_away.get('match_id'))) if last_away and last_away.get('match_id') else None
             if last_away:
                 recent_indirect["last_away"] = {
                     "home": last_away.get('home_team'),
@@ -1256,12 +1228,12 @@ def obtener_datos_preview_rapido(match_id: str):
                     "score": last_away.get('score'),
                     "ah": format_ah_as_decimal_string_of(last_away.get('handicap_line_raw', '-') or '-'),
                     "ou": "-",
-                    "stats_rows": _df_to_rows(last_away_stats),
+                    "stats_rows": _filas_stats(last_away_stats),
                     "date": last_away.get('date')
                 }
             # H2H Rivales (Col3)
-            key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup, league_id)
-            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup, league_id)
+            key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(pagina, league_id)
+            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(pagina, league_id)
             if key_id_a and rival_a_id and rival_b_id:
                 col3 = get_h2h_details_for_original_logic_of(driver, key_id_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
                 if col3 and col3.get('status') == 'found':
@@ -1271,89 +1243,17 @@ def obtener_datos_preview_rapido(match_id: str):
                         "score_line": score_line,
                         "ah": format_ah_as_decimal_string_of(col3.get('handicap', '-') or '-'),
                         "ou": "-",
-                        "stats_rows": _df_to_rows(col3_stats),
+                        "stats_rows": _filas_stats(col3_stats),
                         "date": col3.get('date')
                     }
         except Exception:
             pass
 
         # 5. Calcular H2H Indirecto (rivales comunes) de forma ligera
-        indirect = {"home_better": 0, "away_better": 0, "draws": 0, "samples": []}
-        try:
-            table_v1 = soup.find("table", id="table_v1")
-            table_v2 = soup.find("table", id="table_v2")
-
-            def _parse_score_to_tuple(score_text):
-                try:
-                    gh, ga = map(int, score_text.strip().split("-"))
-                    return gh, ga
-                except Exception:
-                    return None
-
-            def _find_match_info(table, rival_name_lower, team_name_ref):
-                if not table:
-                    return None
-                rows = table.find_all("tr", id=re.compile(r"tr[12]_\\d+"))
-                for r in rows:
-                    tds = r.find_all("td")
-                    if len(tds) < 5:
-                        continue
-                    home_t = tds[2].get_text(strip=True)
-                    away_t = tds[4].get_text(strip=True)
-                    if away_t.lower() == rival_name_lower or home_t.lower() == rival_name_lower:
-                        score_text = tds[3].get_text(strip=True)
-                        score = _parse_score_to_tuple(score_text)
-                        if not score:
-                            continue
-                        gh, ga = score
-                        if home_t.lower() == team_name_ref.lower():
-                            margin = gh - ga
-                        elif away_t.lower() == team_name_ref.lower():
-                            margin = ga - gh
-                        else:
-                            margin = gh - ga
-                        return {"rival": rival_name_lower, "margin": margin}
-                return None
-
-            if table_v1 and table_v2:
-                rivals_home = set()
-                for r in table_v1.find_all("tr", id=re.compile(r"tr1_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_home.add(tds[4].get_text(strip=True).lower())
-                rivals_away = set()
-                for r in table_v2.find_all("tr", id=re.compile(r"tr2_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_away.add(tds[2].get_text(strip=True).lower())
-                common = [rv for rv in rivals_home.intersection(rivals_away) if rv and rv != '?']
-                common = common[:3]
-                for rv in common:
-                    home_info = _find_match_info(table_v1, rv, home_name)
-                    away_info = _find_match_info(table_v2, rv, away_name)
-                    if not home_info or not away_info:
-                        continue
-                    if home_info["margin"] > away_info["margin"]:
-                        indirect["home_better"] += 1
-                        verdict = "home"
-                    elif home_info["margin"] < away_info["margin"]:
-                        indirect["away_better"] += 1
-                        verdict = "away"
-                    else:
-                        indirect["draws"] += 1
-                        verdict = "draw"
-                    indirect["samples"].append({
-                        "rival": rv,
-                        "home_margin": home_info["margin"],
-                        "away_margin": away_info["margin"],
-                        "verdict": verdict
-                    })
-        except Exception:
-            # Ignorar errores de comparativas indirectas en la vista previa
-            pass
+        indirect = _h2h_indirecto_ligero(pagina, home_name, away_name, home_id, away_id)
 
         # 5b. Evaluar "muy superior" en ataques peligrosos desde comparativas indirectas (con la misma función)
-        indirect_panels = extract_indirect_comparison_data(soup)
+        indirect_panels = extract_indirect_comparison_data(pagina)
         ataques_peligrosos = {}
         favorite_da = None
         try:
@@ -1419,13 +1319,11 @@ def obtener_datos_preview_rapido(match_id: str):
         return {"error": "La fuente de datos (Nowgoal) tardó demasiado en responder."}
     except Exception as e:
         print(f"ERROR en scraper preview para {match_id}: {e}")
+        driver_roto = isinstance(e, WebDriverException)
         return {"error": f"No se pudieron obtener los datos de la vista previa: {type(e).__name__}"}
     finally:
-        try:
-            if 'driver' in locals():
-                driver.quit()
-        except Exception:
-            pass
+        if driver is not None:
+            pool_selenium.liberar_driver(driver, descartar=driver_roto)
 
 
 
@@ -1439,18 +1337,16 @@ def obtener_datos_preview_ligero(match_id: str):
 
     url = f"{BASE_URL_OF}/match/h2h-{match_id}"
     try:
-        session = requests.Session()
-        session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-        response = session.get(url, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+        soup = BeautifulSoup(obtener_html(url, timeout=5), 'lxml')
+        pagina = construir_pagina_h2h(soup)
 
         # Equipos
-        _, _, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup)
-        dt_info = get_match_datetime_from_script_of(soup)
+        home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(pagina)
+        dt_info = get_match_datetime_from_script_of(pagina)
+        historial_partidos.registrar_pagina(match_id, pagina, dt_info.get("match_datetime"))
 
         # Línea AH (Bet365 inicial)
-        main_odds = extract_bet365_initial_odds_of(soup)
+        main_odds = extract_bet365_initial_odds_of(pagina)
         ah_line_raw = main_odds.get('ah_linea_raw', '-')
         ah_line_num = parse_ah_to_number_of(ah_line_raw)
         favorito_actual = None
@@ -1483,27 +1379,8 @@ def obtener_datos_preview_ligero(match_id: str):
         h2h_stats = {"home_wins": 0, "away_wins": 0, "draws": 0}
         last_h2h_cover = "DESCONOCIDO"
         try:
-            h2h_data = extract_h2h_data_of(soup, home_name, away_name, None)
-            h2h_table = soup.find("table", id="table_v3")
-            if h2h_table:
-                partidos_h2h = h2h_table.find_all("tr", id=re.compile(r"tr3_\\d+"), limit=8)
-                for r in partidos_h2h:
-                    tds = r.find_all("td")
-                    if len(tds) < 5:
-                        continue
-                    home_h2h = tds[2].get_text(strip=True)
-                    resultado_raw = tds[3].get_text(strip=True)
-                    try:
-                        goles_h, goles_a = map(int, resultado_raw.split("-"))
-                        es_local_en_h2h = home_name.lower() in home_h2h.lower()
-                        if goles_h == goles_a:
-                            h2h_stats["draws"] += 1
-                        elif (es_local_en_h2h and goles_h > goles_a) or (not es_local_en_h2h and goles_a > goles_h):
-                            h2h_stats["home_wins"] += 1
-                        else:
-                            h2h_stats["away_wins"] += 1
-                    except (ValueError, IndexError):
-                        continue
+            h2h_data = extract_h2h_data_of(pagina, home_name, away_name, None, home_id, away_id)
+            h2h_stats = _h2h_directo_ligero(pagina, home_name, home_id)
             # Cobertura del favorito en el último H2H disponible
             res_raw = None
             h_home = None
@@ -1526,50 +1403,37 @@ def obtener_datos_preview_ligero(match_id: str):
         recent_indirect = {"last_home": None, "last_away": None, "h2h_col3": None}
         try:
             # Últimos partidos
-            last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True)
-            last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False)
-            def _df_to_rows(df):
-                rows = []
-                try:
-                    if df is not None and not df.empty:
-                        for idx, row in df.iterrows():
-                            label = idx.replace('Shots on Goal', 'Tiros a Puerta').replace('Shots', 'Tiros').replace('Dangerous Attacks', 'Ataques Peligrosos').replace('Attacks', 'Ataques')
-                            rows.append({"label": label, "home": row.get('Casa', ''), "away": row.get('Fuera', '')})
-                except Exception:
-                    pass
-                return rows
+            last_home = extract_last_match_in_league_of(pagina, "table_v1", home_name, league_id, True, home_id)
+            last_away = extract_last_match_in_league_of(pagina, "table_v2", away_name, league_id, False, away_id)
+            recent_stats = get_match_progression_stats_batch([(m or {}).get('match_id') for m in (last_home, last_away)])
             if last_home:
-                lh_stats = get_match_progression_stats_data(str(last_home.get('match_id')))
+                lh_stats = recent_stats.get(str(last_home.get('match_id')))
                 recent_indirect["last_home"] = {
                     "home": last_home.get('home_team'),
                     "away": last_home.get('away_team'),
                     "score": last_home.get('score'),
                     "ah": format_ah_as_decimal_string_of(last_home.get('handicap_line_raw', '-') or '-'),
                     "ou": "-",
-                    "stats_rows": _df_to_rows(lh_stats),
+                    "stats_rows": _filas_stats(lh_stats),
                     "date": last_home.get('date')
                 }
             if last_away:
-                la_stats = get_match_progression_stats_data(str(last_away.get('match_id')))
+                la_stats = recent_stats.get(str(last_away.get('match_id')))
                 recent_indirect["last_away"] = {
                     "home": last_away.get('home_team'),
                     "away": last_away.get('away_team'),
                     "score": last_away.get('score'),
                     "ah": format_ah_as_decimal_string_of(last_away.get('handicap_line_raw', '-') or '-'),
                     "ou": "-",
-                    "stats_rows": _df_to_rows(la_stats),
+                    "stats_rows": _filas_stats(la_stats),
                     "date": last_away.get('date')
                 }
             # H2H Rivales (Col3) sin Selenium: cargar la página del key_id_a
-            key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup, league_id)
-            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup, league_id)
+            key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(pagina, league_id)
+            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(pagina, league_id)
             if key_id_a and rival_a_id and rival_b_id:
                 key_url = f"{BASE_URL_OF}/match/h2h-{key_id_a}"
-                session2 = requests.Session()
-                session2.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-                key_resp = session2.get(key_url, timeout=6)
-                key_resp.raise_for_status()
-                soup_key = BeautifulSoup(key_resp.text, 'lxml')
+                soup_key = BeautifulSoup(obtener_html(key_url, timeout=6), 'lxml')
                 table = soup_key.find("table", id="table_v2")
                 if table:
                     for row in table.find_all("tr", id=re.compile(r"tr2_\\d+")):
@@ -1608,7 +1472,7 @@ def obtener_datos_preview_ligero(match_id: str):
                                 "score_line": score_line,
                                 "ah": format_ah_as_decimal_string_of(ah_raw or '-'),
                                 "ou": "-",
-                                "stats_rows": _df_to_rows(col3_stats),
+                                "stats_rows": _filas_stats(col3_stats),
                                 "date": date_txt
                             }
                             break
@@ -1616,78 +1480,10 @@ def obtener_datos_preview_ligero(match_id: str):
             pass
 
         # H2H indirecto ligero (rivales comunes)
-        indirect = {"home_better": 0, "away_better": 0, "draws": 0, "samples": []}
-        try:
-            table_v1 = soup.find("table", id="table_v1")
-            table_v2 = soup.find("table", id="table_v2")
-            def _parse_score_to_tuple(score_text):
-                try:
-                    gh, ga = map(int, score_text.strip().split("-"))
-                    return gh, ga
-                except Exception:
-                    return None
-            def _find_match_info(table, rival_name_lower, team_name_ref):
-                if not table:
-                    return None
-                rows = table.find_all("tr", id=re.compile(r"tr[12]_\\d+"))
-                for r in rows:
-                    tds = r.find_all("td")
-                    if len(tds) < 5:
-                        continue
-                    home_t = tds[2].get_text(strip=True)
-                    away_t = tds[4].get_text(strip=True)
-                    if away_t.lower() == rival_name_lower or home_t.lower() == rival_name_lower:
-                        score_text = tds[3].get_text(strip=True)
-                        score = _parse_score_to_tuple(score_text)
-                        if not score:
-                            continue
-                        gh, ga = score
-                        if home_t.lower() == team_name_ref.lower():
-                            margin = gh - ga
-                        elif away_t.lower() == team_name_ref.lower():
-                            margin = ga - gh
-                        else:
-                            margin = gh - ga
-                        return {"rival": rival_name_lower, "margin": margin}
-                return None
-            if table_v1 and table_v2:
-                rivals_home = set()
-                for r in table_v1.find_all("tr", id=re.compile(r"tr1_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_home.add(tds[4].get_text(strip=True).lower())
-                rivals_away = set()
-                for r in table_v2.find_all("tr", id=re.compile(r"tr2_\\d+")):
-                    tds = r.find_all("td")
-                    if len(tds) >= 5:
-                        rivals_away.add(tds[2].get_text(strip=True).lower())
-                common = [rv for rv in rivals_home.intersection(rivals_away) if rv and rv != '?']
-                common = common[:3]
-                for rv in common:
-                    home_info = _find_match_info(table_v1, rv, home_name)
-                    away_info = _find_match_info(table_v2, rv, away_name)
-                    if not home_info or not away_info:
-                        continue
-                    if home_info["margin"] > away_info["margin"]:
-                        indirect["home_better"] += 1
-                        verdict = "home"
-                    elif home_info["margin"] < away_info["margin"]:
-                        indirect["away_better"] += 1
-                        verdict = "away"
-                    else:
-                        indirect["draws"] += 1
-                        verdict = "draw"
-                    indirect["samples"].append({
-                        "rival": rv,
-                        "home_margin": home_info["margin"],
-                        "away_margin": away_info["margin"],
-                        "verdict": verdict
-                    })
-        except Exception:
-            pass
+        indirect = _h2h_indirecto_ligero(pagina, home_name, away_name, home_id, away_id)
 
         # Ataques peligrosos (comparativas indirectas)
-        indirect_panels = extract_indirect_comparison_data(soup)
+        indirect_panels = extract_indirect_comparison_data(pagina)
         ataques_peligrosos = {}
         favorite_da = None
         try:
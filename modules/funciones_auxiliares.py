@@ -1,4 +1,7 @@
 # modules/funciones_auxiliares.py
+import numpy as np
+
+from modules.liquidacion import PUSH, liquidar_ah, liquidar_goles, marcadores
 from modules.utils import parse_ah_to_number_of
 
 def _calcular_estadisticas_contra_rival(matches, equipo):
@@ -15,40 +18,42 @@ def _calcular_estadisticas_contra_rival(matches, equipo):
     if not matches:
         return {'victorias': 0, 'total': 0, 'over': 0, 'ah_cubierto': 0}
     
-    victorias = 0
-    over = 0
-    ah_cubierto = 0
+    # Todos los partidos se liquidan en una llamada (modules.liquidacion).
+    goles_local, goles_visitante, validos = marcadores([match['score_raw'] for match in matches])
+    equipo_min = equipo.lower()
+    es_local = np.array([match['home_team'].lower() == equipo_min for match in matches])
+    es_visitante = np.array([match['away_team'].lower() == equipo_min for match in matches])
     
-    for match in matches:
-        # Calcular victorias
-        if '-' in match['score_raw']:
-            try:
-                goles_local, goles_visitante = map(int, match['score_raw'].split('-'))
-                
-                if match['home_team'].lower() == equipo.lower() and goles_local > goles_visitante:
-                    victorias += 1
-                elif match['away_team'].lower() == equipo.lower() and goles_visitante > goles_local:
-                    victorias += 1
-            except (ValueError, TypeError):
-                pass
-        
-        # Calcular over/under
-        over_under = _analizar_over_under(match['score_raw'])
-        if over_under == 'Over':
-            over += 1
-            
-        # Calcular handicap cubierto
-        ah_result = _analizar_ah_cubierto(match['score_raw'], match['ah_line_raw'], equipo, match['home_team'], match['away_team'])
-        if ah_result == 'Cubierto':
-            ah_cubierto += 1
+    # Victorias
+    victorias = validos & ((es_local & (goles_local > goles_visitante)) | (es_visitante & (goles_visitante > goles_local)))
+    
+    # Over 2.5
+    over = validos & (liquidar_goles(goles_local, goles_visitante, 2.5) > PUSH)
+    
+    # Handicap cubierto por `equipo` como favorito (media ganada incluida)
+    lineas = np.array([_linea_o_nan(match['ah_line_raw']) for match in matches], dtype=np.float64)
+    con_linea = validos & ~np.isnan(lineas) & (es_local | es_visitante)
+    cubierto = con_linea & (liquidar_ah(goles_local, goles_visitante, np.abs(np.nan_to_num(lineas)), es_local) > PUSH)
     
     return {
-        'victorias': victorias,
+        'victorias': int(victorias.sum()),
         'total': len(matches),
-        'over': over,
-        'ah_cubierto': ah_cubierto
+        'over': int(over.sum()),
+        'ah_cubierto': int(cubierto.sum())
     }
 
+def _linea_o_nan(handicap_raw):
+    valor = parse_ah_to_number_of(handicap_raw) if handicap_raw else None
+    return np.nan if valor is None else valor
+
+def _texto_over_under(resultado, etiquetas):
+    """Over / Under / Push de la línea de 2.5 goles con los textos de `etiquetas`."""
+    goles_local, goles_visitante, validos = marcadores([resultado])
+    if not validos[0]:
+        return "N/A"
+    codigo = int(liquidar_goles(goles_local[0], goles_visitante[0], 2.5))
+    return etiquetas[0] if codigo > PUSH else etiquetas[1] if codigo < PUSH else etiquetas[2]
+
 def _analizar_over_under(resultado):
     """
     Analiza si un resultado fue over o under (más de 2.5 goles).
@@ -61,20 +66,7 @@ def _analizar_over_under(resultado):
     """
     if not resultado or '-' not in resultado:
         return "N/A"
-    
-    try:
-        goles_local, goles_visitante = map(int, resultado.split('-'))
-        total_goles = goles_local + goles_visitante
-        
-        if total_goles > 2.5:
-            return "Over"
-        elif total_goles < 2.5:
-            return "Under"
-        else:
-            # Empate exacto en 2.5 goles - técnicamente sería Push
-            return "Push"
-    except (ValueError, TypeError):
-        return "N/A"
+    return _texto_over_under(resultado, ("Over", "Under", "Push"))
 
 def _analizar_ah_cubierto(resultado, handicap_raw, equipo_favorito, equipo_local, equipo_visitante):
     """
@@ -93,30 +85,25 @@ def _analizar_ah_cubierto(resultado, handicap_raw, equipo_favorito, equipo_local
     if not resultado or '-' not in resultado or not handicap_raw:
         return "N/A"
     
-    try:
-        goles_local, goles_visitante = map(int, resultado.split('-'))
-        handicap_num = parse_ah_to_number_of(handicap_raw)
-        
-        if handicap_num is None:
-            return "N/A"
-        
-        # Determinar margen de victoria del favorito
-        if equipo_favorito.lower() == equipo_local.lower():
-            margen_favorito = goles_local - goles_visitante
-        elif equipo_favorito.lower() == equipo_visitante.lower():
-            margen_favorito = goles_visitante - goles_local
-        else:
-            return "N/A"
-        
-        # Verificar si se cubrió el handicap
-        if abs(margen_favorito) - abs(handicap_num) > 0.05:
-            return "Cubierto"
-        elif abs(margen_favorito) - abs(handicap_num) < -0.05:
-            return "No Cubierto"
-        else:
-            return "Push"
-    except (ValueError, TypeError):
+    handicap_num = parse_ah_to_number_of(handicap_raw)
+    goles_local, goles_visitante, validos = marcadores([resultado])
+    if handicap_num is None or not validos[0]:
+        return "N/A"
+    
+    # Determinar de qué lado está el favorito
+    if equipo_favorito.lower() == equipo_local.lower():
+        apuesta_local = True
+    elif equipo_favorito.lower() == equipo_visitante.lower():
+        apuesta_local = False
+    else:
         return "N/A"
+    
+    codigo = int(liquidar_ah(goles_local[0], goles_visitante[0], abs(handicap_num), apuesta_local))
+    if codigo > PUSH:
+        return "Cubierto"
+    elif codigo < PUSH:
+        return "No Cubierto"
+    return "Push"
 
 def _analizar_desempeno_casa_fuera(matches, equipo):
     """
@@ -196,20 +183,7 @@ def _analizar_over_under_h2h(resultado):
     """
     if not resultado or '-' not in resultado:
         return "N/A"
-    
-    try:
-        goles_local, goles_visitante = map(int, resultado.split('-'))
-        total_goles = goles_local + goles_visitante
-        
-        if total_goles > 2.5:
-            return "Over"
-        elif total_goles < 2.5:
-            return "Under"
-        else:
-            # Empate exacto en 2.5 goles - técnicamente sería Push
-            return "Push"
-    except (ValueError, TypeError):
-        return "N/A"
+    return _texto_over_under(resultado, ("Over", "Under", "Push"))
 
 def _contar_over_h2h(matches):
     """
@@ -1,7 +1,6 @@
 # modules/funciones_resumen.py
-import re
-from bs4 import BeautifulSoup
-from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover
+from modules.pagina_h2h import como_pagina_h2h
+from modules.utils import parse_ah_to_number_of
 
 def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_line):
     """
@@ -10,7 +9,7 @@ def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_
     "análisis de mercado vs histórico H2H".
     
     Args:
-        soup: BeautifulSoup object con el contenido de la página
+        soup: H2HPage (o BeautifulSoup) con el contenido de la página
         home_name: Nombre del equipo local
         away_name: Nombre del equipo visitante
         current_ah_line: Línea de handicap actual (número)
@@ -18,6 +17,7 @@ def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_
     Returns:
         dict: Diccionario con el resumen del rendimiento reciente
     """
+    soup = como_pagina_h2h(soup)
     # Obtener partidos recientes para ambos equipos
     partidos_local = _obtener_partidos_recientes(soup, "table_v1", home_name, True)
     partidos_visitante = _obtener_partidos_recientes(soup, "table_v2", away_name, False)
@@ -51,51 +51,50 @@ def generar_resumen_rendimiento_reciente(soup, home_name, away_name, current_ah_
 
 def _obtener_partidos_recientes(soup, table_id, team_name, is_home_team=True):
     """Obtiene los partidos recientes de un equipo."""
-    table = soup.find("table", id=table_id)
-    if not table:
+    pagina = como_pagina_h2h(soup)
+    filas = pagina.filas(table_id)
+    if filas is None:
         return []
     
     partidos = []
     score_selector = 'fscore_1' if is_home_team else 'fscore_2'
+    clave = pagina.clave(team_name)
     
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
+    for fila in filas:
         if len(partidos) >= 5:  # Limitar a 5 partidos recientes
             break
             
-        cells = row.find_all('td')
-        if len(cells) < 12:
+        if fila.n_celdas < 12:
             continue
             
         # Obtener nombres de equipos
-        home_team = cells[2].get_text(strip=True)
-        away_team = cells[4].get_text(strip=True)
+        home_team = fila.local_texto
+        away_team = fila.visitante_texto
         
-        # Verificar si el equipo está en este partido
-        if team_name.lower() not in [home_team.lower(), away_team.lower()]:
+        # Verificar si el equipo está en este partido (por id, no por nombre)
+        if not fila.es_de(clave):
             continue
             
         # Obtener resultado
-        score_cell = cells[3]
-        score_span = score_cell.find('span', class_=score_selector)
-        if not score_span:
+        score_raw = fila.marcador_span(score_selector)
+        if score_raw is None:
             continue
             
-        score_raw = score_span.get_text(strip=True)
         if '-' not in score_raw:
             continue
             
         # Obtener handicap
-        ah_cell = cells[11]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
+        ah_line_raw = fila.ah_raw
         
         # Determinar si el equipo era favorito
         ah_line_num = parse_ah_to_number_of(ah_line_raw)
         favorito = None
+        clave_favorito = None
         if ah_line_num is not None:
             if ah_line_num > 0:
-                favorito = home_team
+                favorito, clave_favorito = home_team, fila.clave_local
             elif ah_line_num < 0:
-                favorito = away_team
+                favorito, clave_favorito = away_team, fila.clave_visitante
         
         partidos.append({
             'home_team': home_team,
@@ -104,7 +103,8 @@ def _obtener_partidos_recientes(soup, table_id, team_name, is_home_team=True):
             'ah_line_raw': ah_line_raw,
             'ah_line_num': ah_line_num,
             'favorito': favorito,
-            'equipo_es_favorito': team_name.lower() == favorito.lower() if favorito else False
+            'equipo_es_favorito': clave_favorito is not None and clave_favorito == clave,
+            'equipo_es_local': fila.clave_local == clave
         })
     
     return partidos
@@ -145,9 +145,9 @@ def _analizar_rendimiento(partidos, current_ah_line, team_name):
                 goles_local, goles_visitante = int(goles_local), int(goles_visitante)
                 
                 # Verificar si el equipo ganó
-                if partido['home_team'].lower() == team_name.lower() and goles_local > goles_visitante:
+                if partido['equipo_es_local'] and goles_local > goles_visitante:
                     victorias += 1
-                elif partido['away_team'].lower() == team_name.lower() and goles_visitante > goles_local:
+                elif not partido['equipo_es_local'] and goles_visitante > goles_local:
                     victorias += 1
             except (ValueError, IndexError):
                 continue
@@ -167,25 +167,24 @@ def _obtener_comparativas_indirectas(soup):
     comparativas = []
     
     # Buscar en las tablas de partidos rivales
-    table_v1 = soup.find("table", id="table_v1")  # Partidos del equipo local
-    table_v2 = soup.find("table", id="table_v2")  # Partidos del equipo visitante
+    pagina = como_pagina_h2h(soup)
+    table_v1 = pagina.filas("table_v1")  # Partidos del equipo local
+    table_v2 = pagina.filas("table_v2")  # Partidos del equipo visitante
     
     if table_v1 and table_v2:
         # Obtener rivales del equipo local
         rivales_local = set()
-        for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-            cells = row.find_all('td')
-            if len(cells) >= 5:
-                rival = cells[4].get_text(strip=True)  # Equipo visitante
+        for fila in table_v1:
+            if fila.n_celdas >= 5:
+                rival = fila.visitante_texto  # Equipo visitante
                 if rival and rival != '?':
                     rivales_local.add(rival.lower())
         
         # Obtener rivales del equipo visitante
         rivales_visitante = set()
-        for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-            cells = row.find_all('td')
-            if len(cells) >= 5:
-                rival = cells[2].get_text(strip=True)  # Equipo local
+        for fila in table_v2:
+            if fila.n_celdas >= 5:
+                rival = fila.local_texto  # Equipo local
                 if rival and rival != '?':
                     rivales_visitante.add(rival.lower())
         
@@ -196,35 +195,25 @@ def _obtener_comparativas_indirectas(soup):
         for rival in list(rivales_comunes)[:3]:  # Limitar a 3 rivales comunes
             # Buscar partido del equipo local contra este rival
             partido_local = None
-            for row in table_v1.find_all("tr", id=re.compile(r"tr1_\d+")):
-                cells = row.find_all('td')
-                if len(cells) >= 5 and cells[4].get_text(strip=True).lower() == rival:
-                    score = cells[3].get_text(strip=True)
-                    ah_cell = cells[11] if len(cells) > 11 else None
-                    handicap = ah_cell.get('data-o') or ah_cell.get_text(strip=True) if ah_cell else "-"
-                    
+            for fila in table_v1:
+                if fila.n_celdas >= 5 and fila.visitante_texto.lower() == rival:
                     partido_local = {
                         'equipo': 'local',
                         'rival': rival,
-                        'resultado': score,
-                        'handicap': handicap
+                        'resultado': fila.marcador_texto,
+                        'handicap': (fila.ah_data_o or fila.ah_texto) if fila.n_celdas > 11 else "-"
                     }
                     break
             
             # Buscar partido del equipo visitante contra este rival
             partido_visitante = None
-            for row in table_v2.find_all("tr", id=re.compile(r"tr2_\d+")):
-                cells = row.find_all('td')
-                if len(cells) >= 5 and cells[2].get_text(strip=True).lower() == rival:
-                    score = cells[3].get_text(strip=True)
-                    ah_cell = cells[11] if len(cells) > 11 else None
-                    handicap = ah_cell.get('data-o') or ah_cell.get_text(strip=True) if ah_cell else "-"
-                    
+            for fila in table_v2:
+                if fila.n_celdas >= 5 and fila.local_texto.lower() == rival:
                     partido_visitante = {
                         'equipo': 'visitante',
                         'rival': rival,
-                        'resultado': score,
-                        'handicap': handicap
+                        'resultado': fila.marcador_texto,
+                        'handicap': (fila.ah_data_o or fila.ah_texto) if fila.n_celdas > 11 else "-"
                     }
                     break
             
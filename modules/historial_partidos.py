@@ -0,0 +1,381 @@
+# modules/historial_partidos.py
+"""
+Almacén local (SQLite) de partidos históricos, alimentado por cada página h2h que se
+scrapea (estudios completos y vistas previas).
+
+Cada página trae decenas de partidos pasados en table_v1/v2/v3 (fecha, equipos,
+marcador, línea AH, liga) y las cuotas iniciales de Bet365 del partido principal.
+Antes se tiraban al terminar la petición; aquí se guardan en tablas normalizadas:
+- leagues(league_id, nombre)
+- teams(team_id, nombre): el id de equipo de NowGoal ("n:<nombre>" si la fila no lo trae),
+  que es también el índice persistente id <-> nombre (`nombre_equipo`, `ids_equipo`)
+- matches(match_id, fecha, liga, local, visitante, goles, línea AH y su bucket)
+- odds(match_id, casa, línea AH y cuotas, línea de goles y cuotas)
+con índices por equipo, liga, fecha y bucket AH, para que los análisis puedan
+consultar el historial en local (`consultar_partidos`) en lugar de volver a scrapearlo.
+
+La petición solo extrae las filas de la página ya parseada y las encola
+(`registrar_pagina`, sin tocar la base de datos); un hilo escritor las escribe por
+lotes (HISTORIAL_LOTE páginas o cada HISTORIAL_INTERVALO_SECONDS) en una sola transacción. Si la cola está llena, la
+página se descarta: el historial es un extra y nunca debe frenar una petición.
+"""
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from modules import almacen_compartido, lineas_ah
+
+HISTORIAL_ENABLED = os.environ.get("HISTORIAL", "1") == "1"
+HISTORIAL_PATH = os.environ.get(
+    "HISTORIAL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "historial.sqlite3"),
+)
+HISTORIAL_LOTE = int(os.environ.get("HISTORIAL_LOTE", "20"))
+HISTORIAL_INTERVALO_SECONDS = float(os.environ.get("HISTORIAL_INTERVALO_SECONDS", "2"))
+HISTORIAL_COLA_MAX = int(os.environ.get("HISTORIAL_COLA_MAX", "500"))
+
+TABLAS_HISTORIAL = ("table_v1", "table_v2", "table_v3")
+CASA_BET365_INICIAL = "bet365_inicial"
+
+_RE_MARCADOR = re.compile(r"^(\d+)-(\d+)$")
+_RE_FECHA_DMY = re.compile(r"^(\d{2})-(\d{2})-(\d{4})")
+_RE_FECHA_ISO = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+_ESQUEMA = (
+    "CREATE TABLE IF NOT EXISTS leagues ("
+    " league_id TEXT PRIMARY KEY,"
+    " nombre TEXT)",
+    "CREATE TABLE IF NOT EXISTS teams ("
+    " team_id TEXT PRIMARY KEY,"
+    " nombre TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS matches ("
+    " match_id TEXT PRIMARY KEY,"
+    " fecha TEXT,"
+    " league_id TEXT REFERENCES leagues (league_id),"
+    " home_id TEXT NOT NULL REFERENCES teams (team_id),"
+    " away_id TEXT NOT NULL REFERENCES teams (team_id),"
+    " goles_local INTEGER,"
+    " goles_visitante INTEGER,"
+    " ah_linea REAL,"
+    " ah_bucket TEXT,"
+    " actualizado_en REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS odds ("
+    " match_id TEXT NOT NULL REFERENCES matches (match_id),"
+    " casa TEXT NOT NULL,"
+    " ah_linea REAL,"
+    " ah_local REAL,"
+    " ah_visitante REAL,"
+    " goles_linea REAL,"
+    " over REAL,"
+    " under REAL,"
+    " actualizado_en REAL NOT NULL,"
+    " PRIMARY KEY (match_id, casa))",
+    "CREATE INDEX IF NOT EXISTS idx_teams_nombre ON teams (nombre)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_home ON matches (home_id, fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_away ON matches (away_id, fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_league ON matches (league_id, fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_fecha ON matches (fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_bucket ON matches (ah_bucket, league_id)",
+)
+
+_SQL_TEAM = (
+    "INSERT INTO teams (team_id, nombre) VALUES (?, ?)"
+    " ON CONFLICT (team_id) DO UPDATE SET nombre = excluded.nombre"
+)
+_SQL_LEAGUE = (
+    "INSERT INTO leagues (league_id, nombre) VALUES (?, ?)"
+    " ON CONFLICT (league_id) DO UPDATE SET nombre = COALESCE(excluded.nombre, leagues.nombre)"
+)
+# Lo que ya se sabía de un partido no se pierde si una lectura posterior viene incompleta.
+_SQL_MATCH = (
+    "INSERT INTO matches (match_id, fecha, league_id, home_id, away_id, goles_local, goles_visitante,"
+    " ah_linea, ah_bucket, actualizado_en)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (match_id) DO UPDATE SET"
+    " fecha = COALESCE(excluded.fecha, matches.fecha),"
+    " league_id = COALESCE(excluded.league_id, matches.league_id),"
+    " home_id = excluded.home_id, away_id = excluded.away_id,"
+    " goles_local = COALESCE(excluded.goles_local, matches.goles_local),"
+    " goles_visitante = COALESCE(excluded.goles_visitante, matches.goles_visitante),"
+    " ah_linea = COALESCE(excluded.ah_linea, matches.ah_linea),"
+    " ah_bucket = COALESCE(excluded.ah_bucket, matches.ah_bucket),"
+    " actualizado_en = excluded.actualizado_en"
+)
+_SQL_ODDS = (
+    "INSERT OR REPLACE INTO odds (match_id, casa, ah_linea, ah_local, ah_visitante, goles_linea, over, under,"
+    " actualizado_en) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+_cola = queue.Queue(maxsize=HISTORIAL_COLA_MAX)
+_conexion = None
+_lock = threading.Lock()
+_hilo = None
+_hilo_lock = threading.Lock()
+_estadisticas = {"paginas": 0, "partidos": 0, "lotes": 0, "descartadas": 0, "errores": 0}
+
+
+def _fecha_iso(texto: str | None) -> str | None:
+    """'06-09-2025' o '2025-09-06 12:00' -> '2025-09-06'."""
+    texto = (texto or "").strip()
+    if m := _RE_FECHA_ISO.match(texto):
+        return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+    if m := _RE_FECHA_DMY.match(texto):
+        return f"{m.group(3)}-{m.group(2)}-{m.group(1)}"
+    return None
+
+
+def _goles(marcador_raw: str | None) -> tuple:
+    m = _RE_MARCADOR.match(marcador_raw or "")
+    return (int(m.group(1)), int(m.group(2))) if m else (None, None)
+
+
+def _numero(texto) -> float | None:
+    try:
+        return float(str(texto).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _linea_ah(texto) -> tuple:
+    """(línea numérica, bucket de medio punto) de una línea AH en texto."""
+    linea = lineas_ah.decodificar(texto)
+    return (linea.valor, linea.bucket) if linea else (None, None)
+
+
+def _registros_de_pagina(match_id: str, pagina, fecha: str | None) -> dict:
+    """Filas a escribir (equipos, ligas, partidos y cuotas) a partir de una página h2h."""
+    equipos, ligas, partidos, cuotas = {}, {}, {}, []
+    for table_id in TABLAS_HISTORIAL:
+        for fila in pagina.filas(table_id) or ():
+            detalles = fila.detalles()
+            if not detalles or not fila.match_id:
+                continue
+            local, visitante = fila.clave_local, fila.clave_visitante
+            equipos[local], equipos[visitante] = detalles["home"], detalles["away"]
+            if fila.league_id:
+                ligas.setdefault(fila.league_id, None)
+            linea, bucket = _linea_ah(detalles["ahLine_raw"])
+            partidos[fila.match_id] = (
+                fila.match_id, _fecha_iso(detalles["date"]), fila.league_id, local, visitante,
+                *_goles(detalles["score_raw"]), linea, bucket,
+            )
+
+    info = pagina.match_info
+    nombre_local, nombre_visitante = info.get("home_name"), info.get("away_name")
+    if match_id and nombre_local and nombre_visitante and "N/A" not in (nombre_local, nombre_visitante):
+        local = pagina.clave(nombre_local, info.get("home_id"))
+        visitante = pagina.clave(nombre_visitante, info.get("away_id"))
+        equipos[local], equipos[visitante] = nombre_local, nombre_visitante
+        if info.get("league_id"):
+            ligas[info["league_id"]] = info.get("league_name") if info.get("league_name") != "N/A" else None
+        odds = pagina.cuotas_iniciales
+        linea, bucket = _linea_ah(odds.get("ah_linea_raw"))
+        # En juego la cabecera también trae marcador: solo es resultado si el partido ha terminado.
+        goles_local, goles_visitante = (_goles((pagina.final_score or "").replace(" ", ""))
+                                        if pagina.terminado else (None, None))
+        partidos[match_id] = (match_id, _fecha_iso(fecha), info.get("league_id"), local, visitante,
+                              goles_local, goles_visitante, linea, bucket)
+        if linea is not None or _numero(odds.get("goals_linea_raw")) is not None:
+            cuotas.append((match_id, CASA_BET365_INICIAL, linea, _numero(odds.get("ah_home_cuota")),
+                           _numero(odds.get("ah_away_cuota")), _linea_ah(odds.get("goals_linea_raw"))[0],
+                           _numero(odds.get("goals_over_cuota")), _numero(odds.get("goals_under_cuota"))))
+    return {"equipos": equipos, "ligas": ligas, "partidos": list(partidos.values()), "cuotas": cuotas}
+
+
+def _obtener_conexion() -> sqlite3.Connection:
+    global _conexion
+    if _conexion is None:
+        conexion = almacen_compartido.conectar(HISTORIAL_PATH)
+        for sentencia in _ESQUEMA:
+            conexion.execute(sentencia)
+        conexion.commit()
+        _conexion = conexion
+    return _conexion
+
+
+def _escribir_lote(paginas: list):
+    ahora = time.time()
+    equipos, ligas, partidos, cuotas = {}, {}, {}, []
+    for registros in paginas:
+        equipos.update(registros["equipos"])
+        for league_id, nombre in registros["ligas"].items():
+            ligas[league_id] = nombre or ligas.get(league_id)
+        partidos.update((p[0], p) for p in registros["partidos"])
+        cuotas.extend(registros["cuotas"])
+    try:
+        with _lock:
+            conexion = _obtener_conexion()
+            with conexion:
+                conexion.executemany(_SQL_TEAM, equipos.items())
+                conexion.executemany(_SQL_LEAGUE, ligas.items())
+                conexion.executemany(_SQL_MATCH, [(*p, ahora) for p in partidos.values()])
+                conexion.executemany(_SQL_ODDS, [(*c, ahora) for c in cuotas])
+    except sqlite3.Error as exc:
+        _estadisticas["errores"] += 1
+        print(f"Historial: no se pudo escribir el lote: {exc}")
+        return
+    _estadisticas["paginas"] += len(paginas)
+    _estadisticas["partidos"] += len(partidos)
+    _estadisticas["lotes"] += 1
+
+
+def _bucle_escritor():
+    while True:
+        lote = [_cola.get()]
+        limite = time.monotonic() + HISTORIAL_INTERVALO_SECONDS
+        while len(lote) < HISTORIAL_LOTE:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(_cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        _escribir_lote(lote)
+        for _ in lote:
+            _cola.task_done()
+
+
+def registrar_pagina(match_id: str, pagina, fecha: str | None = None):
+    """
+    Extrae el historial de una página h2h ya construida (pagina_h2h.H2HPage) y lo encola
+    para guardarlo. `fecha` es la del partido principal ("YYYY-MM-DD HH:MM"), si se
+    conoce. No bloquea ni lanza excepciones.
+    """
+    global _hilo
+    if not HISTORIAL_ENABLED or pagina is None:
+        return
+    try:
+        registros = _registros_de_pagina(str(match_id) if match_id else None, pagina, fecha)
+    except Exception as exc:
+        _estadisticas["errores"] += 1
+        print(f"Historial: no se pudo extraer la página {match_id}: {exc}")
+        return
+    with _hilo_lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle_escritor, name="historial-escritor", daemon=True)
+            _hilo.start()
+    try:
+        _cola.put_nowait(registros)
+    except queue.Full:
+        _estadisticas["descartadas"] += 1
+
+
+def esperar_escrituras():
+    """Bloquea hasta que todo lo encolado se haya escrito (scripts y pruebas)."""
+    _cola.join()
+
+
+def _consultar(sql: str, parametros) -> list:
+    try:
+        with _lock:
+            return _obtener_conexion().execute(sql, parametros).fetchall()
+    except sqlite3.Error as exc:
+        print(f"Historial no disponible: {exc}")
+        return []
+
+
+def nombre_equipo(team_id) -> str | None:
+    """Último nombre guardado para un id de equipo de NowGoal."""
+    if not HISTORIAL_ENABLED or not team_id:
+        return None
+    filas = _consultar("SELECT nombre FROM teams WHERE team_id = ?", [str(team_id)])
+    return filas[0][0] if filas else None
+
+
+def ids_equipo(nombre: str) -> list[str]:
+    """Ids de equipo guardados con ese nombre exacto (puede haber varios equipos homónimos)."""
+    if not HISTORIAL_ENABLED or not nombre:
+        return []
+    return [fila[0] for fila in _consultar("SELECT team_id FROM teams WHERE nombre = ? ORDER BY team_id", [nombre])]
+
+
+def consultar_partidos(equipo: str | None = None, liga: str | None = None, bucket: str | None = None,
+                       desde: str | None = None, hasta: str | None = None, solo_terminados: bool = False,
+                       limite: int | None = None, equipo_id: str | None = None) -> list[dict]:
+    """
+    Partidos guardados, del más reciente al más antiguo. `equipo_id` es el id de NowGoal del
+    equipo (como local o visitante) y `equipo` su nombre tal como sale en NowGoal, que se
+    traduce a ids con la tabla teams; `bucket` es el de normalize_handicap_to_half_bucket_str
+    y `desde`/`hasta` fechas 'YYYY-MM-DD' incluidas.
+    """
+    if not HISTORIAL_ENABLED:
+        return []
+    condiciones, parametros = [], []
+    if equipo_id:
+        condiciones.append("m.home_id = ? OR m.away_id = ?")
+        parametros += [str(equipo_id), str(equipo_id)]
+    elif equipo:
+        condiciones.append("m.home_id IN (SELECT team_id FROM teams WHERE nombre = ?)"
+                           " OR m.away_id IN (SELECT team_id FROM teams WHERE nombre = ?)")
+        parametros += [equipo, equipo]
+    if liga:
+        condiciones.append("m.league_id = ?")
+        parametros.append(str(liga))
+    if bucket:
+        condiciones.append("m.ah_bucket = ?")
+        parametros.append(bucket)
+    if desde:
+        condiciones.append("m.fecha >= ?")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("m.fecha <= ?")
+        parametros.append(hasta)
+    if solo_terminados:
+        condiciones.append("m.goles_local IS NOT NULL")
+    sql = (
+        "SELECT m.match_id, m.fecha, m.league_id, l.nombre, h.nombre, a.nombre, m.goles_local, m.goles_visitante,"
+        " m.ah_linea, m.ah_bucket"
+        " FROM matches m JOIN teams h ON h.team_id = m.home_id JOIN teams a ON a.team_id = m.away_id"
+        " LEFT JOIN leagues l ON l.league_id = m.league_id"
+        + (" WHERE " + " AND ".join(f"({c})" for c in condiciones) if condiciones else "")
+        + " ORDER BY m.fecha DESC, m.match_id DESC"
+        + (" LIMIT ?" if limite else "")
+    )
+    if limite:
+        parametros.append(int(limite))
+    filas = _consultar(sql, parametros)
+    claves = ("match_id", "fecha", "league_id", "liga", "local", "visitante", "goles_local", "goles_visitante",
+              "ah_linea", "ah_bucket")
+    return [dict(zip(claves, fila)) for fila in filas]
+
+
+def resultados_para_backtest(liga: str | None = None, desde: str | None = None, hasta: str | None = None) -> list[tuple]:
+    """
+    Partidos terminados con línea AH, como tuplas (match_id, league_id, fecha, goles_local,
+    goles_visitante, ah_linea, ah_local, ah_visitante, goles_linea); las tres últimas
+    solo si hay cuotas guardadas del partido (si no, None).
+    """
+    if not HISTORIAL_ENABLED:
+        return []
+    condiciones, parametros = ["m.goles_local IS NOT NULL", "m.goles_visitante IS NOT NULL", "m.ah_linea IS NOT NULL"], []
+    if liga:
+        condiciones.append("m.league_id = ?")
+        parametros.append(str(liga))
+    if desde:
+        condiciones.append("m.fecha >= ?")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("m.fecha <= ?")
+        parametros.append(hasta)
+    sql = (
+        "SELECT m.match_id, m.league_id, m.fecha, m.goles_local, m.goles_visitante, m.ah_linea,"
+        " o.ah_local, o.ah_visitante, o.goles_linea"
+        " FROM matches m LEFT JOIN odds o ON o.match_id = m.match_id AND o.casa = ?"
+        " WHERE " + " AND ".join(condiciones)
+    )
+    return _consultar(sql, [CASA_BET365_INICIAL, *parametros])
+
+
+def estado_historial() -> dict:
+    """Resumen del almacén (para diagnóstico)."""
+    if not HISTORIAL_ENABLED:
+        return {"enabled": False}
+    with _lock:
+        conexion = _obtener_conexion()
+        totales = {tabla: conexion.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                   for tabla in ("matches", "teams", "leagues", "odds")}
+    return {"enabled": True, "pending": _cola.qsize(), **totales, **_estadisticas}
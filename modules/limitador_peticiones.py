@@ -0,0 +1,221 @@
+# modules/limitador_peticiones.py
+"""
+Limitador adaptativo de peticiones a NowGoal, uno por host (live18, live20...).
+
+Todas las vías de descarga pasan por aquí: cliente_http (requests), el navegador de
+Playwright, los driver.get de Selenium del estudio y los scrapers sueltos
+(scraper_partidos*.py). Antes cada una reintentaba por su cuenta con Retry, sin
+noción del ritmo total: cuando NowGoal empezaba a frenar, los reintentos lo
+empeoraban.
+
+- Token bucket por host: LIMITADOR_RAFAGA fichas que se reponen a `tasa` por
+  segundo. Sin fichas, la petición toma una a cuenta y duerme hasta que le toca, así
+  que las que esperan salen en orden de llegada.
+- AIMD: un 429, un 5xx, un error de conexión o una latencia media por encima de
+  LIMITADOR_LATENCIA_OBJETIVO multiplican la tasa por LIMITADOR_FACTOR_BAJADA, como
+  mucho una vez cada LIMITADOR_ENFRIAMIENTO_SECONDS (una racha de errores simultáneos
+  es una sola señal). Cada respuesta correcta y rápida la sube LIMITADOR_INCREMENTO /
+  tasa: unas LIMITADOR_INCREMENTO peticiones/s más por cada segundo a pleno ritmo.
+- Arranque rápido (como el slow start de TCP): hasta la primera bajada, cada respuesta
+  correcta suma 1 petición/s, así que la tasa se dobla cada segundo hasta encontrar el
+  límite del servidor. Después se sube de forma aditiva.
+- Un Retry-After del servidor vacía la cubeta hasta esa hora.
+
+Las navegaciones de los navegadores no cuentan para la latencia (cargan la página
+entera con sus scripts), solo los errores. Cada worker de gunicorn tiene su limitador:
+como en TCP, varios AIMD contra el mismo servidor acaban repartiéndose su capacidad.
+"""
+import asyncio
+import email.utils
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+LIMITADOR_ENABLED = os.environ.get("LIMITADOR", "1") == "1"
+LIMITADOR_TASA_INICIAL = float(os.environ.get("LIMITADOR_TASA_INICIAL", "4"))
+LIMITADOR_TASA_MIN = float(os.environ.get("LIMITADOR_TASA_MIN", "0.5"))
+LIMITADOR_TASA_MAX = float(os.environ.get("LIMITADOR_TASA_MAX", "20"))
+LIMITADOR_RAFAGA = float(os.environ.get("LIMITADOR_RAFAGA", "4"))
+LIMITADOR_INCREMENTO = float(os.environ.get("LIMITADOR_INCREMENTO", "1"))
+LIMITADOR_FACTOR_BAJADA = float(os.environ.get("LIMITADOR_FACTOR_BAJADA", "0.5"))
+LIMITADOR_LATENCIA_OBJETIVO = float(os.environ.get("LIMITADOR_LATENCIA_OBJETIVO", "4"))
+LIMITADOR_ENFRIAMIENTO_SECONDS = float(os.environ.get("LIMITADOR_ENFRIAMIENTO_SECONDS", "2"))
+LIMITADOR_RETRY_AFTER_MAX_SECONDS = float(os.environ.get("LIMITADOR_RETRY_AFTER_MAX_SECONDS", "60"))
+
+# Respuestas que indican que el servidor no da más de sí.
+ESTADOS_FRENO = frozenset({429, 500, 502, 503, 504})
+
+# Peso de la última latencia en la media móvil.
+_PESO_LATENCIA = 0.2
+
+_cubetas = {}
+_lock = threading.Lock()
+
+
+class _Cubeta:
+    """Token bucket de un host, con la tasa ajustada por AIMD. Se usa con _lock tomado."""
+
+    def __init__(self):
+        self.tasa = min(max(LIMITADOR_TASA_INICIAL, LIMITADOR_TASA_MIN), LIMITADOR_TASA_MAX)
+        self.fichas = LIMITADOR_RAFAGA
+        self.repuesto_en = time.monotonic()
+        self.en_espera = 0
+        self.latencia = None
+        self.bajada_en = float("-inf")
+        self.umbral = LIMITADOR_TASA_MAX    # por debajo, arranque rápido
+        self.contadores = {"requests": 0, "throttled": 0, "errors": 0, "slow": 0, "waited": 0}
+
+    def _reponer(self, ahora: float):
+        self.fichas = min(LIMITADOR_RAFAGA, self.fichas + (ahora - self.repuesto_en) * self.tasa)
+        self.repuesto_en = ahora
+
+    def reservar(self) -> float:
+        """Toma una ficha (a cuenta si no quedan) y devuelve los segundos hasta que sea suya."""
+        self._reponer(time.monotonic())
+        self.fichas -= 1
+        self.contadores["requests"] += 1
+        if self.fichas >= 0:
+            return 0.0
+        self.contadores["waited"] += 1
+        return -self.fichas / self.tasa
+
+    def _bajar(self, ahora: float):
+        if ahora - self.bajada_en >= LIMITADOR_ENFRIAMIENTO_SECONDS:
+            self.tasa = max(LIMITADOR_TASA_MIN, self.tasa * LIMITADOR_FACTOR_BAJADA)
+            self.umbral = self.tasa
+            self.bajada_en = ahora
+            # Sin ráfaga: la siguiente petición (o su reintento) ya sale al ritmo nuevo.
+            self.fichas = min(self.fichas, 0.0)
+
+    def registrar(self, estado: int | None, segundos: float | None, error: bool, retry_after: float | None):
+        ahora = time.monotonic()
+        self._reponer(ahora)
+        if segundos is not None:
+            self.latencia = segundos if self.latencia is None else (
+                (1 - _PESO_LATENCIA) * self.latencia + _PESO_LATENCIA * segundos)
+        if error or estado in ESTADOS_FRENO:
+            self.contadores["throttled" if estado in ESTADOS_FRENO else "errors"] += 1
+            self._bajar(ahora)
+        elif self.latencia is not None and self.latencia > LIMITADOR_LATENCIA_OBJETIVO:
+            self.contadores["slow"] += 1
+            self._bajar(ahora)
+        elif self.tasa < self.umbral:
+            self.tasa = min(self.umbral, self.tasa + 1)
+        else:
+            self.tasa = min(LIMITADOR_TASA_MAX, self.tasa + LIMITADOR_INCREMENTO / self.tasa)
+        if retry_after:
+            # Deuda de fichas equivalente a la pausa pedida: nadie sale antes de esa hora.
+            self.fichas = min(self.fichas, -min(retry_after, LIMITADOR_RETRY_AFTER_MAX_SECONDS) * self.tasa)
+
+
+def _cubeta(host: str) -> _Cubeta:
+    cubeta = _cubetas.get(host)
+    if cubeta is None:
+        cubeta = _cubetas[host] = _Cubeta()
+    return cubeta
+
+
+def segundos_retry_after(valor) -> float | None:
+    """Segundos de una cabecera Retry-After (número o fecha HTTP), o None."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, fecha.timestamp() - time.time())
+
+
+class _Peticion:
+    """
+    Context manager (con `with` o `async with`) de una petición a `url`: al entrar
+    espera su turno en la cubeta del host; al salir registra el resultado. Quien hace
+    la petición puede rellenar `estado` (código HTTP) y `retry_after` (cabecera) antes
+    de salir; salir con excepción cuenta como error.
+    """
+
+    def __init__(self, url: str, medir_latencia: bool):
+        self.host = urlsplit(url).hostname or ""
+        self.medir_latencia = medir_latencia
+        self.estado = None
+        self.retry_after = None
+        self._inicio = None
+
+    def _reservar(self) -> float:
+        with _lock:
+            espera = _cubeta(self.host).reservar()
+            if espera > 0:
+                _cubetas[self.host].en_espera += 1
+        return espera
+
+    def _fin_espera(self):
+        with _lock:
+            _cubetas[self.host].en_espera -= 1
+
+    def __enter__(self):
+        if LIMITADOR_ENABLED:
+            espera = self._reservar()
+            if espera > 0:
+                try:
+                    time.sleep(espera)
+                finally:
+                    self._fin_espera()
+        self._inicio = time.monotonic()
+        return self
+
+    async def __aenter__(self):
+        if LIMITADOR_ENABLED:
+            espera = self._reservar()
+            if espera > 0:
+                try:
+                    await asyncio.sleep(espera)
+                finally:
+                    self._fin_espera()
+        self._inicio = time.monotonic()
+        return self
+
+    def __exit__(self, tipo, exc, tb):
+        if LIMITADOR_ENABLED:
+            segundos = time.monotonic() - self._inicio if self.medir_latencia and tipo is None else None
+            with _lock:
+                _cubeta(self.host).registrar(self.estado, segundos, tipo is not None,
+                                             segundos_retry_after(self.retry_after))
+        return False
+
+    async def __aexit__(self, tipo, exc, tb):
+        return self.__exit__(tipo, exc, tb)
+
+
+def peticion(url: str, medir_latencia: bool = True) -> _Peticion:
+    """
+    Turno para pedir `url` al servidor:
+
+        with limitador_peticiones.peticion(url) as turno:
+            response = session.get(url)
+            turno.estado = response.status_code
+
+    Para navegadores, `medir_latencia=False` (solo cuentan los errores).
+    """
+    return _Peticion(url, medir_latencia)
+
+
+def estado_limitador() -> dict:
+    """Tasa actual, peticiones esperando y contadores de cada host (para diagnóstico)."""
+    with _lock:
+        ahora = time.monotonic()
+        estado = {}
+        for host, cubeta in _cubetas.items():
+            cubeta._reponer(ahora)
+            estado[host] = {
+                "rate": round(cubeta.tasa, 2),
+                "queued": cubeta.en_espera,
+                "tokens": round(cubeta.fichas, 2),
+                "latency_ewma": None if cubeta.latencia is None else round(cubeta.latencia, 3),
+                **cubeta.contadores,
+            }
+        return estado
@@ -0,0 +1,145 @@
+# modules/lineas_ah.py
+"""
+Códec único de líneas de handicap asiático (las de goles usan el mismo formato).
+
+NowGoal escribe una misma línea de muchas formas: "0.25", "+0.25", "0/0.5", "-0/0.5",
+"0/-0.5", "−0,25" (menos unicode y coma decimal)... `decodificar()` devuelve de una
+vez el valor numérico, el texto decimal normalizado y el bucket de medio punto.
+
+La tabla se precalcula al importar con todas las líneas de cuarto entre -LINEA_MAX y
+LINEA_MAX en las escrituras habituales, así que leer una línea es una búsqueda en un
+diccionario. Lo que no está en la tabla se calcula una vez con el parser general y se
+añade (también los textos que no son una línea, como None), hasta TABLA_MAX entradas.
+
+Reglas:
+- "a/b" es la media de las dos mitades. Si la primera es negativa (también "-0"), la
+  segunda lo es aunque no lleve signo: "-0/0.5" = "0/-0.5" = -0.25, "-0.5/1" = -0.75.
+- El texto se redondea al cuarto más cercano: "0", "0.5", "-0.25", "1", "1.75".
+- Bucket: 0.25, 0.5 y 0.75 van a "0.5"; los enteros se quedan ("1.0"); con signo.
+"""
+import math
+from dataclasses import dataclass
+
+LINEA_MAX = 10
+TABLA_MAX = 4096
+
+_MENOS_UNICODE = ("−", "–")
+
+
+@dataclass(frozen=True, slots=True)
+class LineaAH:
+    valor: float    # línea numérica (positiva = da el local)
+    texto: str      # "0.25", "-1", "1.5"...
+    bucket: str     # "0.5", "-1.0"...
+
+
+def _numero(texto: str) -> float | None:
+    try:
+        valor = float(texto)
+    except ValueError:
+        return None
+    return valor if math.isfinite(valor) else None
+
+
+def _valor(texto: str) -> float | None:
+    s = texto.strip().replace(" ", "").replace(",", ".")
+    for menos in _MENOS_UNICODE:
+        s = s.replace(menos, "-")
+    if not s or s in ("-", "?"):
+        return None
+    if "/" not in s:
+        return _numero(s.lstrip("+"))
+    partes = s.split("/")
+    if len(partes) != 2:
+        return None
+    primera, segunda = partes[0].lstrip("+"), partes[1].lstrip("+")
+    valor1, valor2 = _numero(primera), _numero(segunda)
+    if valor1 is None or valor2 is None:
+        return None
+    if primera.startswith("-") and not segunda.startswith("-"):
+        valor2 = -abs(valor2)
+    return (valor1 + valor2) / 2.0
+
+
+def texto_de_valor(valor: float) -> str:
+    """Texto decimal de una línea ya numérica, al cuarto más cercano."""
+    cuarto = round(abs(valor) * 4) / 4
+    if cuarto == 0:
+        return "0"
+    signo = "-" if valor < 0 else ""
+    if cuarto == int(cuarto):
+        return f"{signo}{int(cuarto)}"
+    return f"{signo}{cuarto:.2f}".rstrip("0")
+
+
+def bucket_de_valor(valor: float) -> str:
+    """Bucket de medio punto de una línea ya numérica."""
+    if valor == 0:
+        return "0.0"
+    absoluto = abs(valor)
+    base = math.floor(absoluto + 1e-9)
+    fraccion = absoluto - base
+    if abs(fraccion) < 1e-6:
+        bucket = float(base)
+    elif any(abs(fraccion - f) < 1e-6 for f in (0.25, 0.5, 0.75)):
+        bucket = base + 0.5
+    else:
+        # Fuera de la rejilla de cuartos: múltiplo de 0.5 más cercano, y si cae en entero
+        # pero está cerca de un cuarto, el .5 (como 0.25 y 0.75).
+        bucket = round(absoluto * 2) / 2.0
+        entero = math.floor(bucket)
+        if abs(bucket - entero) < 1e-6 and (abs(absoluto - (entero + 0.25)) < 0.26 or abs(absoluto - (entero + 0.75)) < 0.26):
+            bucket = entero + 0.5
+    return f"{math.copysign(bucket, valor):.1f}"
+
+
+def _calcular(texto: str) -> LineaAH | None:
+    valor = _valor(texto)
+    if valor is None:
+        return None
+    return LineaAH(valor, texto_de_valor(valor), bucket_de_valor(valor))
+
+
+def _escrituras(cuarto: float):
+    """Escrituras habituales de la línea `cuarto` (múltiplo de 0.25)."""
+    def corto(v):
+        return str(int(v)) if v == int(v) else f"{v:g}"
+
+    absoluto = abs(cuarto)
+    negativo = cuarto < 0
+    simples = {texto_de_valor(cuarto), f"{cuarto:.2f}"}
+    if absoluto % 0.5 == 0:
+        simples.add(f"{cuarto:.1f}")
+    if absoluto % 0.5 == 0.25:
+        bajo, alto = corto(absoluto - 0.25), corto(absoluto + 0.25)
+        if negativo:
+            simples |= {f"-{bajo}/{alto}", f"{bajo}/-{alto}", f"-{bajo}/-{alto}"}
+        else:
+            simples.add(f"{bajo}/{alto}")
+    for texto in list(simples):
+        if not negativo and cuarto != 0:
+            yield "+" + texto
+        yield texto.replace(".", ",")
+        yield texto.replace("-", "−")
+        yield texto
+
+
+_tabla: dict[str, LineaAH | None] = {"": None, "-": None, "?": None, "N/A": None}
+for _i in range(-4 * LINEA_MAX, 4 * LINEA_MAX + 1):
+    for _texto in _escrituras(_i / 4):
+        _tabla[_texto] = _calcular(_texto)
+del _i, _texto
+
+
+def decodificar(texto) -> LineaAH | None:
+    """Línea AH de un texto de NowGoal, o None si no es una línea."""
+    if not isinstance(texto, str):
+        return None
+    try:
+        return _tabla[texto]
+    except KeyError:
+        pass
+    linea = _tabla.get(texto.strip()) if texto.strip() in _tabla else _calcular(texto)
+    if len(_tabla) < TABLA_MAX:
+        _tabla[texto] = linea
+    return linea
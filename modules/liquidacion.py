@@ -0,0 +1,94 @@
+# modules/liquidacion.py
+"""
+Liquidación de handicap asiático y de línea de goles sobre arrays de NumPy.
+
+Es el único sitio donde se decide si una apuesta se cubre: check_handicap_cover,
+check_goal_line_cover, los análisis de funciones_auxiliares y analisis_reciente y el
+backtest (backtest_ah) llaman aquí, ya sea con escalares (un partido) o con arrays
+(toda una tabla de partidos en una sola llamada).
+
+Las líneas de cuarto (0.25, 0.75, 2.25...) se reparten en dos medias apuestas a las
+líneas vecinas (línea ± 0.25), así que el resultado puede ser medio ganado o medio
+perdido. Cada media se compara con la misma tolerancia de ±0.05 que usaba
+check_handicap_cover.
+"""
+import numpy as np
+
+# Resultado de la apuesta (suma de las dos medias: +1 ganada, 0 nula, -1 perdida).
+WIN = 2
+HALF_WIN = 1
+PUSH = 0
+HALF_LOSS = -1
+LOSS = -2
+
+_TOLERANCIA = 0.05
+
+# Textos de check_handicap_cover: la media ganada cuenta como cubierto y la media perdida como no cubierto.
+ESTADOS_AH = {
+    WIN: ("CUBIERTO", True), HALF_WIN: ("CUBIERTO", True), PUSH: ("PUSH", None),
+    HALF_LOSS: ("NO CUBIERTO", False), LOSS: ("NO CUBIERTO", False),
+}
+
+
+def _mitad(diferencia):
+    return np.where(diferencia > _TOLERANCIA, 1, np.where(diferencia < -_TOLERANCIA, -1, 0))
+
+
+def _mitad_escalar(diferencia: float) -> int:
+    return 1 if diferencia > _TOLERANCIA else -1 if diferencia < -_TOLERANCIA else 0
+
+
+def _es_escalar(*valores) -> bool:
+    return not any(isinstance(v, (np.ndarray, list, tuple)) for v in valores)
+
+
+def liquidar_margen(margen, linea_abs):
+    """
+    Resultado de dar `linea_abs` goles con un margen a favor de `margen` goles.
+    Con escalares devuelve un int (sin pasar por NumPy, que para un solo partido es
+    más lento); con arrays, un array int8 (se combinan con broadcasting).
+    """
+    if _es_escalar(margen, linea_abs):
+        margen, linea_abs = float(margen), float(linea_abs)
+        desplazamiento = 0.25 if abs((linea_abs * 2) % 1 - 0.5) < 1e-8 else 0.0
+        return _mitad_escalar(margen - (linea_abs - desplazamiento)) + _mitad_escalar(margen - (linea_abs + desplazamiento))
+    margen = np.asarray(margen, dtype=np.float64)
+    linea_abs = np.asarray(linea_abs, dtype=np.float64)
+    desplazamiento = np.where(np.isclose(np.mod(linea_abs * 2, 1), 0.5), 0.25, 0.0)
+    return (_mitad(margen - (linea_abs - desplazamiento)) + _mitad(margen - (linea_abs + desplazamiento))).astype(np.int8)
+
+
+def liquidar_ah(goles_local, goles_visitante, linea_abs, apuesta_local):
+    """
+    Handicap asiático: resultado de apostar al equipo que da `linea_abs` goles
+    (`apuesta_local` True = el local, False = el visitante).
+    """
+    if _es_escalar(goles_local, goles_visitante, apuesta_local):
+        diferencia = goles_local - goles_visitante
+        return liquidar_margen(diferencia if apuesta_local else -diferencia, linea_abs)
+    diferencia = np.asarray(goles_local) - np.asarray(goles_visitante)
+    return liquidar_margen(np.where(apuesta_local, diferencia, -diferencia), linea_abs)
+
+
+def liquidar_goles(goles_local, goles_visitante, linea):
+    """Línea de goles: resultado de la apuesta al Over (el Under es el mismo con el signo cambiado)."""
+    if _es_escalar(goles_local, goles_visitante):
+        return liquidar_margen(goles_local + goles_visitante, linea)
+    return liquidar_margen(np.asarray(goles_local) + np.asarray(goles_visitante), linea)
+
+
+def marcadores(resultados) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Textos "goles_local-goles_visitante" -> (goles_local, goles_visitante, válidos).
+    Los que no se pueden leer quedan con 0-0 y válido = False.
+    """
+    goles_local = np.zeros(len(resultados), dtype=np.int64)
+    goles_visitante = np.zeros(len(resultados), dtype=np.int64)
+    validos = np.zeros(len(resultados), dtype=bool)
+    for i, resultado in enumerate(resultados):
+        try:
+            goles_local[i], goles_visitante[i] = map(int, resultado.split('-'))
+            validos[i] = True
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return goles_local, goles_visitante, validos
@@ -0,0 +1,239 @@
+# modules/navegador_playwright.py
+"""
+Navegador Chromium (Playwright) de larga duración para el fallback de la página
+principal.
+
+El navegador vive en el event loop compartido del proceso (modules/bucle_async) y
+mantiene un pool de páginas ya abiertas (cada una en su propio contexto). Cada descarga toma una
+página del pool, navega y espera a que aparezcan las filas de partidos
+(`tr[id^=tr1_]`) o a que la red quede inactiva, en lugar de dormir un tiempo fijo.
+Así un fallback cuesta lo que tarda la navegación, no el arranque del navegador.
+
+El pool tiene siempre PLAYWRIGHT_POOL_SIZE huecos: una página que falla se descarta y
+su hueco vuelve vacío (None); quien lo toma abre una página nueva y, si no puede, el
+navegador se da por caído y se relanza en la siguiente descarga. Ninguna espera es
+indefinida: ni la de un hueco libre ni la de la descarga entera.
+"""
+import asyncio
+import functools
+import os
+import shutil
+from pathlib import Path
+
+from modules import bucle_async, limitador_peticiones
+
+PLAYWRIGHT_POOL_SIZE = int(os.environ.get("PLAYWRIGHT_POOL_SIZE", "2"))
+NAVIGATION_TIMEOUT_MS = 20000
+ROWS_TIMEOUT_MS = 8000
+NETWORK_IDLE_TIMEOUT_MS = 5000
+PLAYWRIGHT_ESPERA_POOL_SECONDS = float(os.environ.get("PLAYWRIGHT_ESPERA_POOL_SECONDS", "30"))
+PLAYWRIGHT_DESCARGA_TIMEOUT_SECONDS = float(os.environ.get("PLAYWRIGHT_DESCARGA_TIMEOUT_SECONDS", "90"))
+MATCH_ROWS_SELECTOR = "tr[id^=tr1_]"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
+
+# Estado del navegador: solo se toca desde el hilo del event loop.
+_playwright = None
+_browser = None
+_paginas_libres = None
+_arranque_lock = None
+
+
+@functools.lru_cache(maxsize=1)
+def resolver_ejecutable_chromium() -> str | None:
+    """Busca el ejecutable de Chromium una sola vez por proceso."""
+    candidates = [
+        os.environ.get("CHROME_BINARY"),
+        shutil.which("chromium"),
+        shutil.which("chromium-browser"),
+        shutil.which("google-chrome"),
+        "/usr/bin/chromium",
+        "/usr/bin/chromium-browser",
+        "/usr/bin/google-chrome",
+    ]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+
+    def _search_in_base(base: Path) -> str | None:
+        if not base.exists():
+            return None
+        search_targets = ("headless_shell", "chrome", "chromium", "chrome-wrapper")
+        for target in search_targets:
+            for candidate in base.rglob(target):
+                try:
+                    if candidate.is_file() and os.access(candidate, os.X_OK):
+                        return str(candidate)
+                except OSError:
+                    continue
+        return None
+
+    pw_path = os.environ.get("PLAYWRIGHT_BROWSERS_PATH")
+    if pw_path:
+        found = _search_in_base(Path(pw_path))
+        if found:
+            return found
+
+    cache_base = Path.home() / ".cache" / "ms-playwright"
+    found = _search_in_base(cache_base)
+    if found:
+        return found
+
+    return None
+
+
+def _obtener_loop() -> asyncio.AbstractEventLoop:
+    """El estado del navegador solo se toca desde el loop compartido."""
+    return bucle_async.obtener_loop()
+
+
+async def _nueva_pagina():
+    context = await _browser.new_context(user_agent=USER_AGENT)
+    return await context.new_page()
+
+
+async def _descartar_navegador(browser):
+    """Da por caído `browser` (si sigue siendo el actual): la siguiente descarga lo relanza."""
+    global _browser
+    if browser is None or browser is not _browser:
+        return
+    _browser = None
+    try:
+        await browser.close()
+    except Exception:
+        pass
+
+
+async def _asegurar_navegador():
+    """
+    Lanza el navegador si todavía no lo está (o si se ha caído). El pool se crea lleno
+    la primera vez y se conserva al relanzar: las páginas del navegador anterior ya
+    están cerradas y cuentan como huecos vacíos.
+    """
+    global _playwright, _browser, _paginas_libres, _arranque_lock
+    if _arranque_lock is None:
+        _arranque_lock = asyncio.Lock()
+    async with _arranque_lock:
+        if _browser is not None and _browser.is_connected():
+            return
+        from playwright.async_api import async_playwright
+
+        if _playwright is None:
+            _playwright = await async_playwright().start()
+        launch_kwargs = {
+            "headless": True,
+            "args": [
+                "--no-sandbox",
+                "--disable-setuid-sandbox",
+                "--disable-dev-shm-usage",
+            ],
+        }
+        chromium_executable = resolver_ejecutable_chromium()
+        if chromium_executable:
+            launch_kwargs["executable_path"] = chromium_executable
+        _browser = await _playwright.chromium.launch(**launch_kwargs)
+        if _paginas_libres is None:
+            _paginas_libres = asyncio.Queue()
+            for _ in range(max(1, PLAYWRIGHT_POOL_SIZE)):
+                try:
+                    page = await _nueva_pagina()
+                except Exception as exc:
+                    print(f"No se pudo abrir una página de Playwright, queda el hueco vacío: {exc}")
+                    page = None
+                _paginas_libres.put_nowait(page)
+            print(f"Navegador Playwright listo con {PLAYWRIGHT_POOL_SIZE} páginas en el pool.")
+        else:
+            print("Navegador Playwright relanzado.")
+
+
+async def _esperar_filas(page):
+    try:
+        await page.wait_for_selector(MATCH_ROWS_SELECTOR, state="attached", timeout=ROWS_TIMEOUT_MS)
+    except Exception:
+        # La página de resultados puede no tener filas todavía: basta con que la red se calme.
+        try:
+            await page.wait_for_load_state("networkidle", timeout=NETWORK_IDLE_TIMEOUT_MS)
+        except Exception:
+            pass
+
+
+async def _tomar_pagina(pool):
+    """Toma un hueco del pool (esperando como mucho PLAYWRIGHT_ESPERA_POOL_SECONDS)."""
+    try:
+        return await asyncio.wait_for(pool.get(), timeout=PLAYWRIGHT_ESPERA_POOL_SECONDS)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Ninguna página de Playwright libre en {PLAYWRIGHT_ESPERA_POOL_SECONDS:g} s") from None
+
+
+async def _descargar(url: str, filter_state: int | None) -> str:
+    await _asegurar_navegador()
+    pool = _paginas_libres
+    page = await _tomar_pagina(pool)
+    try:
+        if page is None or page.is_closed():
+            # Hueco vacío (o página de un navegador anterior): se abre una nueva.
+            page = None
+            browser = _browser
+            try:
+                page = await _nueva_pagina()
+            except Exception:
+                await _descartar_navegador(browser)
+                raise
+        async with limitador_peticiones.peticion(url, medir_latencia=False) as turno:
+            respuesta = await page.goto(url, wait_until="domcontentloaded", timeout=NAVIGATION_TIMEOUT_MS)
+            if respuesta is not None:
+                turno.estado, turno.retry_after = respuesta.status, respuesta.headers.get("retry-after")
+        await _esperar_filas(page)
+        if filter_state is not None:
+            try:
+                # HideByState solo oculta filas en el DOM, es síncrono: no hace falta esperar.
+                await page.evaluate("(state) => { if (typeof HideByState === 'function') { HideByState(state); } }", filter_state)
+            except Exception as eval_err:
+                print(f"Advertencia al aplicar HideByState({filter_state}) en {url}: {eval_err}")
+        return await page.content()
+    except BaseException:
+        # Página en mal estado (o navegación cancelada a medias): se descarta su contexto y
+        # el hueco vuelve vacío; quien lo tome abrirá una nueva.
+        if page is not None:
+            try:
+                await page.context.close()
+            except Exception:
+                pass
+            page = None
+        raise
+    finally:
+        # Siempre vuelve un hueco, con página o sin ella: el pool no encoge.
+        pool.put_nowait(page)
+
+
+async def _descargar_con_limite(url: str, filter_state: int | None) -> str:
+    return await asyncio.wait_for(_descargar(url, filter_state), timeout=PLAYWRIGHT_DESCARGA_TIMEOUT_SECONDS)
+
+
+async def obtener_html_async(url: str, filter_state: int | None = None) -> str:
+    """Versión awaitable desde cualquier event loop (delegando en el del navegador)."""
+    if bucle_async.en_el_bucle():
+        return await _descargar_con_limite(url, filter_state)
+    future = asyncio.run_coroutine_threadsafe(_descargar_con_limite(url, filter_state), _obtener_loop())
+    return await asyncio.wrap_future(future)
+
+
+def obtener_html(url: str, filter_state: int | None = None) -> str:
+    """Descarga `url` con el navegador compartido y devuelve el HTML renderizado."""
+    future = asyncio.run_coroutine_threadsafe(_descargar_con_limite(url, filter_state), _obtener_loop())
+    # El límite ya corre dentro del loop; este margen solo cubre un loop atascado.
+    try:
+        return future.result(timeout=PLAYWRIGHT_DESCARGA_TIMEOUT_SECONDS + 5)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def precalentar():
+    """Lanza el navegador en segundo plano (sin bloquear) para que el primer fallback sea rápido."""
+    future = asyncio.run_coroutine_threadsafe(_asegurar_navegador(), _obtener_loop())
+
+    def _informar(f):
+        if f.exception() is not None:
+            print(f"No se pudo precalentar el navegador Playwright: {f.exception()}")
+
+    future.add_done_callback(_informar)
@@ -0,0 +1,352 @@
+# modules/pagina_h2h.py
+"""
+Modelo de la página /match/h2h-{id} parseada una sola vez.
+
+`construir_pagina_h2h(soup)` recorre una vez cada bloque de la página (tablas
+table_v1/v2/v3, script _matchInfo, fila de cuotas iniciales, clasificación y
+barras de Over/Under) y guarda el resultado en un `H2HPage`. Los extractores de
+estudio_scraper y los módulos de análisis aceptan este objeto en lugar del soup,
+de modo que un estudio deja de recorrer las mismas filas una y otra vez.
+
+Todas esas funciones siguen aceptando un soup: `como_pagina_h2h` construye la
+página al vuelo en ese caso.
+
+Equipos: cada fila guarda el id de NowGoal de sus dos equipos (enlace team(ID)) y la
+página un índice id <-> nombre. Para saber si una fila es de un equipo se compara su
+clave (`clave_equipo`: el id, o "n:<nombre>" si no hay id) en lugar del nombre, así
+que "Team" ya no coincide con "Team U21" ni con "Team B".
+"""
+import re
+from dataclasses import dataclass, field
+from modules.utils import format_ah_as_decimal_string_of
+
+TABLAS_HISTORIAL = ("table_v1", "table_v2", "table_v3")
+_RE_FILA = {table_id: re.compile(rf"tr{table_id[-1]}_\d+") for table_id in TABLAS_HISTORIAL}
+_RE_MATCH_INFO = re.compile(r"var _matchInfo = ")
+_RE_TEAM_ID = re.compile(r"team\((\d+)\)")
+
+
+@dataclass(slots=True)
+class FilaH2H:
+    """Una fila tr{N}_x de las tablas de historial, con sus celdas ya extraídas."""
+    match_id: str | None
+    vs: str | None
+    league_id: str | None
+    n_celdas: int
+    fecha: str = ''
+    # Equipos: texto del enlace (si lo hay) y texto completo de la celda.
+    local: str = ''
+    visitante: str = ''
+    local_texto: str = ''
+    visitante_texto: str = ''
+    marcador_texto: str = ''
+    # (clases, texto) de cada <span> de la celda del marcador, en orden.
+    marcador_spans: list = field(default_factory=list)
+    ah_data_o: str | None = None
+    ah_raw: str | None = None
+    ah_texto: str | None = None
+    # (onclick, texto) de los enlaces con onclick de la fila (equipos).
+    enlaces: list = field(default_factory=list)
+    # Id de NowGoal de cada equipo (None si la celda no trae enlace) y su clave de
+    # comparación, que la página rellena con su índice de equipos.
+    local_id: str | None = None
+    visitante_id: str | None = None
+    clave_local: str | None = None
+    clave_visitante: str | None = None
+    _detalles: dict = field(default_factory=dict, repr=False)
+
+    def marcador_span(self, clase: str, parcial: bool = False) -> str | None:
+        """
+        Texto del primer span del marcador con esa clase. Con `parcial` basta con que
+        alguna clase la contenga (como el selector de get_match_details_from_row_of).
+        """
+        for clases, texto in self.marcador_spans:
+            if (parcial and any(clase in c for c in clases)) or (not parcial and clase in clases):
+                return texto
+        return None
+
+    def team_id(self, posicion: int) -> str | None:
+        if len(self.enlaces) <= posicion:
+            return None
+        m = _RE_TEAM_ID.search(self.enlaces[posicion][0])
+        return m.group(1) if m else None
+
+    def es_de(self, clave: str | None) -> bool:
+        """True si el equipo con esa clave (ver H2HPage.clave) juega este partido."""
+        return clave is not None and clave in (self.clave_local, self.clave_visitante)
+
+    def detalles(self, score_class_selector: str = 'score') -> dict | None:
+        """Mismo diccionario que utils.get_match_details_from_row_of para esta fila."""
+        if score_class_selector not in self._detalles:
+            self._detalles[score_class_selector] = self._calcular_detalles(score_class_selector)
+        return self._detalles[score_class_selector]
+
+    def _calcular_detalles(self, score_class_selector):
+        if self.n_celdas <= 11 or not self.local or not self.visitante:
+            return None
+        score_text = self.marcador_span(score_class_selector, parcial=True)
+        score_raw_text = (score_text if score_text is not None else self.marcador_texto) or ''
+        m = re.search(r'(\d+)\s*-\s*(\d+)', score_raw_text)
+        score_raw, score_fmt = (f"{m.group(1)}-{m.group(2)}", f"{m.group(1)}:{m.group(2)}") if m else ('?-?', '?:?')
+        ah_line_raw = self.ah_raw
+        ah_line_fmt = format_ah_as_decimal_string_of(ah_line_raw) if ah_line_raw not in ['', '-'] else '-'
+        return {
+            'date': self.fecha, 'home': self.local, 'away': self.visitante, 'score': score_fmt,
+            'score_raw': score_raw, 'ahLine': ah_line_fmt, 'ahLine_raw': ah_line_raw or '-',
+            'matchIndex': self.match_id, 'vs': self.vs,
+            'league_id_hist': self.league_id
+        }
+
+
+@dataclass(slots=True)
+class H2HPage:
+    soup: object
+    script_match_info: str | None
+    match_info: dict
+    tablas: dict
+    cuotas_iniciales: dict
+    clasificacion: dict
+    over_under: dict
+    final_score: str
+    terminado: bool     # la cabecera marca el partido como terminado (no basta el marcador)
+    # Índice de equipos de la página: id -> nombre y nombre en minúsculas -> id.
+    equipos: dict = field(default_factory=dict)
+    _ids_por_nombre: dict = field(default_factory=dict, repr=False)
+
+    def filas(self, table_id: str) -> list | None:
+        """Filas de la tabla, o None si la tabla no está en la página."""
+        return self.tablas.get(table_id)
+
+    def clave(self, nombre: str | None, team_id=None) -> str | None:
+        """
+        Clave de comparación de un equipo: su id si se conoce (o la página lo tiene
+        indexado con ese nombre) y, si no, "n:<nombre en minúsculas>".
+        """
+        if team_id:
+            return str(team_id)
+        if not nombre:
+            return None
+        nombre = nombre.strip().lower()
+        return self._ids_por_nombre.get(nombre) or f"n:{nombre}"
+
+    def nombre(self, clave: str | None) -> str | None:
+        """Nombre de un equipo a partir de su clave (None si la página no lo conoce)."""
+        if not clave:
+            return None
+        return clave[2:] if clave.startswith("n:") else self.equipos.get(clave)
+
+    def indexar_equipos(self):
+        """Construye el índice con el partido principal y las filas, y pone la clave a cada fila."""
+        info = self.match_info
+        for team_id, nombre in ((info.get("home_id"), info.get("home_name")), (info.get("away_id"), info.get("away_name"))):
+            if team_id and nombre and nombre != "N/A":
+                self._indexar(team_id, nombre)
+        filas = [fila for table_id in TABLAS_HISTORIAL for fila in self.tablas.get(table_id) or ()]
+        for fila in filas:
+            if fila.local_id:
+                self._indexar(fila.local_id, fila.local)
+            if fila.visitante_id:
+                self._indexar(fila.visitante_id, fila.visitante)
+        for fila in filas:
+            fila.clave_local = self.clave(fila.local, fila.local_id)
+            fila.clave_visitante = self.clave(fila.visitante, fila.visitante_id)
+
+    def _indexar(self, team_id: str, nombre: str):
+        self.equipos.setdefault(team_id, nombre)
+        # El primer id visto para un nombre es el que vale (el partido principal va primero).
+        for texto in (nombre, self.equipos[team_id]):
+            if texto:
+                self._ids_por_nombre.setdefault(texto.strip().lower(), team_id)
+
+
+def clave_equipo(team_id, nombre: str | None) -> str | None:
+    """Clave de un equipo fuera de una página: su id o "n:<nombre en minúsculas>"."""
+    if team_id:
+        return str(team_id)
+    return f"n:{nombre.strip().lower()}" if nombre else None
+
+
+def _team_id(enlace) -> str | None:
+    m = _RE_TEAM_ID.search(enlace.get("onclick") or "") if enlace else None
+    return m.group(1) if m else None
+
+
+def _parse_fila(row) -> FilaH2H:
+    cells = row.find_all('td')
+    fila = FilaH2H(match_id=row.get('index'), vs=row.get('vs'), league_id=row.get('name'), n_celdas=len(cells))
+    fila.enlaces = [(a.get("onclick", ""), a.text.strip()) for a in row.find_all("a", onclick=True)]
+    if len(cells) > 1:
+        date_span = cells[1].find('span', attrs={'name': 'timeData'})
+        fila.fecha = date_span.get_text(strip=True) if date_span else ''
+    if len(cells) > 4:
+        fila.local_texto = cells[2].get_text(strip=True)
+        fila.visitante_texto = cells[4].get_text(strip=True)
+        a_local, a_visitante = cells[2].find('a'), cells[4].find('a')
+        fila.local = a_local.get_text(strip=True) if a_local else fila.local_texto
+        fila.visitante = a_visitante.get_text(strip=True) if a_visitante else fila.visitante_texto
+        fila.local_id, fila.visitante_id = _team_id(a_local), _team_id(a_visitante)
+        fila.marcador_texto = cells[3].get_text(strip=True)
+        fila.marcador_spans = [(tuple(span.get('class') or ()), span.get_text(strip=True)) for span in cells[3].find_all('span')]
+    if len(cells) > 11:
+        ah_cell = cells[11]
+        fila.ah_data_o = ah_cell.get('data-o')
+        fila.ah_raw = (fila.ah_data_o or ah_cell.text).strip()
+        fila.ah_texto = ah_cell.get_text(strip=True)
+    return fila
+
+
+def _parse_match_info(content: str | None) -> dict:
+    info = {"home_id": None, "away_id": None, "league_id": None,
+            "home_name": "N/A", "away_name": "N/A", "league_name": "N/A"}
+    if not content:
+        return info
+
+    def find_val(pattern):
+        match = re.search(pattern, content)
+        return match.group(1).replace("'", "") if match else None
+    info.update({
+        "home_id": find_val(r"hId:\s*parseInt\('(\d+)'\)"),
+        "away_id": find_val(r"gId:\s*parseInt\('(\d+)'\)"),
+        "league_id": find_val(r"sclassId:\s*parseInt\('(\d+)'\)"),
+        "home_name": find_val(r"hName:\s*'([^']*)'") or "N/A",
+        "away_name": find_val(r"gName:\s*'([^']*)'") or "N/A",
+        "league_name": find_val(r"lName:\s*'([^']*)'") or "N/A",
+    })
+    return info
+
+
+def _parse_cuotas_iniciales(soup) -> dict:
+    odds_info = {
+        "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
+        "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"
+    }
+    bet365_row = soup.select_one("tr#tr_o_1_8[name='earlyOdds'], tr#tr_o_1_31[name='earlyOdds']")
+    if not bet365_row:
+        return odds_info
+    tds = bet365_row.find_all("td")
+    if len(tds) >= 11:
+        odds_info["ah_home_cuota"] = tds[2].get("data-o", tds[2].text).strip()
+        odds_info["ah_linea_raw"] = tds[3].get("data-o", tds[3].text).strip()
+        odds_info["ah_away_cuota"] = tds[4].get("data-o", tds[4].text).strip()
+        odds_info["goals_over_cuota"] = tds[8].get("data-o", tds[8].text).strip()
+        odds_info["goals_linea_raw"] = tds[9].get("data-o", tds[9].text).strip()
+        odds_info["goals_under_cuota"] = tds[10].get("data-o", tds[10].text).strip()
+    return odds_info
+
+
+def _parse_tabla_clasificacion(team_table_soup, is_home_table: bool) -> dict:
+    data = {}
+    header_link = team_table_soup.find("a")
+    if header_link:
+        full_text = header_link.get_text(separator=" ", strip=True)
+        rank_match = re.search(r'\[.*?-(\d+)\]', full_text)
+        if rank_match:
+            data["ranking"] = rank_match.group(1)
+    is_ft_section = False
+    for row in team_table_soup.find_all("tr", align="center"):
+        header_cell = row.find("th")
+        if header_cell:
+            header_text = header_cell.get_text(strip=True)
+            if "FT" in header_text:
+                is_ft_section = True
+            elif "HT" in header_text:
+                is_ft_section = False
+            continue
+        if is_ft_section and len(cells := row.find_all("td")) >= 7:
+            row_type_element = cells[0].find("span") or cells[0]
+            row_type = row_type_element.get_text(strip=True)
+            pj, v, e, d, gf, gc = [cell.get_text(strip=True) for cell in cells[1:7]]
+            if row_type == "Total":
+                data.update({"total_pj": pj, "total_v": v, "total_e": e,
+                             "total_d": d, "total_gf": gf, "total_gc": gc})
+            if row_type == ("Home" if is_home_table else "Away"):
+                data.update({"specific_pj": pj, "specific_v": v, "specific_e": e,
+                             "specific_d": d, "specific_gf": gf, "specific_gc": gc})
+    return data
+
+
+def _parse_clasificacion(soup) -> dict:
+    """
+    Para cada bloque (home-div / guest-div) guarda su texto en minúsculas, para
+    saber a qué equipo corresponde, y los datos de su tabla (None si no la tiene).
+    """
+    clasificacion = {"home": None, "guest": None}
+    standings_section = soup.find("div", id="porletP4")
+    if not standings_section:
+        return clasificacion
+    for lado, clase_div, clase_tabla in (("home", "home-div", "team-table-home"), ("guest", "guest-div", "team-table-guest")):
+        div = standings_section.find("div", class_=clase_div)
+        if not div:
+            continue
+        tabla = div.find("table", class_=clase_tabla)
+        clasificacion[lado] = {
+            "texto": div.get_text(strip=True).lower(),
+            "datos": _parse_tabla_clasificacion(tabla, lado == "home") if tabla else None,
+        }
+    return clasificacion
+
+
+def _parse_over_under(table) -> dict:
+    default_stats = {"over_pct": 0, "under_pct": 0, "push_pct": 0, "total": 0}
+    if not table:
+        return default_stats
+    y_bar = table.find("ul", class_="y-bar")
+    if not y_bar:
+        return default_stats
+    ou_group = None
+    for group in y_bar.find_all("li", class_="group"):
+        if "Over/Under Odds" in group.get_text():
+            ou_group = group
+            break
+    if not ou_group:
+        return default_stats
+    try:
+        total_text = ou_group.find("div", class_="tit").find("span").get_text(strip=True)
+        total_match = re.search(r'\((\d+)\s*games\)', total_text)
+        total = int(total_match.group(1)) if total_match else 0
+        values = ou_group.find_all("span", class_="value")
+        if len(values) == 3:
+            over_pct_text = values[0].get_text(strip=True).replace('%', '')
+            push_pct_text = values[1].get_text(strip=True).replace('%', '')
+            under_pct_text = values[2].get_text(strip=True).replace('%', '')
+            return {"over_pct": float(over_pct_text), "under_pct": float(under_pct_text), "push_pct": float(push_pct_text), "total": total}
+    except (ValueError, TypeError, AttributeError):
+        return default_stats
+    return default_stats
+
+
+def construir_pagina_h2h(soup) -> H2HPage:
+    """Recorre la página una sola vez y devuelve el modelo con todo lo que usan los extractores."""
+    from modules.utils import extract_final_score_of, is_match_finished_of
+
+    script_tag = soup.find("script", string=_RE_MATCH_INFO)
+    script_match_info = script_tag.string if script_tag and script_tag.string else None
+
+    tablas = {}
+    elementos_tabla = {}
+    for table_id in TABLAS_HISTORIAL:
+        table = soup.find("table", id=table_id)
+        elementos_tabla[table_id] = table
+        if table is not None:
+            tablas[table_id] = [_parse_fila(row) for row in table.find_all("tr", id=_RE_FILA[table_id])]
+
+    pagina = H2HPage(
+        soup=soup,
+        script_match_info=script_match_info,
+        match_info=_parse_match_info(script_match_info),
+        tablas=tablas,
+        cuotas_iniciales=_parse_cuotas_iniciales(soup),
+        clasificacion=_parse_clasificacion(soup),
+        over_under={"home": _parse_over_under(elementos_tabla["table_v1"]), "away": _parse_over_under(elementos_tabla["table_v2"])},
+        final_score=extract_final_score_of(soup),
+        terminado=is_match_finished_of(soup),
+    )
+    pagina.indexar_equipos()
+    return pagina
+
+
+def como_pagina_h2h(soup_o_pagina) -> H2HPage | None:
+    """Acepta un H2HPage (se devuelve tal cual) o un soup de la página h2h (se parsea)."""
+    if soup_o_pagina is None or isinstance(soup_o_pagina, H2HPage):
+        return soup_o_pagina
+    return construir_pagina_h2h(soup_o_pagina)
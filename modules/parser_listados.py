@@ -0,0 +1,206 @@
+# modules/parser_listados.py
+"""
+Extracción rápida de las filas `tr1_*` de la página principal y de resultados.
+
+Las páginas pesan ~3 MB y construir el árbol completo de BeautifulSoup solo para
+leer unas pocas celdas por fila era la parte más cara del listado. Aquí se recorre
+el HTML con expresiones regulares: se localiza cada `<tr id="tr1_...">` (saltando
+scripts, estilos y comentarios), se corta hasta su `</tr>` y de ese trozo se sacan
+solo `data-t`, `odds`, `state`, los enlaces de los equipos y la celda del marcador.
+
+El resultado tiene que ser idéntico al de la versión con BeautifulSoup
+(html.parser). Si una fila no tiene la forma esperada (filas o celdas anidadas,
+etiquetas sin cerrar, scripts dentro de la fila...) no se intenta adivinar cómo la
+habría reconstruido html.parser: se parsea la página entera con BeautifulSoup.
+"""
+import re
+from dataclasses import dataclass
+from html import unescape
+
+from bs4 import BeautifulSoup
+
+# Nombre y valor de atributo con la misma gramática tolerante de html.parser.
+_RE_ATRIBUTO = re.compile(
+    r"""((?<=['"\s/])[^\s/>][^\s/=>]*)(\s*=+\s*('[^']*'|"[^"]*"|(?!['"])[^>\s]*))?(?:\s|/(?!>))*"""
+)
+_ATRIBUTOS = r"""(?:[\s/]*(?:(?<=['"\s/])[^\s/>][^\s/=>]*(?:\s*=+\s*(?:'[^']*'|"[^"]*"|(?!['"])[^>\s]*)\s*)?(?:\s|/(?!>))*)*)?\s*"""
+
+# En la página solo interesan los <tr>; scripts, estilos y comentarios se saltan
+# enteros porque html.parser tampoco ve etiquetas dentro de ellos.
+_RE_PAGINA = re.compile(
+    r"<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>|<tr(?=[\s/>])(" + _ATRIBUTOS + r")>",
+    re.IGNORECASE | re.DOTALL,
+)
+_RE_FIN_TR = re.compile(r"</tr\s*>", re.IGNORECASE)
+_RE_TD = re.compile(r"<td(?=[\s/>])(" + _ATRIBUTOS + r")>", re.IGNORECASE)
+_RE_A = re.compile(r"<a(?=[\s/>])(" + _ATRIBUTOS + r")>", re.IGNORECASE)
+_RE_B = re.compile(r"<b(?=[\s/>])" + _ATRIBUTOS + r">", re.IGNORECASE)
+_RE_FIN_TD = re.compile(r"</td\s*>", re.IGNORECASE)
+_RE_FIN_A = re.compile(r"</a\s*>", re.IGNORECASE)
+_RE_FIN_B = re.compile(r"</b\s*>", re.IGNORECASE)
+_RE_ETIQUETA = re.compile(r"<[^>]*>")
+# Cualquier cosa que html.parser trataría distinto a un corte plano de la fila.
+_RE_FILA_IRREGULAR = re.compile(r"<(?:tr|table|script|style|textarea|title)(?=[\s/>])|<!|<\?", re.IGNORECASE)
+_RE_TD_DENTRO = re.compile(r"<td(?=[\s/>])", re.IGNORECASE)
+_RE_A_DENTRO = re.compile(r"<a(?=[\s/>])|</t[dr]\s*>", re.IGNORECASE)
+_RE_B_DENTRO = re.compile(r"<b(?=[\s/>])|</t[dr]\s*>", re.IGNORECASE)
+
+
+class _FilaIrregular(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class FilaListado:
+    """Lo que usan los listados de cada fila `tr1_*`."""
+    match_id: str
+    state: str | None
+    odds: str
+    data_t: str | None        # data-t de la primera celda timeData (None si no hay)
+    local: str | None         # texto del enlace team1_<id> ya sin espacios (None si no hay)
+    visitante: str | None
+    n_celdas: int
+    marcador: str | None      # texto de la 7ª celda (None si la fila tiene menos)
+
+
+def _atributos(texto: str) -> dict:
+    atributos = {}
+    for m in _RE_ATRIBUTO.finditer(" " + texto):
+        nombre, valor = m.group(1), m.group(3)
+        if valor is None:
+            valor = ""
+        elif valor[:1] == valor[-1:] and valor[:1] in ("'", '"'):
+            valor = valor[1:-1]
+        # Con atributos repetidos BeautifulSoup se queda con el último.
+        atributos[nombre.lower()] = unescape(valor)
+    return atributos
+
+
+def _texto(fragmento: str) -> str:
+    return unescape(_RE_ETIQUETA.sub("", fragmento))
+
+
+def _texto_strip(fragmento: str) -> str:
+    """Equivale a get_text(strip=True): cada nodo de texto sin espacios, todo junto."""
+    return "".join(t for t in (unescape(p).strip() for p in _RE_ETIQUETA.split(fragmento)) if t)
+
+
+def _contenido(cuerpo: str, inicio: int, re_fin, re_dentro) -> str:
+    fin = re_fin.search(cuerpo, inicio)
+    if not fin:
+        raise _FilaIrregular
+    dentro = re_dentro.search(cuerpo, inicio, fin.start())
+    if dentro:
+        raise _FilaIrregular
+    return cuerpo[inicio:fin.start()]
+
+
+def _texto_enlace(cuerpo: str, enlace_id: str) -> str | None:
+    for m in _RE_A.finditer(cuerpo):
+        if enlace_id in m.group(1) and _atributos(m.group(1)).get("id") == enlace_id:
+            return _texto(_contenido(cuerpo, m.end(), _RE_FIN_A, _RE_A_DENTRO)).strip()
+    return None
+
+
+def _fila_desde_fragmento(atributos: dict, cuerpo: str) -> FilaListado:
+    match_id = atributos.get("id", "").replace("tr1_", "")
+    celdas = list(_RE_TD.finditer(cuerpo))
+
+    data_t = None
+    for m in celdas:
+        if "timeData" in m.group(1):
+            attrs_td = _atributos(m.group(1))
+            if attrs_td.get("name") == "timeData":
+                data_t = attrs_td.get("data-t")
+                break
+
+    marcador = None
+    if len(celdas) > 6:
+        celda = _contenido(cuerpo, celdas[6].end(), _RE_FIN_TD, _RE_TD_DENTRO)
+        b = _RE_B.search(celda)
+        if b:
+            marcador = _texto(_contenido(celda, b.end(), _RE_FIN_B, _RE_B_DENTRO)).strip()
+        else:
+            marcador = _texto_strip(celda)
+
+    return FilaListado(
+        match_id=match_id,
+        state=atributos.get("state"),
+        odds=atributos.get("odds", ""),
+        data_t=data_t,
+        local=_texto_enlace(cuerpo, f"team1_{match_id}") if match_id else None,
+        visitante=_texto_enlace(cuerpo, f"team2_{match_id}") if match_id else None,
+        n_celdas=len(celdas),
+        marcador=marcador,
+    )
+
+
+def fragmentos_filas(html: str, estricto: bool = True):
+    """
+    Generador de (atributos del <tr>, HTML interior) de cada fila `tr1_*`, sin parsear
+    las celdas. Con `estricto` una fila irregular (ver _RE_FILA_IRREGULAR) lanza
+    _FilaIrregular; sin él se entrega tal cual, cortada hasta el primer </tr>.
+    """
+    for m in _RE_PAGINA.finditer(html):
+        atributos_tr = m.group(1)
+        if atributos_tr is None or "tr1_" not in atributos_tr:
+            continue
+        atributos = _atributos(atributos_tr)
+        if not atributos.get("id", "").startswith("tr1_"):
+            continue
+        fin = _RE_FIN_TR.search(html, m.end())
+        if not fin:
+            if estricto:
+                raise _FilaIrregular
+            continue
+        cuerpo = html[m.end():fin.start()]
+        if estricto and _RE_FILA_IRREGULAR.search(cuerpo):
+            raise _FilaIrregular
+        yield atributos, cuerpo
+
+
+def fila_listado(atributos: dict, cuerpo: str) -> FilaListado | None:
+    """FilaListado de un fragmento de fragmentos_filas(), o None si la fila es irregular."""
+    try:
+        return _fila_desde_fragmento(atributos, cuerpo)
+    except _FilaIrregular:
+        return None
+
+
+def _filas_rapidas(html: str) -> list[FilaListado]:
+    return [_fila_desde_fragmento(atributos, cuerpo) for atributos, cuerpo in fragmentos_filas(html)]
+
+
+def _filas_con_bs4(html: str) -> list[FilaListado]:
+    soup = BeautifulSoup(html, 'html.parser')
+    filas = []
+    for row in soup.find_all('tr', id=lambda x: x and x.startswith('tr1_')):
+        match_id = row.get('id', '').replace('tr1_', '')
+        time_cell = row.find('td', {'name': 'timeData'})
+        cells = row.find_all('td')
+        marcador = None
+        if len(cells) > 6:
+            b_tag = cells[6].find('b')
+            marcador = b_tag.text.strip() if b_tag else cells[6].get_text(strip=True)
+        home_team_tag = row.find('a', {'id': f'team1_{match_id}'}) if match_id else None
+        away_team_tag = row.find('a', {'id': f'team2_{match_id}'}) if match_id else None
+        filas.append(FilaListado(
+            match_id=match_id,
+            state=row.get('state'),
+            odds=row.get('odds', ''),
+            data_t=time_cell['data-t'] if time_cell and time_cell.has_attr('data-t') else None,
+            local=home_team_tag.text.strip() if home_team_tag else None,
+            visitante=away_team_tag.text.strip() if away_team_tag else None,
+            n_celdas=len(cells),
+            marcador=marcador,
+        ))
+    return filas
+
+
+def extraer_filas_partidos(html: str) -> list[FilaListado]:
+    """Todas las filas `tr1_*` de la página, en el orden del documento."""
+    try:
+        return _filas_rapidas(html)
+    except _FilaIrregular:
+        print("parser_listados: HTML con filas irregulares, se usa BeautifulSoup.")
+        return _filas_con_bs4(html)
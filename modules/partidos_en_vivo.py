@@ -0,0 +1,242 @@
+# modules/partidos_en_vivo.py
+"""
+Seguimiento de los partidos en juego de la página principal de NowGoal.
+
+- Parser: las filas `tr1_*` se localizan con parser_listados.fragmentos_filas y solo
+  se parsean las que están en juego (atributo `state` de 1 a 5). Cada fila se
+  resume en un hash de su HTML; si no ha cambiado desde la última lectura, ni se
+  vuelve a parsear ni cuenta como cambio.
+- Tabla en memoria: {match_id: PartidoEnVivo} con marcador, minuto y cuotas. Cada
+  actualización que cambia algo sube la versión y apunta los cambios (fila nueva o
+  modificada, o fila que sale porque el partido ha terminado o ya no aparece).
+- Refresco: un hilo descarga la página cada LIVE_REFRESH_SECONDS, pero solo mientras
+  haya alguien suscrito (la ruta SSE /api/live/stream); sin clientes no se pide nada.
+
+Los clientes piden `cambios_desde(version)`; si se han quedado demasiado atrás
+(más de LIVE_CAMBIOS_MAX cambios) reciben None y deben pedir la tabla completa.
+"""
+import collections
+import contextlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict, field
+from html import unescape
+
+import requests
+
+from modules import cliente_http, parser_listados
+
+LIVE_URL = os.environ.get("LIVE_URL", "https://live20.nowgoal25.com/")
+LIVE_REFRESH_SECONDS = float(os.environ.get("LIVE_REFRESH_SECONDS", "10"))
+LIVE_CAMBIOS_MAX = int(os.environ.get("LIVE_CAMBIOS_MAX", "2000"))
+
+# state de la fila: 1 primera parte, 2 descanso, 3 segunda parte, 4 prórroga, 5 penaltis.
+ESTADOS_EN_JUEGO = frozenset({"1", "2", "3", "4", "5"})
+
+_RE_ETIQUETA = re.compile(r"<[^>]*>")
+
+
+def _re_celda(prefijo: str):
+    return re.compile(r"<(td|span)\b[^>]*\bid=\"" + prefijo + r"_(\d+)\"[^>]*>(.*?)</\1\s*>", re.IGNORECASE | re.DOTALL)
+
+
+_RE_MINUTO = _re_celda("got")
+_RE_ESTADO = _re_celda("time")
+_RE_DESCANSO = _re_celda("hht")
+_RE_CORNERS = _re_celda("cr")
+_RE_LIGA = re.compile(r"<td\b[^>]*\bclass=\"black-down\"[^>]*\btitle=\"([^\"]*)\"", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class PartidoEnVivo:
+    """Una fila en juego de la página principal."""
+    match_id: str
+    state: str
+    minuto: str
+    marcador: str
+    descanso: str
+    corners: str
+    local: str
+    visitante: str
+    liga: str
+    hora_inicio: str | None
+    cuotas: dict = field(default_factory=dict)
+
+
+def _texto(fragmento: str) -> str:
+    return unescape(_RE_ETIQUETA.sub("", fragmento)).strip()
+
+
+def _celda(patron, cuerpo: str, match_id: str) -> str:
+    for m in patron.finditer(cuerpo):
+        if m.group(2) == match_id:
+            return _texto(m.group(3))
+    return ""
+
+
+def _cuotas(odds: str) -> dict:
+    """Campos de la lista `odds` de la fila (mismas posiciones que usan los listados)."""
+    valores = odds.split(",")
+
+    def valor(i):
+        return valores[i] if len(valores) > i and valores[i] != "" else None
+
+    return {
+        "ah": valor(2), "ah_local": valor(3), "ah_visitante": valor(4),
+        "1x2_local": valor(6), "1x2_empate": valor(7), "1x2_visitante": valor(8),
+        "goles": valor(10), "over": valor(11), "under": valor(12),
+    }
+
+
+def _parsear_fila(atributos: dict, cuerpo: str) -> PartidoEnVivo:
+    match_id = atributos["id"].replace("tr1_", "")
+    fila = parser_listados.fila_listado(atributos, cuerpo)
+    if fila is not None:
+        marcador, local, visitante, hora_inicio = fila.marcador or "", fila.local or "", fila.visitante or "", fila.data_t
+    else:
+        marcador = local = visitante = ""
+        hora_inicio = None
+    # El minuto va en <span id="got_ID"> ("45+4"); en el descanso solo está el texto de la celda ("HT").
+    minuto = _celda(_RE_MINUTO, cuerpo, match_id) or _celda(_RE_ESTADO, cuerpo, match_id)
+    liga = _RE_LIGA.search(cuerpo)
+    return PartidoEnVivo(
+        match_id=match_id,
+        state=atributos.get("state", ""),
+        minuto=minuto,
+        marcador=marcador,
+        descanso=_celda(_RE_DESCANSO, cuerpo, match_id),
+        corners=_celda(_RE_CORNERS, cuerpo, match_id),
+        local=local,
+        visitante=visitante,
+        liga=unescape(liga.group(1)) if liga else "",
+        hora_inicio=hora_inicio,
+        cuotas=_cuotas(atributos.get("odds", "")),
+    )
+
+
+def parsear_en_vivo(html: str, anteriores: dict | None = None) -> tuple[dict, int]:
+    """
+    Filas en juego de la página: ({match_id: (hash, PartidoEnVivo)}, filas parseadas).
+    Las filas cuyo hash coincide con el de `anteriores` se reutilizan sin parsear.
+    """
+    anteriores = anteriores or {}
+    filas = {}
+    parseadas = 0
+    for atributos, cuerpo in parser_listados.fragmentos_filas(html, estricto=False):
+        if atributos.get("state") not in ESTADOS_EN_JUEGO:
+            continue
+        match_id = atributos["id"].replace("tr1_", "")
+        # hash() de str basta: solo se compara dentro del mismo proceso.
+        huella = hash((atributos.get("state"), atributos.get("odds"), cuerpo))
+        previa = anteriores.get(match_id)
+        if previa is not None and previa[0] == huella:
+            filas[match_id] = previa
+            continue
+        filas[match_id] = (huella, _parsear_fila(atributos, cuerpo))
+        parseadas += 1
+    return filas, parseadas
+
+
+_tabla = {}
+_version = 0
+_cambios = collections.deque(maxlen=LIVE_CAMBIOS_MAX)
+_cond = threading.Condition()
+_suscriptores = 0
+_hilo = None
+_estadisticas = {"refrescos": 0, "errores": 0, "filas_parseadas": 0, "filas_reutilizadas": 0, "ultimo_refresco": None}
+
+
+def actualizar(html: str) -> list[dict]:
+    """Aplica una lectura de la página a la tabla y devuelve los cambios (vacío si no hay)."""
+    global _version
+    with _cond:
+        anteriores = dict(_tabla)
+    filas, parseadas = parsear_en_vivo(html, anteriores)
+    cambios = [asdict(partido) for match_id, (huella, partido) in filas.items()
+               if match_id not in anteriores or anteriores[match_id][0] != huella]
+    cambios += [{"match_id": match_id, "removed": True} for match_id in anteriores if match_id not in filas]
+    with _cond:
+        _tabla.clear()
+        _tabla.update(filas)
+        _estadisticas["refrescos"] += 1
+        _estadisticas["filas_parseadas"] += parseadas
+        _estadisticas["filas_reutilizadas"] += len(filas) - parseadas
+        _estadisticas["ultimo_refresco"] = time.time()
+        if cambios:
+            _version += 1
+            for cambio in cambios:
+                _cambios.append((_version, cambio))
+            _cond.notify_all()
+    return cambios
+
+
+def instantanea() -> tuple[int, list[dict]]:
+    """(versión, todas las filas en juego)."""
+    with _cond:
+        return _version, [asdict(partido) for _, partido in _tabla.values()]
+
+
+def cambios_desde(version: int) -> tuple[int, list[dict]] | None:
+    """
+    (versión actual, cambios posteriores a `version`). Si un mismo partido cambió varias
+    veces solo se entrega el último estado. None si esos cambios ya no se conservan.
+    """
+    with _cond:
+        # La versión más antigua que queda puede estar incompleta (el deque corta por cambios).
+        if version < _version and (not _cambios or _cambios[0][0] > version):
+            return None
+        ultimos = {}
+        for v, cambio in _cambios:
+            if v > version:
+                ultimos[cambio["match_id"]] = cambio
+        return _version, list(ultimos.values())
+
+
+def esperar_version(version: int, timeout: float) -> int:
+    """Bloquea hasta que la tabla pase de `version` o venza `timeout`; devuelve la versión actual."""
+    with _cond:
+        _cond.wait_for(lambda: _version > version, timeout)
+        return _version
+
+
+@contextlib.contextmanager
+def suscripcion():
+    """Mientras dure, el hilo de refresco mantiene la tabla al día."""
+    global _suscriptores, _hilo
+    with _cond:
+        _suscriptores += 1
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle_refresco, name="partidos-en-vivo", daemon=True)
+            _hilo.start()
+        _cond.notify_all()
+    try:
+        yield
+    finally:
+        with _cond:
+            _suscriptores -= 1
+
+
+def _bucle_refresco():
+    while True:
+        with _cond:
+            _cond.wait_for(lambda: _suscriptores > 0)
+        inicio = time.monotonic()
+        try:
+            actualizar(cliente_http.obtener_html(LIVE_URL, timeout=10))
+        except requests.RequestException as exc:
+            with _cond:
+                _estadisticas["errores"] += 1
+            print(f"Partidos en vivo: no se pudo descargar la página ({type(exc).__name__}).")
+        except Exception as exc:
+            with _cond:
+                _estadisticas["errores"] += 1
+            print(f"Partidos en vivo: error al actualizar la tabla: {exc}")
+        time.sleep(max(0.0, LIVE_REFRESH_SECONDS - (time.monotonic() - inicio)))
+
+
+def estado_en_vivo() -> dict:
+    """Resumen del seguimiento (para diagnóstico)."""
+    with _cond:
+        return {"matches": len(_tabla), "version": _version, "subscribers": _suscriptores, **_estadisticas}
@@ -0,0 +1,406 @@
+# modules/pool_selenium.py
+"""
+Pool acotado de drivers de Chrome (Selenium) ya arrancados.
+
+Cada estudio toma un driver del pool y lo devuelve al terminar, en lugar de
+lanzar y cerrar Chrome en cada petición. El pool:
+- limita el número de Chrome vivos (SELENIUM_POOL_SIZE); si todos están ocupados
+  los llamantes esperan en cola,
+- comprueba que el driver responde antes de entregarlo,
+- recicla cada driver tras SELENIUM_DRIVER_MAX_USES usos o si la memoria de su
+  árbol de procesos crece más de SELENIUM_DRIVER_MAX_RSS_GROWTH_MB,
+- al descartar un driver, mata los procesos de ese driver que sigan vivos, y al
+  arrancar, los que dejaron workers ya muertos; solo procesos que el pool registró
+  como suyos (SELENIUM_PIDS_DIR), nunca los de otro worker.
+
+Selenium se importa al crear el primer driver, no al importar el módulo: los workers
+que solo sirven listados o estudios en caché no llegan a cargarlo.
+"""
+import json
+import os
+import shutil
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+SELENIUM_POOL_SIZE = int(os.environ.get("SELENIUM_POOL_SIZE", "2"))
+SELENIUM_DRIVER_MAX_USES = int(os.environ.get("SELENIUM_DRIVER_MAX_USES", "30"))
+SELENIUM_DRIVER_MAX_RSS_GROWTH_MB = int(os.environ.get("SELENIUM_DRIVER_MAX_RSS_GROWTH_MB", "400"))
+SELENIUM_POOL_WAIT_SECONDS = float(os.environ.get("SELENIUM_POOL_WAIT_SECONDS", "90"))
+SELENIUM_PIDS_DIR = os.environ.get(
+    "SELENIUM_PIDS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "selenium_pids"),
+)
+
+_CHROME_PROCESS_NAMES = ("chrome", "chromium", "chromium-browse", "chromedriver", "headless_shell")
+
+_libres = []
+_total = 0
+_cond = threading.Condition()
+
+_procesos_registrados = {}
+_registro_lock = threading.Lock()
+_limpieza_hecha = False
+
+
+def _resolve_chromium_binary():
+    candidates = [
+        os.environ.get("CHROME_BINARY"),
+        shutil.which("chromium"),
+        shutil.which("chromium-browser"),
+        shutil.which("google-chrome"),
+        "/usr/bin/chromium",
+        "/usr/bin/chromium-browser",
+        "/usr/bin/google-chrome",
+    ]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _resolve_chromedriver_path():
+    candidates = [
+        os.environ.get("CHROMEDRIVER_PATH"),
+        shutil.which("chromedriver"),
+        "/usr/bin/chromedriver",
+        "/usr/local/bin/chromedriver",
+    ]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _create_chrome_driver(options):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    binary_location = _resolve_chromium_binary()
+    if binary_location:
+        options.binary_location = binary_location
+
+    driver_path = _resolve_chromedriver_path()
+    if driver_path:
+        service = Service(driver_path)
+        return webdriver.Chrome(service=service, options=options)
+
+    return webdriver.Chrome(options=options)
+
+
+def _opciones_headless():
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+
+    options = ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    return options
+
+
+# --- Utilidades de /proc (solo Linux; en otros sistemas no hacen nada) ---
+
+def _leer_stat(pid: int):
+    """Devuelve (nombre, ppid, inicio) del proceso o None si ya no existe. `inicio` es la
+    hora de arranque en ticks desde el boot: junto al pid identifica al proceso aunque
+    el pid se reutilice."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            contenido = f.read()
+    except OSError:
+        return None
+    # El nombre va entre paréntesis y puede contener espacios.
+    nombre = contenido[contenido.find("(") + 1:contenido.rfind(")")]
+    campos = contenido[contenido.rfind(")") + 2:].split()
+    return nombre, int(campos[1]), int(campos[19])
+
+
+def _pids_del_sistema():
+    if not os.path.isdir("/proc"):
+        return []
+    return [int(p) for p in os.listdir("/proc") if p.isdigit()]
+
+
+def _arbol(pid_raiz: int | None) -> dict:
+    """{pid: inicio} de un proceso y todos sus descendientes."""
+    if not pid_raiz:
+        return {}
+    hijos, inicios = {}, {}
+    for pid in _pids_del_sistema():
+        stat = _leer_stat(pid)
+        if stat:
+            hijos.setdefault(stat[1], []).append(pid)
+            inicios[pid] = stat[2]
+    arbol = {}
+    pendientes = [pid_raiz]
+    while pendientes:
+        pid = pendientes.pop()
+        if pid in inicios:
+            arbol[pid] = inicios[pid]
+            pendientes.extend(hijos.get(pid, []))
+    return arbol
+
+
+def _rss_mb(procesos: dict) -> float:
+    """Memoria residente (MB) de los procesos de `procesos` ({pid: inicio})."""
+    total_kb = 0
+    for pid in procesos:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total_kb += int(linea.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024.0
+
+
+def _matar(procesos: dict) -> int:
+    """Mata los procesos de `procesos` ({pid: inicio}) que siguen vivos y son los mismos."""
+    eliminados = 0
+    for pid, inicio in procesos.items():
+        stat = _leer_stat(pid)
+        if not stat or stat[2] != inicio or not stat[0].startswith(_CHROME_PROCESS_NAMES):
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            eliminados += 1
+        except OSError:
+            continue
+    return eliminados
+
+
+# --- Registro de los procesos de Chrome de este pool ---
+# Cada worker apunta en SELENIUM_PIDS_DIR/<pid>.json los procesos (chromedriver,
+# navegador y sus ayudantes) de los drivers que ha arrancado. Así solo se mata lo que es
+# de este pool, nunca los Chrome de otro worker vivo (el crashpad handler de Chrome
+# queda adoptado por init aunque su navegador siga en marcha).
+
+def _fichero_registro(pid: int) -> str:
+    return os.path.join(SELENIUM_PIDS_DIR, f"{pid}.json")
+
+
+def _guardar_registro():
+    """Reescribe el fichero de este proceso. Se llama con _registro_lock tomado."""
+    propio = _leer_stat(os.getpid())
+    registro = {
+        "inicio": propio[2] if propio else None,
+        "procesos": [[pid, inicio] for procesos in _procesos_registrados.values() for pid, inicio in procesos.items()],
+    }
+    ruta = _fichero_registro(os.getpid())
+    try:
+        os.makedirs(SELENIUM_PIDS_DIR, exist_ok=True)
+        with open(ruta + ".tmp", "w") as f:
+            json.dump(registro, f)
+        os.replace(ruta + ".tmp", ruta)
+    except OSError as exc:
+        print(f"Pool Selenium: no se pudo guardar el registro de procesos: {exc}")
+
+
+def _registrar(entrada, procesos: dict):
+    with _registro_lock:
+        entrada["procesos"].update(procesos)
+        _procesos_registrados[id(entrada)] = entrada["procesos"]
+        _guardar_registro()
+
+
+def _olvidar(entrada):
+    with _registro_lock:
+        if _procesos_registrados.pop(id(entrada), None) is not None:
+            _guardar_registro()
+
+
+def limpiar_chrome_huerfanos() -> int:
+    """
+    Una vez por proceso, al arrancar el pool: mata los Chrome/chromedriver que dejaron
+    los pools de workers ya muertos (según sus ficheros de registro) y borra esos
+    ficheros. Los de workers vivos no se tocan.
+    """
+    global _limpieza_hecha
+    with _registro_lock:
+        if _limpieza_hecha:
+            return 0
+        _limpieza_hecha = True
+    try:
+        ficheros = os.listdir(SELENIUM_PIDS_DIR)
+    except OSError:
+        return 0
+    eliminados = 0
+    for nombre in ficheros:
+        dueno = nombre[:-len(".json")]
+        if not nombre.endswith(".json") or not dueno.isdigit() or int(dueno) == os.getpid():
+            continue
+        ruta = os.path.join(SELENIUM_PIDS_DIR, nombre)
+        try:
+            with open(ruta, "r") as f:
+                registro = json.load(f)
+        except (OSError, ValueError):
+            continue
+        stat = _leer_stat(int(dueno))
+        if stat is not None and stat[2] == registro.get("inicio"):
+            continue
+        eliminados += _matar({int(pid): inicio for pid, inicio in registro.get("procesos", [])})
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    if eliminados:
+        print(f"Pool Selenium: eliminados {eliminados} procesos de Chrome de workers anteriores.")
+    return eliminados
+
+
+# --- Pool ---
+
+def _nueva_entrada():
+    limpiar_chrome_huerfanos()
+    driver = _create_chrome_driver(_opciones_headless())
+    pid = getattr(getattr(driver.service, "process", None), "pid", None)
+    entrada = {"driver": driver, "usos": 0, "pid": pid, "procesos": {}}
+    procesos = _arbol(pid)
+    _registrar(entrada, procesos)
+    entrada["rss_inicial_mb"] = _rss_mb(procesos)
+    return entrada
+
+
+def _cerrar_entrada(entrada):
+    try:
+        entrada["driver"].quit()
+    except Exception:
+        pass
+
+
+def _esta_sano(entrada) -> bool:
+    try:
+        return entrada["driver"].execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+def _debe_reciclarse(entrada) -> bool:
+    if entrada["usos"] >= SELENIUM_DRIVER_MAX_USES:
+        return True
+    procesos = _arbol(entrada["pid"])
+    if procesos.keys() - entrada["procesos"].keys():
+        # Los renderers se lanzan después del arranque: también son de este driver.
+        _registrar(entrada, procesos)
+    crecimiento = _rss_mb(procesos) - entrada["rss_inicial_mb"]
+    return crecimiento > SELENIUM_DRIVER_MAX_RSS_GROWTH_MB
+
+
+def _descartar(entrada):
+    global _total
+    _cerrar_entrada(entrada)
+    # Lo que sobreviva a quit() (ayudantes adoptados por init) y fuera de este driver.
+    eliminados = _matar(entrada["procesos"])
+    _olvidar(entrada)
+    if eliminados:
+        print(f"Pool Selenium: eliminados {eliminados} procesos de Chrome que sobrevivieron al driver.")
+    with _cond:
+        _total -= 1
+        _cond.notify()
+
+
+def adquirir_driver(timeout: float | None = SELENIUM_POOL_WAIT_SECONDS):
+    """
+    Toma un driver sano del pool. Si no hay libres y ya se alcanzó el máximo,
+    espera en cola hasta `timeout` segundos (TimeoutError si no llega ninguno).
+    """
+    global _total
+    limite = None if timeout is None else time.monotonic() + timeout
+    while True:
+        with _cond:
+            while not _libres and _total >= SELENIUM_POOL_SIZE:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    raise TimeoutError("Todos los navegadores del pool están ocupados.")
+                _cond.wait(restante)
+            entrada = _libres.pop() if _libres else None
+            if entrada is None:
+                _total += 1
+
+        if entrada is None:
+            try:
+                entrada = _nueva_entrada()
+            except Exception:
+                with _cond:
+                    _total -= 1
+                    _cond.notify()
+                raise
+        elif not _esta_sano(entrada):
+            _descartar(entrada)
+            continue
+
+        entrada["usos"] += 1
+        entrada["driver"]._pool_entrada = entrada
+        return entrada["driver"]
+
+
+def liberar_driver(driver, descartar: bool = False):
+    """Devuelve el driver al pool (o lo cierra si está gastado o se pide descartarlo)."""
+    entrada = getattr(driver, "_pool_entrada", None)
+    if entrada is None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        return
+    if descartar or _debe_reciclarse(entrada):
+        _descartar(entrada)
+        return
+    try:
+        # Se suelta la página anterior para que no siga ejecutando JS ni ocupando memoria.
+        driver.get("about:blank")
+    except Exception:
+        _descartar(entrada)
+        return
+    with _cond:
+        _libres.append(entrada)
+        _cond.notify()
+
+
+@contextmanager
+def driver_del_pool(timeout: float | None = SELENIUM_POOL_WAIT_SECONDS):
+    driver = adquirir_driver(timeout)
+    descartar = False
+    try:
+        yield driver
+    except Exception:
+        descartar = True
+        raise
+    finally:
+        liberar_driver(driver, descartar=descartar)
+
+
+def precalentar():
+    """Arranca en segundo plano los drivers del pool para que el primer estudio no pague el arranque."""
+    def _arrancar():
+        global _total
+        limpiar_chrome_huerfanos()
+        while True:
+            with _cond:
+                if _total >= SELENIUM_POOL_SIZE:
+                    return
+                _total += 1
+            try:
+                entrada = _nueva_entrada()
+            except Exception as exc:
+                with _cond:
+                    _total -= 1
+                    _cond.notify()
+                print(f"No se pudo precalentar el pool de Selenium: {exc}")
+                return
+            with _cond:
+                _libres.append(entrada)
+                _cond.notify()
+
+    threading.Thread(target=_arrancar, name="selenium-pool-warmup", daemon=True).start()
+
+
+def estado_pool() -> dict:
+    with _cond:
+        return {"size": SELENIUM_POOL_SIZE, "alive": _total, "idle": len(_libres)}
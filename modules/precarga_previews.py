@@ -0,0 +1,202 @@
+# modules/precarga_previews.py
+"""
+Precarga especulativa de las vistas previas de los partidos que se acaban de listar.
+
+Cuando se sirve el listado de próximos partidos, lo siguiente casi siempre es un clic
+en una de las primeras filas. `programar()` recibe los IDs en el orden del listado
+(por hora de inicio) y un único hilo de baja prioridad va calculando las vistas
+previas ligeras de los PRECARGA_TOP_N primeros, de forma que el clic encuentre el
+resultado ya hecho (`obtener_preview`).
+
+- Presupuesto: como mucho PRECARGA_PREVIEWS_POR_MINUTO vistas previas precargadas
+  por minuto (cada una cuesta una o varias peticiones a NowGoal). Las peticiones de
+  usuarios no consumen presupuesto.
+- Cancelación: cada `programar()` sustituye al anterior; los partidos que ya no están
+  entre los primeros se quitan de lo pendiente (lo que está en curso termina).
+- Lotes: `previews_en_lote()` calcula las vistas previas de muchos partidos a la vez
+  (ruta /api/preview/batch) dentro de un lote de cliente_http, así que las páginas
+  que comparten (h2h de partidos clave, estadísticas de rivales comunes) se
+  descargan una sola vez; cada vista previa se entrega en cuanto está lista. El lote
+  es solo de esas tareas: el resto de descargas del proceso no lo ven.
+- Opcionalmente (PRECARGA_ESTUDIOS_TOP_N > 0) se encolan también los estudios
+  completos de los primeros partidos en la cola de análisis con prioridad BAJA, y se
+  cancelan igual si salen del listado.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules import estudio_scraper, cola_analisis, cliente_http
+
+PRECARGA_ENABLED = os.environ.get("PRECARGA_PREVIEWS", "1") == "1"
+PRECARGA_TOP_N = int(os.environ.get("PRECARGA_TOP_N", "8"))
+PRECARGA_PREVIEWS_POR_MINUTO = float(os.environ.get("PRECARGA_PREVIEWS_POR_MINUTO", "20"))
+PRECARGA_ESTUDIOS_TOP_N = int(os.environ.get("PRECARGA_ESTUDIOS_TOP_N", "0"))
+PREVIEW_TTL_SECONDS = int(os.environ.get("PREVIEW_TTL_SECONDS", "300"))
+PREVIEWS_GUARDADAS_MAX = 200
+PREVIEW_LOTE_WORKERS = int(os.environ.get("PREVIEW_LOTE_WORKERS", "6"))
+PREVIEW_LOTE_MAX_IDS = int(os.environ.get("PREVIEW_LOTE_MAX_IDS", "40"))
+
+_pendientes = []
+_en_curso = {}
+_previews = {}
+_estudios_precargados = set()
+_cond = threading.Condition()
+_hilo = None
+# Presupuesto (cubo de fichas): se rellena a PRECARGA_PREVIEWS_POR_MINUTO / 60 por segundo.
+_fichas = PRECARGA_PREVIEWS_POR_MINUTO
+_fichas_actualizado = time.monotonic()
+_estadisticas = {"prefetched": 0, "hits": 0, "misses": 0, "cancelled": 0}
+
+
+def _preview_fresca(match_id: str):
+    guardada = _previews.get(match_id)
+    if guardada and time.monotonic() - guardada[0] < PREVIEW_TTL_SECONDS:
+        return guardada[1]
+    return None
+
+
+def _guardar_preview(match_id: str, datos: dict):
+    if not datos or "error" in datos:
+        return
+    _previews[match_id] = (time.monotonic(), datos)
+    if len(_previews) > PREVIEWS_GUARDADAS_MAX:
+        for viejo, _ in sorted(_previews.items(), key=lambda kv: kv[1][0])[:len(_previews) - PREVIEWS_GUARDADAS_MAX]:
+            del _previews[viejo]
+
+
+def _tomar_ficha() -> float:
+    """Gasta una ficha del presupuesto; si no hay, devuelve cuántos segundos faltan."""
+    global _fichas, _fichas_actualizado
+    ahora = time.monotonic()
+    por_segundo = PRECARGA_PREVIEWS_POR_MINUTO / 60
+    _fichas = min(PRECARGA_PREVIEWS_POR_MINUTO, _fichas + (ahora - _fichas_actualizado) * por_segundo)
+    _fichas_actualizado = ahora
+    if _fichas >= 1:
+        _fichas -= 1
+        return 0
+    return (1 - _fichas) / por_segundo if por_segundo > 0 else 60
+
+
+def programar(match_ids):
+    """Sustituye lo pendiente por los primeros `match_ids` (ya ordenados por hora de inicio)."""
+    if not PRECARGA_ENABLED:
+        return
+    objetivo = [str(m) for m in match_ids if m][:PRECARGA_TOP_N]
+    with _cond:
+        _iniciar_hilo()
+        cancelados = [m for m in _pendientes if m not in objetivo]
+        _estadisticas["cancelled"] += len(cancelados)
+        _pendientes[:] = [m for m in objetivo if m not in _en_curso and _preview_fresca(m) is None]
+        _cond.notify()
+    _programar_estudios(objetivo[:PRECARGA_ESTUDIOS_TOP_N])
+
+
+def _programar_estudios(match_ids):
+    with _cond:
+        salen = _estudios_precargados - set(match_ids)
+        _estudios_precargados.difference_update(salen)
+    for match_id in salen:
+        cola_analisis.cancelar(match_id)
+    for match_id in match_ids:
+        try:
+            cola_analisis.encolar(match_id, cola_analisis.PRIORIDAD_BAJA)
+        except cola_analisis.ColaLlenaError:
+            break
+        with _cond:
+            _estudios_precargados.add(match_id)
+
+
+def _iniciar_hilo():
+    global _hilo
+    if _hilo is None:
+        _hilo = threading.Thread(target=_bucle_precarga, name="precarga-previews", daemon=True)
+        _hilo.start()
+
+
+def _bucle_precarga():
+    while True:
+        with _cond:
+            while True:
+                while not _pendientes:
+                    _cond.wait()
+                espera = _tomar_ficha()
+                if espera == 0:
+                    break
+                # Sin presupuesto: se espera, pero un programar() nuevo despierta antes.
+                _cond.wait(espera)
+            match_id = _pendientes.pop(0)
+            evento = _en_curso[match_id] = threading.Event()
+        try:
+            datos = estudio_scraper.obtener_datos_preview_ligero(match_id)
+        except Exception as exc:
+            datos = {"error": f"{type(exc).__name__}: {exc}"}
+        with _cond:
+            _guardar_preview(match_id, datos)
+            _estadisticas["prefetched"] += 1
+            del _en_curso[match_id]
+        evento.set()
+
+
+def obtener_preview(match_id: str) -> dict:
+    """
+    Vista previa ligera de `match_id`: la precargada si sigue fresca, la que se está
+    precargando en este momento (se espera) o, si no, se calcula ahora.
+    """
+    match_id = str(match_id)
+    with _cond:
+        datos = _preview_fresca(match_id)
+        evento = _en_curso.get(match_id)
+        if datos is None and match_id in _pendientes:
+            # Ya la va a pedir el usuario: no hace falta precargarla.
+            _pendientes.remove(match_id)
+    if datos is None and evento is not None:
+        evento.wait(30)
+        with _cond:
+            datos = _preview_fresca(match_id)
+    with _cond:
+        _estadisticas["hits" if datos is not None else "misses"] += 1
+    if datos is not None:
+        return datos
+    datos = estudio_scraper.obtener_datos_preview_ligero(match_id)
+    with _cond:
+        _guardar_preview(match_id, datos)
+    return datos
+
+
+def previews_en_lote(match_ids):
+    """
+    Generador de (match_id, datos) para varios partidos, en el orden en que terminan.
+    Los IDs repetidos o no numéricos se descartan y como mucho se atienden
+    PREVIEW_LOTE_MAX_IDS. Un error en un partido se entrega como {"error": ...}.
+    """
+    ids = list(dict.fromkeys(str(m).strip() for m in match_ids if str(m).strip().isdigit()))[:PREVIEW_LOTE_MAX_IDS]
+    if not ids:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(PREVIEW_LOTE_WORKERS, len(ids)), thread_name_prefix="preview-lote")
+    try:
+        with cliente_http.lote_compartido() as lote:
+            futuros = {executor.submit(lote.ejecutar, obtener_preview, match_id): match_id for match_id in ids}
+            for futuro in as_completed(futuros):
+                try:
+                    datos = futuro.result()
+                except Exception as exc:
+                    datos = {"error": f"{type(exc).__name__}: {exc}"}
+                yield futuros[futuro], datos
+    finally:
+        # Si el cliente corta la respuesta, lo que no ha empezado no se calcula.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def estado_precarga() -> dict:
+    """Resumen de la precarga (para diagnóstico)."""
+    with _cond:
+        return {
+            "enabled": PRECARGA_ENABLED,
+            "pending": list(_pendientes),
+            "running": list(_en_curso),
+            "cached": len(_previews),
+            "budget_tokens": round(_fichas, 2),
+            **_estadisticas,
+        }
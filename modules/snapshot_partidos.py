@@ -0,0 +1,190 @@
+# modules/snapshot_partidos.py
+"""
+Snapshots en memoria de los listados de la página principal de NowGoal.
+
+Cada listado (próximos, resultados...) se registra con una función cargadora que
+descarga y parsea la página. Un hilo en segundo plano refresca los listados cada
+cierto tiempo y publica el resultado como un snapshot versionado, de modo que las
+rutas de listado y la paginación se sirven desde memoria sin volver a descargar
+ni parsear los ~3 MB de la página en cada petición.
+
+Con varios workers de gunicorn, los snapshots se publican también en el almacén
+compartido (modules/almacen_compartido): solo el worker que toma el turno de un
+listado lo descarga, y los demás adoptan su publicación. La versión la asigna el
+almacén, así que es la misma en todos los workers y `?version=` pagina sobre la misma
+foto aunque cada petición del scroll la atienda un proceso distinto.
+"""
+import os
+import threading
+import time
+
+from modules import almacen_compartido
+
+SNAPSHOT_REFRESH_SECONDS = int(os.environ.get("NOWGOAL_SNAPSHOT_REFRESH_SECONDS", "60"))
+# Versiones antiguas que se conservan para que el scroll infinito pagine siempre
+# sobre la misma foto aunque entre medias se haya publicado una nueva.
+SNAPSHOT_VERSIONS_RETAINED = 3
+# Tiempo máximo que un worker espera a que otro termine de cargar un listado.
+SNAPSHOT_TURNO_SECONDS = int(os.environ.get("NOWGOAL_SNAPSHOT_TURNO_SECONDS", "90"))
+
+_ESPACIO = "listado"
+
+_cargadores = {}
+_snapshots = {}
+_locks_carga = {}
+_state_lock = threading.Lock()
+_version_counter = 0
+_refresh_thread = None
+
+
+def registrar_listado(nombre: str, cargador):
+    """
+    Registra un listado. `cargador` es una función sin argumentos que devuelve los
+    datos ya parseados del listado, o None si no se pudo obtener la página.
+    """
+    with _state_lock:
+        _cargadores[nombre] = cargador
+        _snapshots.setdefault(nombre, [])
+        _locks_carga.setdefault(nombre, threading.Lock())
+
+
+def _ultimo_snapshot(nombre: str) -> dict | None:
+    with _state_lock:
+        historial = _snapshots.get(nombre) or []
+        return historial[-1] if historial else None
+
+
+def _anadir(nombre: str, snapshot: dict):
+    """Añade `snapshot` al historial local si es más nuevo que el último."""
+    global _version_counter
+    with _state_lock:
+        historial = _snapshots[nombre]
+        if historial and historial[-1]["version"] >= snapshot["version"]:
+            return
+        historial.append(snapshot)
+        del historial[:-SNAPSHOT_VERSIONS_RETAINED]
+        _version_counter = max(_version_counter, snapshot["version"])
+
+
+def _desde_almacen(publicacion: dict) -> dict:
+    return {**publicacion["valor"], "version": publicacion["version"]}
+
+
+def _adoptar_publicado(nombre: str) -> dict | None:
+    """Snapshot que otro worker ha publicado después del último local, ya añadido al historial."""
+    ultimo = _ultimo_snapshot(nombre)
+    publicacion = almacen_compartido.leer(_ESPACIO, nombre, mas_nueva_que=ultimo["version"] if ultimo else 0)
+    if publicacion is None:
+        return None
+    snapshot = _desde_almacen(publicacion)
+    _anadir(nombre, snapshot)
+    return snapshot
+
+
+def refrescar_listado(nombre: str, max_age: float | None = None) -> dict | None:
+    """
+    Ejecuta el cargador del listado y publica un nuevo snapshot si hay datos.
+    Con `max_age`, no se recarga si el último snapshot es más reciente que eso
+    (evita cargas duplicadas cuando otro hilo, u otro worker, acaba de refrescar).
+    """
+    global _version_counter
+    cargador = _cargadores.get(nombre)
+    if cargador is None:
+        raise KeyError(f"Listado no registrado: {nombre}")
+
+    with _locks_carga[nombre]:
+        ultimo = _adoptar_publicado(nombre) or _ultimo_snapshot(nombre)
+        if max_age is not None and ultimo and time.time() - ultimo["fetched_at"] < max_age:
+            return ultimo
+        turno = f"{_ESPACIO}:{nombre}"
+        tomado, adoptado = almacen_compartido.esperar_turno(turno, SNAPSHOT_TURNO_SECONDS,
+                                                             lambda: _adoptar_publicado(nombre))
+        if not tomado:
+            return adoptado
+        try:
+            inicio = time.monotonic()
+            try:
+                data = cargador()
+            except Exception as exc:
+                print(f"Error al refrescar el listado '{nombre}': {exc}")
+                data = None
+            if data is None:
+                # Se mantiene el snapshot anterior: mejor datos algo viejos que ninguno.
+                return None
+
+            snapshot = {
+                "name": nombre,
+                "fetched_at": time.time(),
+                "load_seconds": round(time.monotonic() - inicio, 3),
+                "data": data,
+            }
+            publicacion = almacen_compartido.publicar(_ESPACIO, nombre, snapshot, conservar=SNAPSHOT_VERSIONS_RETAINED)
+            if publicacion is not None:
+                snapshot["version"] = publicacion["version"]
+            else:
+                with _state_lock:
+                    _version_counter += 1
+                    snapshot["version"] = _version_counter
+            _anadir(nombre, snapshot)
+            return snapshot
+        finally:
+            almacen_compartido.soltar_turno(turno)
+
+
+def obtener_snapshot(nombre: str, version: int | None = None) -> dict | None:
+    """
+    Devuelve el snapshot más reciente del listado (o la versión pedida si todavía
+    se conserva, aquí o en el almacén compartido). Si aún no hay ninguno, lo carga en
+    el hilo actual; las peticiones concurrentes esperan a esa misma carga en lugar de
+    lanzar otra.
+    """
+    iniciar_refresco_en_segundo_plano()
+
+    with _state_lock:
+        historial = list(_snapshots.get(nombre, []))
+    if version is not None:
+        for snapshot in historial:
+            if snapshot["version"] == version:
+                return snapshot
+        # La publicó otro worker (el scroll empezó en otro proceso).
+        publicacion = almacen_compartido.leer(_ESPACIO, nombre, version=version)
+        if publicacion is not None:
+            return _desde_almacen(publicacion)
+    if historial:
+        return _adoptar_publicado(nombre) or historial[-1]
+    return refrescar_listado(nombre, max_age=float("inf"))
+
+
+def estado_snapshots() -> dict:
+    """Resumen de los snapshots publicados (para diagnóstico)."""
+    with _state_lock:
+        return {
+            nombre: {
+                "version": historial[-1]["version"],
+                "age_seconds": round(time.time() - historial[-1]["fetched_at"], 1),
+                "load_seconds": historial[-1]["load_seconds"],
+            } if historial else None
+            for nombre, historial in _snapshots.items()
+        }
+
+
+def _bucle_refresco():
+    while True:
+        for nombre in list(_cargadores):
+            try:
+                refrescar_listado(nombre, max_age=SNAPSHOT_REFRESH_SECONDS / 2)
+            except Exception as exc:
+                print(f"Error en el refresco en segundo plano de '{nombre}': {exc}")
+        time.sleep(SNAPSHOT_REFRESH_SECONDS)
+
+
+def iniciar_refresco_en_segundo_plano():
+    """Arranca (una sola vez por proceso) el hilo que mantiene los snapshots al día."""
+    global _refresh_thread
+    if _refresh_thread is not None:
+        return
+    with _state_lock:
+        if _refresh_thread is not None:
+            return
+        _refresh_thread = threading.Thread(target=_bucle_refresco, name="snapshot-partidos", daemon=True)
+        _refresh_thread.start()
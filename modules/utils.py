@@ -2,6 +2,9 @@
 import re
 import math
 
+from modules.liquidacion import ESTADOS_AH, liquidar_ah, liquidar_goles
+from modules.lineas_ah import decodificar
+
 def get_match_details_from_row_of(row_element, score_class_selector='score', source_table_type='h2h'):
     """Extrae detalles de un partido desde una fila de la tabla."""
     try:
@@ -40,127 +43,68 @@ def get_match_details_from_row_of(row_element, score_class_selector='score', sou
         return None
 
 def parse_ah_to_number_of(ah_line_str: str):
-    """Convierte una línea de handicap asiático de string a número."""
-    if not isinstance(ah_line_str, str): 
-        return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: 
-        return None
-        
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: 
-                return None
-            p1_str, p2_str = parts[0], parts[1]
-            val1 = float(p1_str)
-            val2 = float(p2_str)
-            # Ajustar signo para fracciones mixtas
-            if val1 < 0 and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except (ValueError, IndexError):
-        return None
+    """Convierte una línea de handicap asiático de string a número (modules.lineas_ah)."""
+    linea = decodificar(ah_line_str)
+    return linea.valor if linea else None
 
 def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    """Formatea una línea de handicap asiático como string decimal."""
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-        
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-        
-    if numeric_value == 0.0: 
-        return "0"
-        
-    # Redondear y formatear
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    
-    # Redondeo especial para líneas asiáticas
-    if abs_num % 1 == 0.0:
-        result = int(abs_num)
-    elif abs_num % 1 == 0.5:
-        result = abs_num
-    elif abs_num % 1 == 0.25 or abs_num % 1 == 0.75:
-        result = abs_num
-    else:
-        # Redondeo al 0.25 más cercano
-        result = round(abs_num * 4) / 4
-        
-    final_value = sign * result
-    
-    # Formatear como string
-    if final_value == int(final_value):
-        output_str = str(int(final_value))
-    else:
-        output_str = f"{final_value:.2f}".rstrip('0').rstrip('.')
-        
-    return output_str
+    """Formatea una línea de handicap asiático como string decimal ('-' si no es una línea)."""
+    linea = decodificar(ah_line_str)
+    if linea is None:
+        return '?' if isinstance(ah_line_str, str) and ah_line_str.strip() == '?' else '-'
+    if for_sheets:
+        return "'" + linea.texto.replace('.', ',')
+    return linea.texto
 
 def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, 
                         home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
-    """Verifica si un equipo cubrió el handicap en un partido."""
+    """
+    Verifica si un equipo cubrió el handicap en un partido (liquidación de modules.liquidacion).
+    Con línea 0 se apuesta por el equipo local del partido principal; si no, por el favorito.
+    Las medias ganadas cuentan como CUBIERTO y las medias perdidas como NO CUBIERTO.
+    Los equipos se pueden pasar por nombre o por clave (id de NowGoal, ver H2HPage.clave):
+    se comparan por igualdad exacta (sin mayúsculas), nunca por subcadena.
+    """
+    def mismo(a, b):
+        # Un id puede llegar como int; None sigue dando "indeterminado" (AttributeError).
+        return (str(a) if isinstance(a, int) else a).lower() == (str(b) if isinstance(b, int) else b).lower()
+
     try:
         goles_h, goles_a = map(int, resultado_raw.split('-'))
-        
-        # Caso de handicap asiático 0
         if ah_line_num == 0.0:
-            if main_home_team_name.lower() == home_team_in_h2h.lower():
-                if goles_h > goles_a: 
-                    return ("CUBIERTO", True)
-                elif goles_a > goles_h: 
-                    return ("NO CUBIERTO", False)
-                else: 
-                    return ("PUSH", None)
-            else:
-                if goles_a > goles_h: 
-                    return ("CUBIERTO", True)
-                elif goles_h > goles_a: 
-                    return ("NO CUBIERTO", False)
-                else: 
-                    return ("PUSH", None)
-        
-        # Determinar margen de victoria del favorito
-        if favorite_team_name.lower() == home_team_in_h2h.lower():
-            favorite_margin = goles_h - goles_a
-        elif favorite_team_name.lower() == away_team_in_h2h.lower():
-            favorite_margin = goles_a - goles_h
+            apuesta_local = mismo(main_home_team_name, home_team_in_h2h)
+        elif mismo(favorite_team_name, home_team_in_h2h):
+            apuesta_local = True
+        elif mismo(favorite_team_name, away_team_in_h2h):
+            apuesta_local = False
         else:
             return ("indeterminado", None)
-        
-        # Verificar si se cubrió el handicap
-        if favorite_margin - abs(ah_line_num) > 0.05:
-            return ("CUBIERTO", True)
-        elif favorite_margin - abs(ah_line_num) < -0.05:
-            return ("NO CUBIERTO", False)
-        else:
-            return ("PUSH", None)
+        return ESTADOS_AH[int(liquidar_ah(goles_h, goles_a, abs(ah_line_num), apuesta_local))]
     except (ValueError, TypeError, AttributeError):
         return ("indeterminado", None)
 
-def check_goal_line_cover(resultado_raw: str, goal_line_num: float = 2.5):
-    """Verifica si un partido superó la línea de goles."""
+def check_goal_line_cover(resultado_raw: str, goal_line_num: float = 2.5,
+                          etiquetas=("SUPERADA (Over)", "NO SUPERADA (Under)", "PUSH (Empate)")):
+    """Verifica si un partido superó la línea de goles. `etiquetas`: textos de over, under y push."""
     try:
         goles_h, goles_a = map(int, resultado_raw.split('-'))
-        total_goles = goles_h + goles_a
-        
-        if total_goles > goal_line_num:
-            return ("SUPERADA (Over)", True)
-        elif total_goles < goal_line_num:
-            return ("NO SUPERADA (Under)", False)
-        else:
-            return ("PUSH (Empate)", None)
+        codigo = int(liquidar_goles(goles_h, goles_a, float(goal_line_num)))
     except (ValueError, TypeError):
         return ("indeterminado", None)
+    if codigo > 0:
+        return (etiquetas[0], True)
+    if codigo < 0:
+        return (etiquetas[1], False)
+    return (etiquetas[2], None)
 
 def extract_final_score_of(soup):
     """
     Extrae el resultado final del partido desde el header.
+    Acepta también un H2HPage (ya lo trae calculado).
     """
+    from modules.pagina_h2h import H2HPage
+    if isinstance(soup, H2HPage):
+        return soup.final_score
     try:
         score_div = soup.find("div", id="mScore")
         if not score_div:
@@ -184,4 +128,34 @@ def extract_final_score_of(soup):
     except Exception:
         return "vs"
     
-    return "vs"
\ No newline at end of file
+    return "vs"
+
+
+def is_match_finished_of(soup) -> bool:
+    """
+    True solo si la cabecera de la página (#mScore) marca el partido como terminado:
+    bloque "div.end" o estado "Finished". Un marcador por sí solo no basta, porque los
+    partidos en juego también lo muestran (extract_final_score_of lo devuelve igual).
+    Acepta también un H2HPage.
+    """
+    from modules.pagina_h2h import H2HPage
+    if isinstance(soup, H2HPage):
+        return soup.terminado
+    try:
+        score_div = soup.find("div", id="mScore")
+        if not score_div:
+            return False
+        if score_div.select_one("div.end") is not None:
+            return True
+        state_div = score_div.select_one(".state")
+        return state_div is not None and "Finished" in state_div.get_text()
+    except Exception:
+        return False
+
+
+# --- Buckets de handicap de medio punto (filtros de listados, historial) ---
+
+def normalize_handicap_to_half_bucket_str(text: str):
+    """Bucket de medio punto de una línea ('0.5' para 0.25, 0.5 y 0.75), o None."""
+    linea = decodificar(text)
+    return linea.bucket if linea else None
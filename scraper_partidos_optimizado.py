@@ -5,9 +5,6 @@ import sys
 import pytz
 from bs4 import BeautifulSoup
 import threading
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 # Establecer la codificación de la consola a UTF-8
 sys.stdout.reconfigure(encoding='utf-8')
@@ -20,6 +17,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
+# Las descargas pasan por la capa HTTP y el limitador compartidos con la app, para
+# que el scraper no sume su propio ritmo (y sus reintentos) al del servidor web.
+from modules import cliente_http, limitador_peticiones
+
 # --- CONFIGURACIÓN (Inspirada en estudio.py) ---
 URL = "https://live20.nowgoal25.com/"
 SELENIUM_TIMEOUT_SECONDS = 15
@@ -30,10 +31,6 @@ MADRID_TZ = pytz.timezone('Europe/Madrid')
 driver_instance = None
 driver_lock = threading.Lock()
 
-# Variable global para la sesión requests y su bloqueo
-session_instance = None
-session_lock = threading.Lock()
-
 # --- FUNCIÓN DE PARSEO (Idéntica a la tuya, es el método de extracción correcto) ---
 def parse_match_data_from_html(html_content):
     """
@@ -108,24 +105,6 @@ def parse_match_data_from_html(html_content):
     upcoming_matches.sort(key=lambda x: x['time_utc'])
     return upcoming_matches[:20]
 
-# --- FUNCIÓN PARA CONFIGURAR LA SESIÓN HTTP (Inspirada en estudio.py) ---
-def get_requests_session():
-    """
-    Crea y configura una sesión de requests con reintentos,
-    similar a la función get_requests_session_of en estudio.py.
-    """
-    global session_instance
-    with session_lock:
-        if session_instance is None:
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
-            adapter = HTTPAdapter(max_retries=retries)
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
-            session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-            session_instance = session
-        return session_instance
-
 # --- FUNCIÓN PARA CONFIGURAR EL DRIVER DE SELENIUM (Método de estudio.py) ---
 def setup_driver():
     """
@@ -172,7 +151,8 @@ def fetch_page_content_with_selenium(url):
         return None
     
     try:
-        driver.get(url)
+        with limitador_peticiones.peticion(url, medir_latencia=False):
+            driver.get(url)
         WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "tr[id^='tr1_']"))
         )
@@ -189,10 +169,7 @@ def fetch_page_content_with_selenium(url):
 # --- FUNCIÓN PARA EXTRAER DATOS DE UNA URL CON REQUESTS ---
 def fetch_page_content_with_requests(url):
     try:
-        session = get_requests_session()
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
-        return response.text
+        return cliente_http.obtener_html(url, timeout=10)
     except Exception as e:
         print(f"Ocurrió un error inesperado al cargar la página con requests: {e}")
         return None
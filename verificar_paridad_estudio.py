@@ -0,0 +1,207 @@
+"""
+Comprobaciones del estudio completo en modo sin navegador (requests) frente al modo
+Selenium. No hace peticiones reales salvo con --capturar.
+
+Sin argumentos, los dos modos reciben el MISMO HTML (html_extraer/analisis.txt): la
+descarga con requests devuelve el fichero y Selenium se sustituye por un driver falso
+que sirve ese HTML y ejecuta los mismos pasos (esperas y selección de hSelect_N = "8").
+Eso comprueba que los dos caminos construyen el mismo estudio (comparten
+_construir_datos_estudio) y que la página guardada pasa el filtro del modo requests;
+NO comprueba que la página estática equivalga a lo que renderiza Selenium (valores por
+defecto de los selects, tablas que rellena el JS...).
+
+Para eso hace falta una captura real del mismo partido:
+- `--capturar ID` descarga la página estática (requests) y la que renderiza Selenium
+  (tras los mismos pasos que el estudio) y las guarda en --salida;
+- `--estatica F --renderizada F` compara el estudio de cada modo, cada uno con su
+  página: requests con la estática y el driver falso con la renderizada.
+
+Si seleccionar "8" cambiase la opción activa de algún select, el driver falso lo
+informa, porque en el navegador eso dispararía showOdds_h y el HTML ya no sería el
+capturado.
+
+Uso: python verificar_paridad_estudio.py [--capturar ID [--salida DIR]]
+                                         [--estatica F --renderizada F [--match-id ID]]
+"""
+import argparse
+import sys
+from pathlib import Path
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from modules import estudio_scraper, pool_selenium
+from modules.estadisticas_partido import EstadisticasPartido
+
+FIXTURE = Path(__file__).parent / "html_extraer" / "analisis.txt"
+MATCH_ID = "1"
+
+
+class _ElementoFalso:
+    def __init__(self, driver, tag):
+        self._driver = driver
+        self._tag = tag
+
+    @property
+    def tag_name(self):
+        return self._tag.name
+
+    @property
+    def text(self):
+        return self._tag.get_text(" ", strip=True)
+
+    def get_dom_attribute(self, name):
+        return self._tag.get(name)
+
+    def find_elements(self, by, value):
+        assert by == By.CSS_SELECTOR
+        return [_ElementoFalso(self._driver, t) for t in self._tag.select(value)]
+
+    def is_enabled(self):
+        return not self._tag.has_attr("disabled")
+
+    def is_selected(self):
+        select = self._tag.find_parent("select")
+        activa = select.find("option", selected=True) or select.find("option")
+        return activa is self._tag
+
+    def click(self):
+        select = self._tag.find_parent("select")
+        self._driver.cambios_de_select.append((select.get("id"), self._tag.get("value")))
+
+
+class _DriverFalso:
+    def __init__(self, html):
+        self.page_source = html
+        self._soup = BeautifulSoup(html, "lxml")
+        self.cambios_de_select = []
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, value):
+        assert by == By.ID
+        tag = self._soup.find(id=value)
+        if tag is None:
+            raise NoSuchElementException(value)
+        return _ElementoFalso(self, tag)
+
+
+def _normalizar(valor):
+    if isinstance(valor, EstadisticasPartido):
+        return {"__estadisticas__": valor.registros()}
+    if isinstance(valor, dict):
+        return {k: _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    if callable(valor):
+        return f"<funcion {valor.__name__}>"
+    return valor
+
+
+def _diferencias(a, b, ruta="datos"):
+    if type(a) is not type(b):
+        return [f"{ruta}: {type(a).__name__} != {type(b).__name__}"]
+    if isinstance(a, dict):
+        difs = []
+        for clave in sorted(set(a) | set(b), key=str):
+            if clave not in a or clave not in b:
+                difs.append(f"{ruta}[{clave!r}]: solo en {'selenium' if clave in a else 'requests'}")
+            else:
+                difs.extend(_diferencias(a[clave], b[clave], f"{ruta}[{clave!r}]"))
+        return difs
+    if isinstance(a, list):
+        if len(a) != len(b):
+            return [f"{ruta}: longitud {len(a)} != {len(b)}"]
+        difs = []
+        for i, (x, y) in enumerate(zip(a, b)):
+            difs.extend(_diferencias(x, y, f"{ruta}[{i}]"))
+        return difs
+    return [] if a == b else [f"{ruta}: {a!r} != {b!r}"]
+
+
+class _Capturado(Exception):
+    """Corta el estudio en cuanto se tiene la página cargada."""
+
+
+def capturar(match_id: str, salida: Path) -> int:
+    """Guarda la página estática y la renderizada por Selenium de `match_id`."""
+    salida.mkdir(parents=True, exist_ok=True)
+    estatica = estudio_scraper.obtener_html(f"{estudio_scraper.BASE_URL_OF}/match/h2h-{match_id}",
+                                            timeout=10, revalidar=True)
+    renderizada = []
+
+    def quedarse_con_la_pagina(mid, soup_completo, *args, **kwargs):
+        renderizada.append(str(soup_completo))
+        raise _Capturado()
+
+    estudio_scraper._construir_datos_estudio = quedarse_con_la_pagina
+    estudio_scraper._obtener_datos_completos_con_selenium(match_id)
+    if not renderizada:
+        print("FALLO: Selenium no llegó a cargar la página.")
+        return 1
+    (salida / f"h2h_{match_id}_estatica.html").write_text(estatica, encoding="utf-8")
+    (salida / f"h2h_{match_id}_renderizada.html").write_text(renderizada[0], encoding="utf-8")
+    print(f"Guardadas en {salida}: h2h_{match_id}_estatica.html y h2h_{match_id}_renderizada.html")
+    return 0
+
+
+def comparar(html_estatica: str, html_renderizada: str, match_id: str, misma_pagina: bool) -> int:
+    driver = _DriverFalso(html_renderizada)
+
+    estudio_scraper.obtener_html = lambda url, timeout=None, headers=None, revalidar=False: html_estatica
+    estudio_scraper.get_match_progression_stats_batch = lambda match_ids: {}
+    pool_selenium.adquirir_driver = lambda timeout=None: driver
+    pool_selenium.liberar_driver = lambda d, descartar=False: None
+
+    con_selenium = estudio_scraper.obtener_datos_completos_partido(match_id, modo="selenium")
+    sin_navegador = estudio_scraper._obtener_datos_completos_sin_navegador(match_id)
+
+    if sin_navegador is None:
+        print("FALLO: el modo sin navegador rechazó la página estática.")
+        return 1
+    if driver.cambios_de_select:
+        print(f"FALLO: Selenium cambió la opción de {driver.cambios_de_select}; el HTML estático no equivale.")
+        return 1
+    if "error" in con_selenium:
+        print(f"FALLO: el modo Selenium devolvió un error: {con_selenium['error']}")
+        return 1
+
+    difs = _diferencias(_normalizar(con_selenium), _normalizar(sin_navegador))
+    if difs:
+        print(f"FALLO: {len(difs)} diferencias entre Selenium y requests:")
+        for dif in difs[:50]:
+            print("  -", dif)
+        return 1
+    if misma_pagina:
+        print(f"OK: con la misma página, los dos caminos construyen el mismo estudio ({len(con_selenium)} claves"
+              " en datos). No compara con lo que renderiza Selenium: para eso, --capturar y --renderizada.")
+    else:
+        print(f"OK: la página estática y la renderizada por Selenium dan el mismo estudio ({len(con_selenium)} claves en datos).")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--capturar", metavar="ID", help="guarda la página estática y la renderizada de este partido")
+    parser.add_argument("--salida", type=Path, default=Path(__file__).parent / "html_extraer")
+    parser.add_argument("--estatica", type=Path, help="página descargada con requests")
+    parser.add_argument("--renderizada", type=Path, help="página renderizada por Selenium (del mismo partido)")
+    parser.add_argument("--match-id", default=MATCH_ID)
+    args = parser.parse_args(argv)
+
+    if args.capturar:
+        if not args.capturar.isdigit():
+            parser.error("--capturar necesita un ID numérico")
+        return capturar(args.capturar, args.salida)
+    if bool(args.estatica) != bool(args.renderizada):
+        parser.error("--estatica y --renderizada van juntas")
+    if args.estatica:
+        return comparar(args.estatica.read_text(encoding="utf-8"), args.renderizada.read_text(encoding="utf-8"),
+                        args.match_id, misma_pagina=False)
+    html = FIXTURE.read_text(encoding="utf-8")
+    return comparar(html, html, args.match_id, misma_pagina=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())